@@ -4,7 +4,7 @@ API数据模型 - 极简版本
 只保留守护进程实际使用的数据模型
 """
 
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from pydantic import BaseModel
 
 # ==================== 通用响应模型 ====================
@@ -57,6 +57,12 @@ class XiaohongshuReplyCommentRequest(BaseModel):
     target_username: str  
     target_content: str
     reply_content: str
+    status_only: bool = False  # 只需要 success/message 时为 True，响应不含 data
+
+class XiaohongshuReplyCommentsBatchRequest(BaseModel):
+    """小红书批量回复评论请求（同一帖子下的多条评论）"""
+    replies: List[XiaohongshuReplyCommentRequest]
+    status_only: bool = False  # 只需要 success/message 时为 True，响应不含逐条结果
 
 class XiaohongshuClickAuthorAvatarRequest(BaseModel):
     """小红书点击作者头像并获取用户信息请求"""
@@ -6,15 +6,30 @@ E2B Browser Daemon - 极简版本
 
 import os
 import sys
+import json
+import base64
 import asyncio
 import logging
 import traceback
+from contextvars import ContextVar
 from typing import Optional, Dict, Any
 
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 import uvicorn
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 可选：uvloop 事件循环（uvicorn[standard] 自带，Windows 等不可用时回退 asyncio）
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # 确保能导入本地模块
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
@@ -29,10 +44,87 @@ from api_models import (
     XiaohongshuAutoScrollRequest, XiaohongshuClickPostRequest,
     XiaohongshuExpandCommentsRequest, XiaohongshuExtractCommentsRequest,
     XiaohongshuAnalyzePostRequest, XiaohongshuExtractAllPostsRequest,
-    XiaohongshuReplyCommentRequest, XiaohongshuClickAuthorAvatarRequest,
+    XiaohongshuReplyCommentRequest, XiaohongshuReplyCommentsBatchRequest,
+    XiaohongshuClickAuthorAvatarRequest,
     XiaohongshuExtractUserProfileRequest, XiaohongshuClosePageRequest
 )
 
+#######################################################
+# msgpack协议适配
+#######################################################
+
+MSGPACK_TYPE = b"application/msgpack"
+MSGPACK_MEDIA_TYPE = MSGPACK_TYPE.decode()
+
+# 当前请求的客户端是否接受msgpack响应（由 MsgpackMiddleware 按 Accept 头设置）
+_accepts_msgpack: ContextVar[bool] = ContextVar("accepts_msgpack", default=False)
+
+
+class NegotiatedResponse(JSONResponse):
+    """默认响应类：客户端接受msgpack时直接把路由结果打包为msgpack，不经过JSON文本"""
+    
+    def __init__(self, content: Any = None, *args, **kwargs):
+        self._use_msgpack = msgpack is not None and _accepts_msgpack.get()
+        if self._use_msgpack:
+            self.media_type = MSGPACK_MEDIA_TYPE
+        super().__init__(content, *args, **kwargs)
+    
+    def render(self, content: Any) -> bytes:
+        if self._use_msgpack:
+            return msgpack.packb(content, use_bin_type=True)
+        return super().render(content)
+
+
+class MsgpackMiddleware:
+    """msgpack协议适配层
+    
+    请求体为msgpack时转为JSON交给路由；客户端Accept msgpack时标记当前请求，
+    由 NegotiatedResponse 直接把路由结果打包为msgpack
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or msgpack is None:
+            await self.app(scope, receive, send)
+            return
+        
+        headers = dict(scope["headers"])
+        
+        if headers.get(b"content-type", b"").startswith(MSGPACK_TYPE):
+            scope, receive = await self._unpack_request(scope, receive)
+        
+        token = _accepts_msgpack.set(MSGPACK_TYPE in headers.get(b"accept", b""))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _accepts_msgpack.reset(token)
+    
+    async def _unpack_request(self, scope, receive):
+        """读取msgpack请求体并替换为等价的JSON请求体"""
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        
+        body = json.dumps(msgpack.unpackb(body, raw=False), ensure_ascii=False).encode("utf-8")
+        headers = [(k, v) for k, v in scope["headers"] if k not in (b"content-type", b"content-length")]
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        
+        body_sent = False
+        
+        async def json_receive():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        
+        return {**scope, "headers": headers}, json_receive
+
 #######################################################
 # E2B浏览器守护进程 - 极简版本
 #######################################################
@@ -151,6 +243,59 @@ class E2BBrowserDaemon:
                 data=result.__dict__
             )
         
+        @self.router.get("/browser/screenshot")
+        async def screenshot():
+            """截图 - msgpack客户端收到二进制图片（bin），JSON客户端收到base64字符串"""
+            await self.ensure_services_ready()
+            image_bytes = await self.browser_service.take_screenshot_bytes()
+            if not image_bytes:
+                return {"success": False, "message": "截图失败", "data": {}}
+            if msgpack is not None and _accepts_msgpack.get():
+                payload = {
+                    "success": True,
+                    "message": "截图成功",
+                    "data": {"screenshot": image_bytes, "encoding": "binary", "format": "jpeg"}
+                }
+                return Response(content=msgpack.packb(payload, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPE)
+            return {
+                "success": True,
+                "message": "截图成功",
+                "data": {"screenshot": base64.b64encode(image_bytes).decode("ascii"), "encoding": "base64", "format": "jpeg"}
+            }
+        
+        @self.router.get("/browser/screenshot_raw")
+        async def screenshot_raw():
+            """截图 - 直接返回JPEG二进制，避免base64和JSON包装"""
+            await self.ensure_services_ready()
+            image_bytes = await self.browser_service.take_screenshot_bytes()
+            if not image_bytes:
+                raise HTTPException(status_code=500, detail="截图失败")
+            return Response(content=image_bytes, media_type="image/jpeg")
+        
+        @self.router.websocket("/browser/wait_events")
+        async def wait_events(websocket: WebSocket):
+            """等待事件推送 - 客户端订阅一次条件，满足时推送一条结果"""
+            await websocket.accept()
+            try:
+                params = await websocket.receive_json()
+                await self.ensure_services_ready()
+                result = await self.browser_service.wait_for_conditions(
+                    success_selectors=params.get('success_selectors'),
+                    failure_selectors=params.get('failure_selectors'),
+                    target_url=params.get('target_url'),
+                    max_timeout=params.get('max_timeout', 300),
+                    fixed_seconds=params.get('fixed_seconds')
+                )
+                # 与HTTP接口的 BrowserOperationResponse 保持同样的结构
+                await websocket.send_json({
+                    "success": result.get('success', False),
+                    "message": result.get('message', ''),
+                    "data": result
+                })
+                await websocket.close()
+            except WebSocketDisconnect:
+                self.logger.debug("等待事件客户端已断开")
+        
         # ==================== 小红书专用功能 ====================
         
         @self.router.post("/xiaohongshu/auto_scroll", response_model=BrowserOperationResponse)
@@ -227,12 +372,32 @@ class E2BBrowserDaemon:
                 request.target_user_id, 
                 request.target_username, 
                 request.target_content, 
-                request.reply_content
+                request.reply_content,
+                status_only=request.status_only
             )
             return BrowserOperationResponse(
                 success=result.get('success', False),
                 message=result.get('message', ''),
-                data=result
+                data={} if request.status_only else result
+            )
+        
+        @self.router.post("/xiaohongshu/reply_comments_batch", response_model=BrowserOperationResponse)
+        async def xiaohongshu_reply_comments_batch(request: XiaohongshuReplyCommentsBatchRequest):
+            """批量回复同一帖子下的多条评论"""
+            await self.ensure_services_ready()
+            result = await self.xiaohongshu_analyzer.reply_to_comments_batch(
+                [{
+                    "target_user_id": reply.target_user_id,
+                    "target_username": reply.target_username,
+                    "target_content": reply.target_content,
+                    "reply_content": reply.reply_content
+                } for reply in request.replies],
+                status_only=request.status_only
+            )
+            return BrowserOperationResponse(
+                success=result.get('success', False),
+                message=result.get('message', ''),
+                data={} if request.status_only else result
             )
         
         @self.router.post("/xiaohongshu/close_post", response_model=BrowserOperationResponse)
@@ -322,6 +487,9 @@ class E2BBrowserDaemon:
         try:
             print("🔄 关闭 E2B Browser Daemon...")
             
+            if self.xiaohongshu_analyzer:
+                await self.xiaohongshu_analyzer.close_pooled_contexts()
+            
             if self.browser_service:
                 await self.browser_service.close_browser()
             
@@ -353,7 +521,8 @@ def create_app() -> FastAPI:
         title="E2B Browser Daemon",
         description="E2B云端浏览器自动化服务 - 极简版本",
         version="2.0.0",
-        lifespan=lifespan
+        lifespan=lifespan,
+        default_response_class=NegotiatedResponse
     )
 
     # 存储daemon实例到app状态
@@ -362,6 +531,9 @@ def create_app() -> FastAPI:
     # 注册路由
     app.include_router(daemon.router)
     
+    # 同时支持JSON和msgpack请求/响应
+    app.add_middleware(MsgpackMiddleware)
+    
     return app
 
 # ==================== 主函数 ====================
@@ -376,6 +548,7 @@ if __name__ == "__main__":
         app,
         host="0.0.0.0",
         port=8080,
+        loop="uvloop" if uvloop else "asyncio",
         log_level="info",
         reload=False  # E2B环境中不使用reload
     )
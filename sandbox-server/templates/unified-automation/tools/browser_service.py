@@ -10,7 +10,7 @@ import os
 import json
 import base64
 import traceback
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 # 尝试相对导入，如果失败则使用绝对导入
@@ -41,6 +41,9 @@ class BrowserActionResult:
 class BrowserService:
     """浏览器服务 - 只包含最基础的浏览器操作"""
     
+    # 同时在页面中执行的脚本数上限，避免并发请求同时压到 CDP 上（可用环境变量 XHS_CDP_CONCURRENCY 调整）
+    MAX_CONCURRENT_SCRIPTS = int(os.getenv("XHS_CDP_CONCURRENCY", "3"))
+    
     def __init__(self):
         self.playwright = None
         self.browser: Browser = None
@@ -54,6 +57,9 @@ class BrowserService:
         self.context_switcher: Optional[ContextSwitcher] = None
         self.env_validator: Optional[EnvironmentValidator] = None
         
+        # 脚本执行并发限制
+        self._script_slots = asyncio.Semaphore(self.MAX_CONCURRENT_SCRIPTS)
+        
         # 设置DISPLAY环境变量
         os.environ["DISPLAY"] = ":1"
         
@@ -244,19 +250,78 @@ class BrowserService:
                 error=str(e)
             )
     
-    async def take_screenshot(self) -> str:
-        """截图并返回base64字符串"""
+    async def take_screenshot_bytes(self) -> bytes:
+        """截图并返回原始JPEG字节"""
         try:
             page = await self.get_current_page()
-            screenshot_bytes = await page.screenshot(
+            return await page.screenshot(
                 type='jpeg',
                 quality=60,
                 full_page=False
             )
-            return base64.b64encode(screenshot_bytes).decode('utf-8')
         except Exception as e:
             print(f"截图错误: {e}")
-            return ""
+            return b""
+    
+    async def take_screenshot(self) -> str:
+        """截图并返回base64字符串"""
+        screenshot_bytes = await self.take_screenshot_bytes()
+        return base64.b64encode(screenshot_bytes).decode('utf-8') if screenshot_bytes else ""
+    
+    async def wait_for_conditions(self,
+                                  success_selectors: Optional[List[str]] = None,
+                                  failure_selectors: Optional[List[str]] = None,
+                                  target_url: Optional[str] = None,
+                                  max_timeout: int = 300,
+                                  fixed_seconds: Optional[int] = None) -> Dict[str, Any]:
+        """事件驱动等待 - 任一成功/失败条件满足即返回，不做轮询"""
+        if fixed_seconds:
+            await asyncio.sleep(fixed_seconds)
+            return {"success": True, "message": f"固定等待 {fixed_seconds} 秒完成", "condition": "fixed"}
+        
+        page = await self.get_current_page()
+        timeout_ms = max_timeout * 1000
+        
+        waiters = {}
+        for selector in success_selectors or []:
+            waiters[asyncio.ensure_future(page.wait_for_selector(selector, timeout=timeout_ms))] = ("success", selector)
+        for selector in failure_selectors or []:
+            waiters[asyncio.ensure_future(page.wait_for_selector(selector, timeout=timeout_ms))] = ("failure", selector)
+        if target_url:
+            waiters[asyncio.ensure_future(
+                page.wait_for_url(lambda url: target_url in url, timeout=timeout_ms)
+            )] = ("success", target_url)
+        
+        if not waiters:
+            return {"success": False, "message": "未指定等待条件"}
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + max_timeout
+        pending = set(waiters)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - loop.time(), 0),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    # 单个条件出错(如选择器超时)不影响其余条件继续等待
+                    if task.exception() is None:
+                        kind, condition = waiters[task]
+                        return {
+                            "success": kind == "success",
+                            "message": f"{'满足成功条件' if kind == 'success' else '出现失败条件'}: {condition}",
+                            "condition": condition
+                        }
+        finally:
+            for task in waiters:
+                if not task.done():
+                    task.cancel()
+        
+        return {"success": False, "message": f"等待超时({max_timeout}秒)"}
     
     # ==================== 基础交互操作 ====================
     
@@ -362,11 +427,17 @@ class BrowserService:
     
     # ==================== 基础脚本执行 ====================
     
+    async def evaluate_on_page(self, page: Page, script: str):
+        """在指定页面执行脚本并直接返回结果（与 execute_script 共用并发限制）"""
+        async with self._script_slots:
+            return await page.evaluate(script)
+    
     async def execute_script(self, script: str) -> BrowserActionResult:
         """执行JavaScript脚本"""
         try:
             page = await self.get_current_page()
-            result = await page.evaluate(script)
+            async with self._script_slots:
+                result = await page.evaluate(script)
             
             return BrowserActionResult(
                 success=True,
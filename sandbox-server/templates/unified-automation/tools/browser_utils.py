@@ -4,30 +4,128 @@ E2B浏览器工具 - HTTP客户端版本
 """
 
 import os
+import sys
+import atexit
 import time
 import json
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Dict, Any, List, Optional
 
 
+logger = logging.getLogger("browser_utils")
+logger.setLevel(getattr(logging, os.getenv("BROWSER_UTILS_LOG_LEVEL", "INFO").upper(), logging.INFO))
+if not logger.handlers:
+    # 沙箱脚本通常不配置logging，保留原先直接输出到stdout的体验
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+
+try:
+    from websockets.sync.client import connect as _ws_connect
+except ImportError:
+    _ws_connect = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# 安装了msgpack时与守护进程协商二进制协议，否则保持JSON
+_MSGPACK_TYPE = "application/msgpack"
+_ACCEPT_HEADERS = {"Accept": f"{_MSGPACK_TYPE}, application/json"} if msgpack else {}
+_POST_HEADERS = {**_ACCEPT_HEADERS, "Content-Type": _MSGPACK_TYPE} if msgpack else {}
+
+_DAEMON_URL = "http://localhost:8080"  # 守护进程地址
+
+# 共享HTTP会话，复用到守护进程的keep-alive连接
+_SESSION = requests.Session()
+
+# 守护进程启动中的连接拒绝在urllib3层指数退避重试（连接未建立，任何方法都可安全重发）；
+# 网关类错误只对GET重试：502/504 不能说明守护进程没有执行，POST 重发可能重复回复评论/点击；
+# 读错误不重试，避免请求已到达守护进程后被重复执行
+_RETRY = Retry(
+    total=5,
+    read=False,
+    backoff_factor=0.25,
+    status_forcelist=[502, 503, 504],
+    allowed_methods=frozenset(["GET"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+_SESSION.mount("http://", HTTPAdapter(max_retries=_RETRY, pool_connections=4, pool_maxsize=32))
+atexit.register(_SESSION.close)
+
+# 按端点区分的请求超时(秒)，快操作快速失败，不再统一等待10分钟
+_DEFAULT_TIMEOUT = 30
+_TIMEOUTS = {
+    "/browser/start": 120,
+    "/browser/navigate": 60,
+    "/browser/click": 15,
+    "/browser/type": 15,
+    "/browser/scroll": 15,
+    "/browser/screenshot": 30,
+    "/browser/screenshot_raw": 30,
+    "/browser/page_info": 30,
+    "/browser/reply_comment": 60,
+    "/browser/reply_top_comment": 60,
+    "/browser/get_top_comments": 60,
+    "/browser/click_post": 30,
+    "/browser/click_top_liked_post": 30,
+    "/browser/batch": 600,  # 批量操作可能包含用户登录等待
+}
+
+
 class BrowserUtils:
     """浏览器工具类 - HTTP客户端版本"""
     
     def __init__(self):
-        self.daemon_url = "http://localhost:8080"  # 守护进程地址
-        self.timeout = 600  # 请求超时时间 - 增加到10分钟以支持用户登录等待
+        self.daemon_url = _DAEMON_URL
     
-    def _make_request(self, endpoint: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
-        """向守护进程发送HTTP请求"""
+    def close(self):
+        """释放共享会话连接池中的keep-alive连接，会话后续仍可继续使用"""
+        _SESSION.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def _endpoint_url(self, endpoint: str) -> str:
+        """端点的完整URL；HTTP请求、二进制截图流与WebSocket推送通道共用同一套路径规则"""
+        return f"{self.daemon_url}/api{endpoint}"
+    
+    def _make_request(self, endpoint: str, data: Dict[str, Any] = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """向守护进程发送HTTP请求
+        
+        Args:
+            endpoint: API端点
+            data: POST数据，为空时发送GET请求
+            timeout: 超时秒数，默认按端点从 _TIMEOUTS 查表
+        """
+        if timeout is None:
+            timeout = _TIMEOUTS.get(endpoint, _DEFAULT_TIMEOUT)
+        
         try:
-            url = f"{self.daemon_url}/api{endpoint}"
+            url = self._endpoint_url(endpoint)
             
-            if data:
-                response = requests.post(url, json=data, timeout=self.timeout)
+            if data and msgpack:
+                response = _SESSION.post(url, data=msgpack.packb(data, use_bin_type=True),
+                                         headers=_POST_HEADERS, timeout=timeout)
+            elif data:
+                response = _SESSION.post(url, json=data, timeout=timeout)
             else:
-                response = requests.get(url, timeout=self.timeout)
+                response = _SESSION.get(url, headers=_ACCEPT_HEADERS, timeout=timeout)
             
             if response.status_code == 200:
+                if msgpack and response.headers.get("Content-Type", "").startswith(_MSGPACK_TYPE):
+                    return msgpack.unpackb(response.content, raw=False)
                 return response.json()
             else:
                 return {
@@ -36,7 +134,15 @@ class BrowserUtils:
                     "data": {},
                     "error": response.text
                 }
+        except requests.exceptions.ReadTimeout as e:
+            return {
+                "success": False,
+                "message": f"请求守护进程超时({timeout}秒): {endpoint}",
+                "data": {},
+                "error": str(e)
+            }
         except Exception as e:
+            # 可重试的错误已由_RETRY处理，到这里说明重试耗尽或不可重试
             return {
                 "success": False,
                 "message": f"请求守护进程失败: {str(e)}",
@@ -46,13 +152,13 @@ class BrowserUtils:
     
     def start_browser(self) -> Dict[str, Any]:
         """启动浏览器"""
-        print("🚀 请求守护进程启动浏览器...")
+        logger.debug("🚀 请求守护进程启动浏览器...")
         result = self._make_request("/browser/start")
         
         if result.get("success", False):
-            print("✅ 浏览器启动成功")
+            logger.info("✅ 浏览器启动成功")
         else:
-            print(f"❌ 浏览器启动失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 浏览器启动失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
@@ -85,87 +191,126 @@ class BrowserUtils:
                 "debug": "full"
             }
             return_mode = mode_map.get(purpose, "basic")
-            print(f"🎯 智能导航: {purpose} → 自动选择{return_mode}模式")
+            logger.debug("🎯 智能导航: %s → 自动选择%s模式", purpose, return_mode)
         else:
-            print(f"🌐 导航到: {url} (模式: {return_mode})")
+            logger.debug("🌐 导航到: %s (模式: %s)", url, return_mode)
         
         data = {"url": url, "return_mode": return_mode}
         result = self._make_request("/browser/navigate", data)
         
         if result.get("success", False):
-            print(f"✅ 导航成功: {url} (模式: {return_mode})")
+            logger.info("✅ 导航成功: %s (模式: %s)", url, return_mode)
         else:
-            print(f"❌ 导航失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 导航失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def click_element(self, index: int) -> Dict[str, Any]:
         """点击元素"""
-        print(f"👆 点击元素: {index}")
+        logger.debug("👆 点击元素: %s", index)
         data = {"index": index}
         result = self._make_request("/browser/click", data)
         
         if result.get("success", False):
-            print(f"✅ 点击成功: 元素 {index}")
+            logger.info("✅ 点击成功: 元素 %s", index)
         else:
-            print(f"❌ 点击失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 点击失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def input_text(self, index: int, text: str) -> Dict[str, Any]:
         """在元素中输入文本"""
-        print(f"⌨️ 在元素 {index} 中输入: {text}")
+        logger.debug("⌨️ 在元素 %s 中输入: %s", index, text)
         data = {"index": index, "text": text}
         result = self._make_request("/browser/type", data)
         
         if result.get("success", False):
-            print(f"✅ 输入成功: 元素 {index}")
+            logger.info("✅ 输入成功: 元素 %s", index)
         else:
-            print(f"❌ 输入失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 输入失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def scroll_down(self, amount: Optional[int] = None) -> Dict[str, Any]:
         """向下滚动"""
-        print(f"⬇️ 向下滚动: {amount or '默认'}")
+        logger.debug("⬇️ 向下滚动: %s", amount or '默认')
         data = {"direction": "down", "amount": amount}
         result = self._make_request("/browser/scroll", data)
         
         if result.get("success", False):
-            print("✅ 滚动成功")
+            logger.info("✅ 滚动成功")
         else:
-            print(f"❌ 滚动失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 滚动失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def scroll_up(self, amount: Optional[int] = None) -> Dict[str, Any]:
         """向上滚动"""
-        print(f"⬆️ 向上滚动: {amount or '默认'}")
+        logger.debug("⬆️ 向上滚动: %s", amount or '默认')
         data = {"direction": "up", "amount": amount}
         result = self._make_request("/browser/scroll", data)
         
         if result.get("success", False):
-            print("✅ 滚动成功")
+            logger.info("✅ 滚动成功")
         else:
-            print(f"❌ 滚动失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 滚动失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def take_screenshot(self) -> Dict[str, Any]:
-        """截图"""
-        print("📸 截图中...")
+        """截图
+
+        协商为msgpack时 data.screenshot 为图片字节（encoding=binary），否则为base64字符串（encoding=base64）
+        """
+        logger.debug("📸 截图中...")
         result = self._make_request("/browser/screenshot")
         
         if result.get("success", False):
-            print("✅ 截图成功")
+            logger.info("✅ 截图成功")
         else:
-            print(f"❌ 截图失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 截图失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
+    def take_screenshot_raw(self, save_to: Optional[str] = None) -> Dict[str, Any]:
+        """截图并以二进制流方式接收，避免base64编码和大JSON解析
+        
+        Args:
+            save_to: 可选，保存截图的文件路径；传入时直接写入文件
+            
+        Returns:
+            与其他方法一致的结果字典：成功时 data.image 为JPEG图片字节，传入save_to时改为 data.path 文件路径
+        """
+        logger.debug("📸 截图中(二进制流)...")
+        url = self._endpoint_url("/browser/screenshot_raw")
+        try:
+            with _SESSION.get(url, timeout=_TIMEOUTS["/browser/screenshot_raw"], stream=True) as response:
+                if response.status_code != 200:
+                    logger.warning("❌ 截图失败: 守护进程响应错误: %s", response.status_code)
+                    return {
+                        "success": False,
+                        "message": f"守护进程响应错误: {response.status_code}",
+                        "data": {}
+                    }
+                
+                chunks = response.iter_content(chunk_size=64 * 1024)
+                if save_to:
+                    with open(save_to, "wb") as f:
+                        for chunk in chunks:
+                            f.write(chunk)
+                    logger.info("✅ 截图成功: %s", save_to)
+                    return {"success": True, "message": "截图成功", "data": {"path": save_to}}
+                
+                image_bytes = b"".join(chunks)
+                logger.info("✅ 截图成功: %s 字节", len(image_bytes))
+                return {"success": True, "message": "截图成功", "data": {"image": image_bytes, "format": "jpeg"}}
+        except Exception as e:
+            logger.warning("❌ 截图失败: %s", e)
+            return {"success": False, "message": f"截图失败: {str(e)}", "data": {}}
+    
     def reply_to_comment(self, comment_index: int, reply_content: str) -> Dict[str, Any]:
         """回复指定索引的评论"""
-        print(f"💬 回复第 {comment_index} 个评论: {reply_content}")
+        logger.debug("💬 回复第 %s 个评论: %s", comment_index, reply_content)
         data = {
             "comment_index": comment_index,
             "reply_content": reply_content
@@ -173,15 +318,15 @@ class BrowserUtils:
         result = self._make_request("/browser/reply_comment", data)
         
         if result.get("success", False):
-            print(f"✅ 回复成功: 评论 {comment_index}")
+            logger.info("✅ 回复成功: 评论 %s", comment_index)
         else:
-            print(f"❌ 回复失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 回复失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def reply_to_top_liked_comment(self, reply_content: str, target_rank: int = 1) -> Dict[str, Any]:
         """回复指定排名的高赞评论"""
-        print(f"🏆 回复第 {target_rank} 名高赞评论: {reply_content}")
+        logger.debug("🏆 回复第 %s 名高赞评论: %s", target_rank, reply_content)
         data = {
             "reply_content": reply_content,
             "target_rank": target_rank
@@ -189,9 +334,9 @@ class BrowserUtils:
         result = self._make_request("/browser/reply_top_comment", data)
         
         if result.get("success", False):
-            print(f"✅ 高赞评论回复成功: 第{target_rank}名")
+            logger.info("✅ 高赞评论回复成功: 第%s名", target_rank)
         else:
-            print(f"❌ 高赞评论回复失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 高赞评论回复失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
@@ -202,46 +347,50 @@ class BrowserUtils:
     
     def get_top_comments(self, limit: int = 5) -> Dict[str, Any]:
         """获取按点赞数排序的高赞评论"""
-        print(f"📊 获取前 {limit} 个高赞评论...")
+        logger.debug("📊 获取前 %s 个高赞评论...", limit)
         data = {"limit": limit}
         result = self._make_request("/browser/get_top_comments", data)
         
         if result.get("success", False):
             comments_data = result.get("data", {})
             top_comments = comments_data.get("comments", [])
-            print(f"✅ 成功获取 {len(top_comments)} 个高赞评论")
+            logger.info("✅ 成功获取 %s 个高赞评论", len(top_comments))
             
-            # 打印高赞评论信息
-            for i, comment in enumerate(top_comments, 1):
-                print(f"  {i}. 👍{comment.get('likeCount', '0')} | {comment.get('author', 'Unknown')} | {comment.get('content', '')[:50]}...")
+            # 打印高赞评论信息 - 整张表合并为一条日志记录
+            if top_comments and logger.isEnabledFor(logging.DEBUG):
+                lines = [
+                    f"  {i}. 👍{c.get('likeCount', '0')} | {c.get('author', 'Unknown')} | {c.get('content', '')[:50]}..."
+                    for i, c in enumerate(top_comments, 1)
+                ]
+                logger.debug("%s", "\n".join(lines))
         else:
-            print(f"❌ 获取高赞评论失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 获取高赞评论失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def click_post_by_index(self, post_index: int) -> Dict[str, Any]:
         """点击指定索引的帖子"""
-        print(f"🎯 点击索引为 {post_index} 的帖子...")
+        logger.debug("🎯 点击索引为 %s 的帖子...", post_index)
         data = {"post_index": post_index}
         result = self._make_request("/browser/click_post", data)
         
         if result.get("success", False):
-            print(f"✅ 成功点击索引 {post_index} 的帖子")
+            logger.info("✅ 成功点击索引 %s 的帖子", post_index)
         else:
-            print(f"❌ 点击帖子失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 点击帖子失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
     def click_top_liked_post(self, target_rank: int = 1) -> Dict[str, Any]:
         """点击指定排名的高赞帖子"""
-        print(f"🎯 点击第 {target_rank} 名高赞帖子...")
+        logger.debug("🎯 点击第 %s 名高赞帖子...", target_rank)
         data = {"target_rank": target_rank}
         result = self._make_request("/browser/click_top_liked_post", data)
         
         if result.get("success", False):
-            print(f"✅ 成功点击第{target_rank}名高赞帖子")
+            logger.info("✅ 成功点击第%s名高赞帖子", target_rank)
         else:
-            print(f"❌ 点击高赞帖子失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 点击高赞帖子失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
@@ -254,8 +403,8 @@ class BrowserUtils:
                     wait_message: str = "等待用户操作完成...",
                     target_url: str = None,
                     fixed_seconds: int = None) -> Dict[str, Any]:
-        print(f"⏰ 开始智能等待: {wait_message}")
-        print(f"📋 等待类型: {wait_type}, 最大超时: {max_timeout}秒")
+        logger.debug("⏰ 开始智能等待: %s", wait_message)
+        logger.debug("📋 等待类型: %s, 最大超时: %s秒", wait_type, max_timeout)
         
         data = {
             "wait_type": wait_type,
@@ -274,15 +423,57 @@ class BrowserUtils:
         if fixed_seconds:
             data["fixed_seconds"] = fixed_seconds
             
-        result = self._make_request("/browser/smart_wait", data)
+        # 优先走WebSocket推送通道，不可用时回退到HTTP请求
+        result = self._smart_wait_via_events(data, max_timeout)
+        if result is None:
+            result = self._make_request("/browser/smart_wait", data, timeout=max_timeout + 30)
         
         if result.get("success", False):
-            print(f"✅ 智能等待完成: {result.get('message', '')}")
+            logger.info("✅ 智能等待完成: %s", result.get('message', ''))
         else:
-            print(f"❌ 智能等待失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 智能等待失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
+    def _smart_wait_via_events(self, data: Dict[str, Any], max_timeout: int) -> Optional[Dict[str, Any]]:
+        """通过 /browser/wait_events 订阅等待条件，守护进程在条件满足时推送一次结果
+        
+        Returns:
+            等待结果；WebSocket不可用、或未指定选择器/目标URL/固定秒数时返回None，由调用方回退到HTTP
+        """
+        if _ws_connect is None:
+            return None
+        # 推送通道只支持选择器/URL/固定时长条件；wait_type 等语义（如默认的 user_action）由HTTP接口实现
+        if not (data.get("success_selectors") or data.get("failure_selectors")
+                or data.get("target_url") or data.get("fixed_seconds")):
+            return None
+        
+        ws_url = self._endpoint_url("/browser/wait_events").replace("http://", "ws://", 1)
+        try:
+            ws = _ws_connect(ws_url, open_timeout=5)
+        except Exception as e:
+            logger.debug("WebSocket等待通道不可用，回退到HTTP: %s", e)
+            return None
+        
+        with ws:
+            try:
+                ws.send(json.dumps(data, ensure_ascii=False))
+                return json.loads(ws.recv(timeout=max_timeout + 30))
+            except TimeoutError as e:
+                return {
+                    "success": False,
+                    "message": f"智能等待超时({max_timeout}秒)",
+                    "data": {},
+                    "error": str(e)
+                }
+            except Exception as e:
+                return {
+                    "success": False,
+                    "message": f"等待事件通道异常: {str(e)}",
+                    "data": {},
+                    "error": str(e)
+                }
+    
     def get_page_info(self, return_mode: str = "elements") -> Dict[str, Any]:
         """获取页面信息
         
@@ -292,14 +483,14 @@ class BrowserUtils:
                 - "elements": 返回精简的交互元素（默认，性能最佳）
                 - "full": 返回所有信息包括截图
         """
-        print(f"📋 获取页面信息 (模式: {return_mode})...")
+        logger.debug("📋 获取页面信息 (模式: %s)...", return_mode)
         data = {"return_mode": return_mode}
         result = self._make_request("/browser/page_info", data)
         
         if result.get("success", False):
-            print(f"✅ 获取页面信息成功 (模式: {return_mode})")
+            logger.info("✅ 获取页面信息成功 (模式: %s)", return_mode)
         else:
-            print(f"❌ 获取页面信息失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 获取页面信息失败: %s", result.get('message', 'Unknown error'))
         
         return result
     
@@ -312,7 +503,7 @@ class BrowserUtils:
         Returns:
             包含父元素信息和子节点列表的字典
         """
-        print(f"🔍 获取元素 {parent_index} 的子节点信息...")
+        logger.debug("🔍 获取元素 %s 的子节点信息...", parent_index)
         
         # 构造批量操作请求
         operations = [
@@ -331,13 +522,30 @@ class BrowserUtils:
         )
         
         if result.get("success", False):
-            print(f"✅ 获取元素 {parent_index} 子节点成功")
+            logger.info("✅ 获取元素 %s 子节点成功", parent_index)
         else:
-            print(f"❌ 获取元素 {parent_index} 子节点失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 获取元素 %s 子节点失败: %s", parent_index, result.get('message', 'Unknown error'))
         
         return result
 
 
+# 沙箱ID和VNC访问信息在进程生命周期内不变，导入时计算一次
+_SANDBOX_ID = os.getenv('E2B_SANDBOX_ID', 'unknown')
+if _SANDBOX_ID != 'unknown':
+    _VNC_INFO = {
+        "vnc_web_url": f"https://6080-{_SANDBOX_ID}.e2b.app",
+        "vnc_direct_url": f"vnc://5901-{_SANDBOX_ID}.e2b.app",
+        "display": ":1",
+        "note": "通过VNC Web URL可实时观察浏览器操作"
+    }
+    _VNC_FIELDS = {"vnc_access": _VNC_INFO}
+    _VNC_MESSAGE = f" | VNC界面: {_VNC_INFO['vnc_web_url']}"
+else:
+    _VNC_INFO = None
+    _VNC_FIELDS = {}
+    _VNC_MESSAGE = ""
+
+
 def batch_browser_operations(operations: List[Dict[str, Any]], persistent_id: str = None,
                             user_intent: Optional[str] = None, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
@@ -357,12 +565,12 @@ def batch_browser_operations(operations: List[Dict[str, Any]], persistent_id: st
     if not persistent_id:
         persistent_id = f"browser_{int(time.time())}_daemon"
     
-    print(f"🚀 开始批量操作，持久化ID: {persistent_id}")
-    print(f"📋 操作数量: {len(operations)}")
+    logger.debug("🚀 开始批量操作，持久化ID: %s", persistent_id)
+    logger.debug("📋 操作数量: %s", len(operations))
     if user_intent:
-        print(f"🎯 用户指定意图: {user_intent}")
+        logger.debug("🎯 用户指定意图: %s", user_intent)
     if options:
-        print(f"⚙️ 用户选项: {options}")
+        logger.debug("⚙️ 用户选项: %s", options)
     
     # 创建浏览器工具实例
     browser_utils = BrowserUtils()
@@ -386,78 +594,53 @@ def batch_browser_operations(operations: List[Dict[str, Any]], persistent_id: st
         result = browser_utils._make_request("/browser/batch", request_data)
                 
         if result.get("success", False):
-            print("✅ 批量操作完成")
+            logger.info("✅ 批量操作完成")
             
-            # 添加VNC访问信息
-            sandbox_id = os.getenv('E2B_SANDBOX_ID', 'unknown')
-            if sandbox_id != 'unknown':
-                vnc_info = {
-                    "vnc_web_url": f"https://6080-{sandbox_id}.e2b.app",
-                    "vnc_direct_url": f"vnc://5901-{sandbox_id}.e2b.app",
-                    "display": ":1",
-                    "note": "通过VNC Web URL可实时观察浏览器操作"
-                }
-                
-                # 更新结果中的VNC信息
-                if "data" not in result:
-                    result["data"] = {}
-                result["data"]["vnc_access"] = vnc_info
-                result["vnc_access"] = vnc_info
+            # 添加VNC访问信息和执行元数据
+            if _VNC_INFO:
+                result.setdefault("data", {})["vnc_access"] = _VNC_INFO
             
-            # 添加执行时间和其他元数据
             execution_time = time.time() - start_time
-            result.update({
+            return {
+                **result,
+                **_VNC_FIELDS,
                 "persistent_id": persistent_id,
                 "task_name": "浏览器自动化任务",
                 "execution_time": execution_time,
-                "e2b_sandbox_id": sandbox_id,
+                "e2b_sandbox_id": _SANDBOX_ID,
                 "total_execution_time": execution_time
-            })
-            
-            return result
+            }
             
         else:
-            print(f"❌ 批量操作失败: {result.get('message', 'Unknown error')}")
+            logger.warning("❌ 批量操作失败: %s", result.get('message', 'Unknown error'))
             
             # 失败时也返回VNC信息
-            sandbox_id = os.getenv('E2B_SANDBOX_ID', 'unknown')
-            vnc_message = ""
-            if sandbox_id != 'unknown':
-                vnc_url = f"https://6080-{sandbox_id}.e2b.app"
-                vnc_message = f" | VNC界面: {vnc_url}"
-            
             execution_time = time.time() - start_time
             
             return {
-                    "success": False,
-                "message": f"批量操作失败{vnc_message}",
+                "success": False,
+                "message": f"批量操作失败{_VNC_MESSAGE}",
                 "data": result.get("data", {}),
                 "persistent_id": persistent_id,
                 "task_name": "浏览器自动化任务",
                 "execution_time": execution_time,
-                "e2b_sandbox_id": sandbox_id,
+                "e2b_sandbox_id": _SANDBOX_ID,
                 "error": result.get("error", "Unknown error")
             }
             
     except Exception as e:
-        print(f"❌ 批量操作异常: {str(e)}")
-        
-        sandbox_id = os.getenv('E2B_SANDBOX_ID', 'unknown')
-        vnc_message = ""
-        if sandbox_id != 'unknown':
-            vnc_url = f"https://6080-{sandbox_id}.e2b.app"
-            vnc_message = f" | VNC界面: {vnc_url}"
+        logger.warning("❌ 批量操作异常: %s", e)
         
         execution_time = time.time() - start_time
         
         return {
             "success": False,
-            "message": f"批量操作异常{vnc_message}: {str(e)}",
+            "message": f"批量操作异常{_VNC_MESSAGE}: {str(e)}",
             "data": {},
             "persistent_id": persistent_id,
             "task_name": "浏览器自动化任务",
             "execution_time": execution_time,
-            "e2b_sandbox_id": sandbox_id,
+            "e2b_sandbox_id": _SANDBOX_ID,
             "error": str(e)
         }
 
@@ -468,11 +651,32 @@ def _get_global_browser():
     """获取全局浏览器实例 - 兼容现有调用"""
     return BrowserUtils()
 
-# 全局实例，保持向后兼容
-browser_utils_instance = BrowserUtils()
+# 全局实例，保持向后兼容 - 首次访问时才创建
+_browser_utils_instance: Optional[BrowserUtils] = None
+
+def __getattr__(name: str):
+    """模块级延迟属性 (PEP 562)"""
+    if name == "browser_utils_instance":
+        global _browser_utils_instance
+        if _browser_utils_instance is None:
+            _browser_utils_instance = BrowserUtils()
+        return _browser_utils_instance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # 向后兼容的函数别名
 def run_async(coro):
     """向后兼容 - 不再需要，但保留以防破坏现有代码"""
-    print("⚠️ run_async已废弃，现在使用HTTP调用守护进程")
+    logger.warning("⚠️ run_async已废弃，现在使用HTTP调用守护进程")
     return None
+
+
+# ==================== 连接预热 ====================
+
+def _prewarm_connection():
+    """后台预热到守护进程的连接，让首个真实请求免去TCP握手"""
+    try:
+        _SESSION.get(f"{_DAEMON_URL}/api/health", timeout=5)
+    except Exception:
+        pass  # 守护进程可能尚未就绪，不影响后续请求
+
+threading.Thread(target=_prewarm_connection, daemon=True).start()
@@ -3,9 +3,11 @@
 解决小红书等网站的多标签页上下文切换问题
 """
 
+import re
 import logging
 import asyncio
 import time
+from functools import lru_cache
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from playwright.async_api import Page, BrowserContext
@@ -13,6 +15,19 @@ from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+
+# 页面状态校验用的URL特征（与标签页识别不同：/explore/<id> 在这里视为帖子详情页）
+_POST_DETAIL_URL = re.compile(r"/discovery/item/|/explore/")
+_USER_PROFILE_URL = re.compile(r"/user/profile/|/@")
+_NON_MAIN_URL = re.compile(r"/discovery/item/|/user/profile/|/@")
+
+
+@lru_cache(maxsize=256)
+def _compile(pattern: str) -> "re.Pattern":
+    """编译并缓存URL匹配模式"""
+    return re.compile(pattern)
+
+
 class TabType(Enum):
     """标签页类型"""
     MAIN = "main"                    # 主页面（首页、搜索页等）
@@ -40,12 +55,31 @@ class TabInfo:
 class TabManager:
     """动态标签页管理器"""
     
+    # 关闭某类标签页后切换目标的优先级
+    _NEXT_TAB_PRIORITY: Dict[TabType, Tuple[TabType, ...]] = {
+        # 关闭用户资料页后，优先返回到主页面或帖子详情页
+        TabType.USER_PROFILE: (TabType.MAIN, TabType.POST_DETAIL, TabType.OTHER),
+        # 关闭帖子详情页后，优先返回到主页面
+        TabType.POST_DETAIL: (TabType.MAIN, TabType.OTHER),
+    }
+    # 其他情况，优先选择主页面
+    _DEFAULT_NEXT_TAB_PRIORITY: Tuple[TabType, ...] = (
+        TabType.MAIN, TabType.POST_DETAIL, TabType.USER_PROFILE, TabType.OTHER
+    )
+    
     def __init__(self, browser_context: BrowserContext):
         self.context = browser_context
         self.tabs: Dict[str, TabInfo] = {}
         self.active_tab_id: Optional[str] = None
         self.logger = logging.getLogger("tab_manager")
         
+        # 最近使用的标签页指针，增量维护，避免每次查找都扫描全部标签页
+        self._latest_tab_id: Optional[str] = None
+        self._latest_by_type: Dict[TabType, str] = {}
+        
+        # 已注册页面 → 标签页ID，随注册/移除增量维护，供 discover_new_tabs 判断与按页面反查
+        self._known_pages: Dict[Page, str] = {}
+        
         # 标签页类型识别规则
         self.type_patterns = {
             TabType.MAIN: [
@@ -62,6 +96,14 @@ class TabManager:
                 r"xiaohongshu\.com/@\w+"
             ]
         }
+        
+        # 所有识别规则合并为一个带命名分组的正则，一次匹配即可确定类型；
+        # 并按URL缓存识别结果(同一URL会被反复识别)
+        self._type_regex = re.compile('|'.join(
+            f"(?P<{tab_type.name}>{'|'.join(f'(?:{p})' for p in patterns)})"
+            for tab_type, patterns in self.type_patterns.items()
+        ))
+        self._detect_tab_type = lru_cache(maxsize=1024)(self._detect_tab_type)
     
     async def register_page(self, page: Page, tab_type: TabType = TabType.OTHER) -> str:
         """注册一个新的标签页"""
@@ -91,6 +133,8 @@ class TabManager:
         )
         
         self.tabs[tab_id] = tab_info
+        self._known_pages[page] = tab_id
+        self._touch(tab_id)
         
         # 设置页面事件监听
         await self._setup_page_listeners(page, tab_id)
@@ -101,11 +145,14 @@ class TabManager:
     async def discover_new_tabs(self) -> List[str]:
         """发现新打开的标签页"""
         current_pages = self.context.pages
-        existing_pages = {tab.page for tab in self.tabs.values()}
+        
+        # 快速路径：页面数量一致且全部已注册时，无新标签页
+        if len(current_pages) == len(self._known_pages) and all(p in self._known_pages for p in current_pages):
+            return []
         
         new_tabs = []
         for page in current_pages:
-            if page not in existing_pages:
+            if page not in self._known_pages:
                 tab_id = await self.register_page(page)
                 new_tabs.append(tab_id)
         
@@ -130,7 +177,7 @@ class TabManager:
             for tid, tab in self.tabs.items():
                 tab.is_active = (tid == tab_id)
             
-            tab_info.last_active_time = time.time()
+            self._touch(tab_id)
             self.active_tab_id = tab_id
             
             self.logger.info(f"切换到标签页: {tab_id} ({tab_info.tab_type.value}) - {tab_info.title}")
@@ -147,34 +194,27 @@ class TabManager:
             await self.discover_new_tabs()
             
             # 如果还是没有活跃标签页，使用最新的一个
-            if not self.active_tab_id and self.tabs:
-                latest_tab = max(self.tabs.values(), key=lambda t: t.created_time)
-                await self.switch_to_tab(latest_tab.tab_id)
+            if not self.active_tab_id and self._latest_tab_id:
+                await self.switch_to_tab(self._latest_tab_id)
         
         if self.active_tab_id and self.active_tab_id in self.tabs:
             return self.tabs[self.active_tab_id].page
         
         return None
     
+    def get_tab_id_by_page(self, page: Page) -> Optional[str]:
+        """按页面对象查找标签页ID"""
+        return self._known_pages.get(page)
+    
     async def find_tab_by_type(self, tab_type: TabType) -> Optional[str]:
-        """根据类型查找标签页"""
-        matching_tabs = [
-            tab_id for tab_id, tab in self.tabs.items() 
-            if tab.tab_type == tab_type
-        ]
-        
-        if matching_tabs:
-            # 返回最新的匹配标签页
-            latest_tab_id = max(matching_tabs, key=lambda tid: self.tabs[tid].last_active_time)
-            return latest_tab_id
-        
-        return None
+        """根据类型查找标签页 - 返回该类型中最近使用的标签页"""
+        return self._latest_by_type.get(tab_type)
     
     async def find_tab_by_url_pattern(self, pattern: str) -> Optional[str]:
         """根据URL模式查找标签页"""
-        import re
+        regex = _compile(pattern)
         for tab_id, tab in self.tabs.items():
-            if re.search(pattern, tab.url):
+            if regex.search(tab.url):
                 return tab_id
         return None
     
@@ -187,7 +227,7 @@ class TabManager:
         
         try:
             await tab_info.page.close()
-            del self.tabs[tab_id]
+            self._remove_tab(tab_id)
             
             # 如果关闭的是活跃标签页，智能切换到其他标签页
             if self.active_tab_id == tab_id:
@@ -197,10 +237,9 @@ class TabManager:
                     next_tab = self._select_next_tab_after_close(tab_info.tab_type)
                     if next_tab:
                         await self.switch_to_tab(next_tab.tab_id)
-                    else:
+                    elif self._latest_tab_id:
                         # 回退到最近使用的标签页
-                        latest_tab = max(self.tabs.values(), key=lambda t: t.last_active_time)
-                        await self.switch_to_tab(latest_tab.tab_id)
+                        await self.switch_to_tab(self._latest_tab_id)
             
             self.logger.info(f"关闭标签页: {tab_id}")
             return True
@@ -213,14 +252,18 @@ class TabManager:
         """清理已关闭的标签页"""
         closed_tabs = []
         
-        for tab_id, tab_info in list(self.tabs.items()):
-            try:
-                # 检查页面是否仍然存在
-                await tab_info.page.title()
-            except Exception:
+        # 并发检查所有页面是否仍然存在，总耗时约为一次CDP往返
+        items = list(self.tabs.items())
+        results = await asyncio.gather(
+            *(tab_info.page.title() for _, tab_info in items),
+            return_exceptions=True
+        )
+        
+        for (tab_id, _), result in zip(items, results):
+            if isinstance(result, Exception):
                 # 页面已关闭
                 closed_tabs.append(tab_id)
-                del self.tabs[tab_id]
+                self._remove_tab(tab_id)
         
         if closed_tabs:
             self.logger.info(f"清理了 {len(closed_tabs)} 个已关闭的标签页")
@@ -228,45 +271,49 @@ class TabManager:
             # 重新设置活跃标签页
             if self.active_tab_id in closed_tabs:
                 self.active_tab_id = None
-                if self.tabs:
-                    latest_tab = max(self.tabs.values(), key=lambda t: t.last_active_time)
-                    await self.switch_to_tab(latest_tab.tab_id)
+                if self._latest_tab_id:
+                    await self.switch_to_tab(self._latest_tab_id)
         
         return len(closed_tabs)
     
+    def _touch(self, tab_id: str):
+        """标记标签页为最近使用，并更新最近使用指针"""
+        tab = self.tabs[tab_id]
+        tab.last_active_time = time.time()
+        self._latest_tab_id = tab_id
+        self._latest_by_type[tab.tab_type] = tab_id
+    
+    def _remove_tab(self, tab_id: str):
+        """移除标签页，仅在被移除的是最近使用指针时才重新计算"""
+        tab = self.tabs.pop(tab_id)
+        self._known_pages.pop(tab.page, None)
+        
+        if self._latest_by_type.get(tab.tab_type) == tab_id:
+            same_type = [t for t in self.tabs.values() if t.tab_type == tab.tab_type]
+            if same_type:
+                self._latest_by_type[tab.tab_type] = max(same_type, key=lambda t: t.last_active_time).tab_id
+            else:
+                del self._latest_by_type[tab.tab_type]
+        
+        if self._latest_tab_id == tab_id:
+            self._latest_tab_id = (
+                max(self.tabs.values(), key=lambda t: t.last_active_time).tab_id if self.tabs else None
+            )
+    
     def _detect_tab_type(self, url: str) -> TabType:
         """根据URL检测标签页类型"""
-        import re
-        
-        for tab_type, patterns in self.type_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, url):
-                    return tab_type
-        
-        return TabType.OTHER
+        match = self._type_regex.search(url)
+        return TabType[match.lastgroup] if match else TabType.OTHER
     
     def _select_next_tab_after_close(self, closed_tab_type: TabType) -> Optional[TabInfo]:
         """智能选择关闭标签页后的下一个活跃标签页"""
+        priority_types = self._NEXT_TAB_PRIORITY.get(closed_tab_type, self._DEFAULT_NEXT_TAB_PRIORITY)
         
-        if closed_tab_type == TabType.USER_PROFILE:
-            # 关闭用户资料页后，优先返回到主页面或帖子详情页
-            priority_types = [TabType.MAIN, TabType.POST_DETAIL, TabType.OTHER]
-        elif closed_tab_type == TabType.POST_DETAIL:
-            # 关闭帖子详情页后，优先返回到主页面
-            priority_types = [TabType.MAIN, TabType.OTHER]
-        else:
-            # 其他情况，优先选择主页面
-            priority_types = [TabType.MAIN, TabType.POST_DETAIL, TabType.USER_PROFILE, TabType.OTHER]
-        
-        # 按优先级查找可用的标签页
+        # 按优先级查找可用的标签页，取该类型中最近使用的标签页
         for tab_type in priority_types:
-            matching_tabs = [
-                tab for tab in self.tabs.values() 
-                if tab.tab_type == tab_type
-            ]
-            if matching_tabs:
-                # 选择该类型中最近使用的标签页
-                return max(matching_tabs, key=lambda t: t.last_active_time)
+            tab_id = self._latest_by_type.get(tab_type)
+            if tab_id:
+                return self.tabs[tab_id]
         
         return None
     
@@ -277,7 +324,14 @@ class TabManager:
             if tab_id in self.tabs:
                 self.logger.info(f"页面关闭事件: {tab_id}")
         
+        def on_frame_navigated(frame):
+            # 主框架导航时同步缓存的URL，后续判断无需再向浏览器查询
+            tab = self.tabs.get(tab_id)
+            if tab and frame.parent_frame is None:
+                tab.url = frame.url
+        
         page.on("close", on_page_close)
+        page.on("framenavigated", on_frame_navigated)
     
     def get_tab_summary(self) -> Dict[str, Any]:
         """获取标签页摘要信息"""
@@ -321,7 +375,8 @@ class ContextSwitcher:
             if target_tab_id:
                 success = await self.tab_manager.switch_to_tab(target_tab_id)
                 if success:
-                    page = await self.tab_manager.get_active_page()
+                    # 刚切换到目标标签页，直接取其页面，省去一次活跃页面查找
+                    page = self.tab_manager.tabs[target_tab_id].page
                     
                     # 验证页面状态
                     if await self._validate_page_state(page, required_context, **kwargs):
@@ -391,18 +446,16 @@ class ContextSwitcher:
             return False
         
         try:
+            # page.url由Playwright在客户端维护，无需CDP往返；标题未参与判断，不再查询
             current_url = page.url
-            current_title = await page.title()
             
             # 基础URL验证
             if required_type == TabType.MAIN:
-                return "xiaohongshu.com" in current_url and not any(
-                    pattern in current_url for pattern in ["/discovery/item/", "/user/profile/", "/@"]
-                )
+                return "xiaohongshu.com" in current_url and not _NON_MAIN_URL.search(current_url)
             elif required_type == TabType.POST_DETAIL:
-                return "/discovery/item/" in current_url or "/explore/" in current_url
+                return bool(_POST_DETAIL_URL.search(current_url))
             elif required_type == TabType.USER_PROFILE:
-                return "/user/profile/" in current_url or "/@" in current_url
+                return bool(_USER_PROFILE_URL.search(current_url))
             
             return True
             
@@ -450,7 +503,7 @@ class EnvironmentValidator:
         
         if operation == "xiaohongshu_expand_comments":
             # 验证是否在帖子详情页
-            if "/discovery/item/" not in current_url and "/explore/" not in current_url:
+            if not _POST_DETAIL_URL.search(current_url):
                 return False, "不在帖子详情页"
             
             # 检查是否有评论区域
@@ -463,12 +516,12 @@ class EnvironmentValidator:
         
         elif operation == "xiaohongshu_extract_user_profile":
             # 验证是否在用户资料页
-            if "/user/profile/" not in current_url and "/@" not in current_url:
+            if not _USER_PROFILE_URL.search(current_url):
                 return False, "不在用户资料页"
         
         elif operation in ["xiaohongshu_auto_scroll", "xiaohongshu_extract_all_posts"]:
             # 验证是否在主页面
-            if any(pattern in current_url for pattern in ["/discovery/item/", "/user/profile/", "/@"]):
+            if _NON_MAIN_URL.search(current_url):
                 return False, "不在主页面"
         
         return True, "验证通过"
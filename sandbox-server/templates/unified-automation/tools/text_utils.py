@@ -1,69 +1,134 @@
 """精简的文本处理工具 - 通用功能类"""
 import re
+import copy
 import json
+import hashlib
+from collections import Counter, OrderedDict
+import lxml.html
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 
+# selectolax(C实现)解析和遍历远快于BeautifulSoup，未安装时回退到BeautifulSoup
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+# 关键词较多时用Aho-Corasick自动机一次扫描匹配全部关键词
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+_AHOCORASICK_MIN_KEYWORDS = 50
+
+
+def _identity(text):
+    return text
+
+# HTML解析结果缓存：按内容哈希作键，超大文档不缓存
+try:
+    import xxhash
+    
+    def _content_key(content):
+        return xxhash.xxh64(content.encode('utf-8')).hexdigest()
+except ImportError:
+    def _content_key(content):
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+_CACHE_MAX_ENTRIES = 128
+_CACHE_MAX_CONTENT_LENGTH = 1_000_000
+
+_HEADING_TAGS = frozenset(('h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+
+# 预编译的正则表达式
+_RE_NUMBERS = re.compile(r'\d+')
+_RE_EMAIL = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+_RE_URL = re.compile(r'https?://(?:[A-Za-z0-9$\-_@.&+!*(),/:;=?#~]|%[0-9a-fA-F]{2})+')
+_RE_CHINESE = re.compile(r'[\u4e00-\u9fff]')
+_RE_ENGLISH = re.compile(r'\b[A-Za-z]+\b')
+_RE_WORDS = re.compile(r'\b\w+\b')
+_RE_CLEAN = re.compile(r'(\s+)|[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
+_RE_HTMLTAG = re.compile(r'<[a-zA-Z/!][^>]*>')
+_RE_SENT_TERMS = re.compile(r'[.!?]')
+
+
+def _clean_scan(text):
+    """一次正则扫描完成空白折叠与控制字符移除
+    
+    返回 (结果, 空白串是否有变化, 是否移除了控制字符)；空白分支在前，
+    \x0B、\x0C 等同属两类的字符按空白处理，与先折叠空白再移除控制字符的顺序一致
+    """
+    whitespace_changed = False
+    control_removed = False
+    
+    def repl(match):
+        nonlocal whitespace_changed, control_removed
+        run = match.group(1)
+        if run is None:
+            control_removed = True
+            return ''
+        if run != ' ':
+            whitespace_changed = True
+        return ' '
+    
+    result = _RE_CLEAN.sub(repl, text)
+    return result, whitespace_changed, control_removed
+
+
+# 中文/弯引号 → 直引号
+_QUOTE_TABLE = str.maketrans({'\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'"})
+
 class TextUtils:
     """精简的文本处理工具类"""
     
+    def __init__(self):
+        self._cache = OrderedDict()
+    
     def parse_html(self, html_content):
+        """解析HTML并返回结构化数据"""
+        return self._cached(("parse_html",), html_content, lambda: self._parse_html(html_content))
+    
+    def extract_text(self, html_content, selector):
+        """通过CSS选择器提取文本"""
+        return self._cached(("extract_text", selector), html_content,
+                            lambda: self._extract_text(html_content, selector))
+    
+    def extract_links(self, html_content, base_url=None):
+        """提取页面中的所有链接"""
+        return self._cached(("extract_links", base_url), html_content,
+                            lambda: self._extract_links(html_content, base_url))
+    
+    def _cached(self, key_parts, html_content, compute):
+        """LRU缓存解析结果，命中时跳过HTML解析；返回副本，避免调用方修改缓存"""
+        if not isinstance(html_content, str) or not html_content \
+                or len(html_content) > _CACHE_MAX_CONTENT_LENGTH:
+            return compute()
+        
+        key = (*key_parts, _content_key(html_content))
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        else:
+            result = compute()
+            if not result.get("success"):
+                return result
+            self._cache[key] = result
+            if len(self._cache) > _CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        
+        return copy.deepcopy(result)
+    
+    def _parse_html(self, html_content):
         """解析HTML并返回结构化数据"""
         try:
             if not html_content:
                 return {"success": False, "message": "HTML内容为空"}
             
-            soup = BeautifulSoup(html_content, 'lxml')
-            
-            # 提取各种结构化信息
-            parsed_data = {
-                    "title": soup.title.string if soup.title else "",
-                "meta_description": "",
-                "headings": [],
-                "paragraphs": [],
-                "links": [],
-                "images": [],
-                "text_content": soup.get_text(strip=True),
-                "stats": {
-                    "text_length": len(soup.get_text()),
-                    "links_count": len(soup.find_all('a')),
-                    "images_count": len(soup.find_all('img')),
-                    "headings_count": len(soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']))
-                }
-            }
-            
-            # 提取meta描述
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            if meta_desc:
-                parsed_data["meta_description"] = meta_desc.get('content', '')
-            
-            # 提取标题
-            for heading in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-                parsed_data["headings"].append({
-                    "level": heading.name,
-                    "text": heading.get_text(strip=True)
-                })
-            
-            # 提取段落
-            for p in soup.find_all('p'):
-                text = p.get_text(strip=True)
-                if text:
-                    parsed_data["paragraphs"].append(text)
-            
-            # 提取链接
-            for link in soup.find_all('a', href=True):
-                parsed_data["links"].append({
-                    "text": link.get_text(strip=True),
-                    "href": link['href']
-                })
-            
-            # 提取图片
-            for img in soup.find_all('img'):
-                parsed_data["images"].append({
-                    "src": img.get('src', ''),
-                    "alt": img.get('alt', ''),
-                    "title": img.get('title', '')
-                })
+            if HTMLParser is not None:
+                parsed_data = self._parse_html_selectolax(html_content)
+            else:
+                parsed_data = self._parse_html_bs4(html_content)
             
             return {
                 "success": True,
@@ -73,11 +138,162 @@ class TextUtils:
         except Exception as e:
             return {"success": False, "message": f"HTML解析失败: {str(e)}"}
     
-    def extract_text(self, html_content, selector):
+    def _parse_html_selectolax(self, html_content):
+        """使用selectolax解析HTML"""
+        tree = HTMLParser(html_content)
+        title_node = tree.css_first('title')
+        text_content = tree.root.text(strip=True) if tree.root else ""
+        # stats.text_length 统计未去空白的全文长度（与原先 len(soup.get_text()) 口径一致）
+        raw_text_length = len(tree.root.text()) if tree.root else 0
+        
+        # 提取各种结构化信息
+        parsed_data = {
+            "title": title_node.text() if title_node else "",
+            "meta_description": "",
+            "headings": [],
+            "paragraphs": [],
+            "links": [],
+            "images": [],
+            "text_content": text_content,
+            "stats": {}
+        }
+        links_count = 0
+        meta_found = False
+        
+        # 循环内使用局部绑定的append，避免每次迭代查字典和属性
+        headings_append = parsed_data["headings"].append
+        paragraphs_append = parsed_data["paragraphs"].append
+        links_append = parsed_data["links"].append
+        images_append = parsed_data["images"].append
+        
+        # 单次遍历文档树，按标签名分发提取
+        for node in (tree.root.traverse() if tree.root else ()):
+            name = node.tag
+            
+            if name in _HEADING_TAGS:
+                # 提取标题
+                headings_append({
+                    "level": name,
+                    "text": node.text(strip=True)
+                })
+            elif name == 'p':
+                # 提取段落
+                text = node.text(strip=True)
+                if text:
+                    paragraphs_append(text)
+            elif name == 'a':
+                # 提取链接
+                links_count += 1
+                attrs = node.attributes
+                if 'href' in attrs:
+                    links_append({
+                        "text": node.text(strip=True),
+                        "href": attrs['href'] or ''
+                    })
+            elif name == 'img':
+                # 提取图片
+                attrs = node.attributes
+                images_append({
+                    "src": attrs.get('src') or '',
+                    "alt": attrs.get('alt') or '',
+                    "title": attrs.get('title') or ''
+                })
+            elif name == 'meta' and not meta_found and node.attributes.get('name') == 'description':
+                # 提取meta描述
+                parsed_data["meta_description"] = node.attributes.get('content') or ''
+                meta_found = True
+        
+        parsed_data["stats"] = {
+            "text_length": raw_text_length,
+            "links_count": links_count,
+            "images_count": len(parsed_data["images"]),
+            "headings_count": len(parsed_data["headings"])
+        }
+        
+        return parsed_data
+    
+    def _parse_html_bs4(self, html_content):
+        """使用BeautifulSoup解析HTML"""
+        soup = BeautifulSoup(html_content, 'lxml')
+        text_content = soup.get_text(strip=True)
+        # stats.text_length 统计未去空白的全文长度（与原先 len(soup.get_text()) 口径一致）
+        raw_text_length = len(soup.get_text())
+        
+        # 提取各种结构化信息
+        parsed_data = {
+            "title": soup.title.string if soup.title else "",
+            "meta_description": "",
+            "headings": [],
+            "paragraphs": [],
+            "links": [],
+            "images": [],
+            "text_content": text_content,
+            "stats": {}
+        }
+        links_count = 0
+        meta_found = False
+        
+        # 循环内使用局部绑定的append，避免每次迭代查字典和属性
+        headings_append = parsed_data["headings"].append
+        paragraphs_append = parsed_data["paragraphs"].append
+        links_append = parsed_data["links"].append
+        images_append = parsed_data["images"].append
+        
+        # 单次遍历文档树，按标签名分发提取
+        for element in soup.descendants:
+            name = element.name
+            if name is None:
+                continue
+            
+            if name in _HEADING_TAGS:
+                # 提取标题
+                headings_append({
+                    "level": name,
+                    "text": element.get_text(strip=True)
+                })
+            elif name == 'p':
+                # 提取段落
+                text = element.get_text(strip=True)
+                if text:
+                    paragraphs_append(text)
+            elif name == 'a':
+                # 提取链接
+                links_count += 1
+                if element.has_attr('href'):
+                    links_append({
+                        "text": element.get_text(strip=True),
+                        "href": element['href']
+                    })
+            elif name == 'img':
+                # 提取图片
+                images_append({
+                    "src": element.get('src', ''),
+                    "alt": element.get('alt', ''),
+                    "title": element.get('title', '')
+                })
+            elif name == 'meta' and not meta_found and element.get('name') == 'description':
+                # 提取meta描述
+                parsed_data["meta_description"] = element.get('content', '')
+                meta_found = True
+        
+        parsed_data["stats"] = {
+            "text_length": raw_text_length,
+            "links_count": links_count,
+            "images_count": len(parsed_data["images"]),
+            "headings_count": len(parsed_data["headings"])
+        }
+        
+        return parsed_data
+    
+    def _extract_text(self, html_content, selector):
         """通过CSS选择器提取文本"""
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
-            elements = soup.select(selector)
+            if HTMLParser is not None:
+                elements = HTMLParser(html_content).css(selector)
+                get_text = lambda element: element.text(strip=True)
+            else:
+                elements = BeautifulSoup(html_content, 'lxml').select(selector)
+                get_text = lambda element: element.get_text(strip=True)
             
             if not elements:
                 return {
@@ -90,7 +306,7 @@ class TextUtils:
             # 提取文本内容
             texts = []
             for element in elements:
-                text = element.get_text(strip=True)
+                text = get_text(element)
                 if text:  # 只保留非空文本
                     texts.append(text)
             
@@ -104,8 +320,15 @@ class TextUtils:
         except Exception as e:
             return {"success": False, "message": f"文本提取失败: {str(e)}"}
     
-    def filter_content(self, text_list, keywords, mode='any'):
-        """根据关键词筛选内容"""
+    def filter_content(self, text_list, keywords, mode='any', pre_lowered=False):
+        """根据关键词筛选内容
+        
+        Args:
+            text_list: 待筛选的文本列表
+            keywords: 关键词列表
+            mode: 筛选模式 (any/all/exact)
+            pre_lowered: text_list是否已全部小写；对同一批文本多次筛选时可预先小写一次，跳过逐条lower()
+        """
         try:
             if not text_list:
                 return {
@@ -123,26 +346,39 @@ class TextUtils:
                     "count": len(text_list)
                 }
             
-            filtered_results = []
-            
-            for text in text_list:
-                text_lower = text.lower()
-                keywords_lower = [kw.lower() for kw in keywords]
-                
-                if mode == 'any':
-                    # 包含任意一个关键词
-                    if any(keyword in text_lower for keyword in keywords_lower):
-                        filtered_results.append(text)
-                elif mode == 'all':
-                    # 包含所有关键词
+            # 关键词只需小写化一次
+            keywords_lower = tuple(kw.lower() for kw in keywords)
+            lower = _identity if pre_lowered else str.lower
+            
+            automaton = None
+            if (ahocorasick is not None and mode in ('any', 'all')
+                    and len(keywords_lower) >= _AHOCORASICK_MIN_KEYWORDS and all(keywords_lower)):
+                automaton = self._build_keyword_automaton(keywords_lower)
+            
+            if automaton is not None:
+                # 关键词较多 - 自动机单次扫描文本
+                required = len(automaton) if mode == 'all' else 1
+                filtered_results = [
+                    text for text in text_list
+                    if self._count_keyword_hits(automaton, lower(text), required) >= required
+                ]
+            elif mode == 'any':
+                # 包含任意一个关键词 - 合并为一个正则，单次扫描
+                pattern = re.compile('|'.join(map(re.escape, keywords_lower)))
+                filtered_results = [text for text in text_list if pattern.search(lower(text))]
+            elif mode == 'all':
+                # 包含所有关键词
+                filtered_results = []
+                for text in text_list:
+                    text_lower = lower(text)
                     if all(keyword in text_lower for keyword in keywords_lower):
                         filtered_results.append(text)
-                elif mode == 'exact':
-                    # 精确匹配任意关键词
-                    if any(keyword == text_lower for keyword in keywords_lower):
-                        filtered_results.append(text)
-                else:
-                    return {"success": False, "message": f"不支持的筛选模式: {mode}"}
+            elif mode == 'exact':
+                # 精确匹配任意关键词 - 集合O(1)查找
+                keywords_set = frozenset(keywords_lower)
+                filtered_results = [text for text in text_list if lower(text) in keywords_set]
+            else:
+                return {"success": False, "message": f"不支持的筛选模式: {mode}"}
             
             return {
                 "success": True,
@@ -155,6 +391,23 @@ class TextUtils:
         except Exception as e:
             return {"success": False, "message": f"内容筛选失败: {str(e)}"}
     
+    def _build_keyword_automaton(self, keywords_lower):
+        """构建关键词Aho-Corasick自动机"""
+        automaton = ahocorasick.Automaton()
+        for keyword in keywords_lower:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        return automaton
+    
+    def _count_keyword_hits(self, automaton, text_lower, required):
+        """统计文本中出现的不同关键词数，达到required即提前结束"""
+        hits = set()
+        for _, keyword in automaton.iter(text_lower):
+            hits.add(keyword)
+            if len(hits) >= required:
+                break
+        return len(hits)
+    
     def clean_text(self, text):
         """清理和标准化文本"""
         try:
@@ -170,34 +423,33 @@ class TextUtils:
             changes = []
             
             # 1. 去除HTML标签
-            if '<' in text and '>' in text:
-                clean_text = BeautifulSoup(text, 'lxml').get_text()
+            if _RE_HTMLTAG.search(text):
+                clean_text = lxml.html.fragment_fromstring(text, create_parent=True).text_content()
                 if clean_text != text:
                     changes.append("移除HTML标签")
                     text = clean_text
             
-            # 2. 标准化空白字符
-            # 将多个空白字符替换为单个空格
-            original_whitespace = text
-            text = re.sub(r'\s+', ' ', text)
-            if text != original_whitespace:
+            # 2-4. 先去首尾空白，再用一次正则扫描折叠空白并移除控制字符
+            # （折叠与去首尾空白可交换，结果与原先 折叠 → 去首尾 → 移除控制字符 的顺序相同）
+            stripped = text.strip()
+            cleaned, interior_changed, control_removed = _clean_scan(stripped)
+            
+            # "标准化空白字符"：原文中任一空白串不是单个空格（含首尾被去掉的空白串）
+            whitespace_changed = interior_changed
+            if not whitespace_changed and len(stripped) != len(text):
+                leading = text[:len(text) - len(text.lstrip())]
+                trailing = text[len(text.rstrip()):]
+                whitespace_changed = leading not in ('', ' ') or trailing not in ('', ' ')
+            if whitespace_changed:
                 changes.append("标准化空白字符")
-            
-            # 3. 去除首尾空白
-            text = text.strip()
-            if text != original_whitespace.strip():
+            # "去除首尾空白"：沿用原口径，比较折叠后去首尾的文本与原文去首尾的文本
+            if interior_changed:
                 changes.append("去除首尾空白")
-            
-            # 4. 去除特殊控制字符
-            control_chars = re.compile(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
-            cleaned = control_chars.sub('', text)
-            if cleaned != text:
+            if control_removed:
                 changes.append("移除控制字符")
-                text = cleaned
             
             # 5. 标准化引号
-            text = text.replace('"', '"').replace('"', '"')
-            text = text.replace(''', "'").replace(''', "'")
+            text = cleaned.translate(_QUOTE_TABLE)
             
             return {
                 "success": True,
@@ -210,16 +462,27 @@ class TextUtils:
         except Exception as e:
             return {"success": False, "message": f"文本清理失败: {str(e)}"}
     
-    def extract_links(self, html_content, base_url=None):
+    def _extract_links(self, html_content, base_url=None):
         """提取页面中的所有链接"""
         try:
-            soup = BeautifulSoup(html_content, 'lxml')
-            links = []
+            if HTMLParser is not None:
+                link_pairs = (
+                    (node.attributes.get('href') or '', node.text(strip=True))
+                    for node in HTMLParser(html_content).css('a[href]')
+                )
+            else:
+                link_pairs = (
+                    (node['href'], node.get_text(strip=True))
+                    for node in BeautifulSoup(html_content, 'lxml').find_all('a', href=True)
+                )
+            unique_links = []
+            seen_urls = set()
+            total_found = 0
+            base_netloc = urlparse(base_url).netloc if base_url else ''
             
-            # 提取所有<a>标签的href属性
-            for link_element in soup.find_all('a', href=True):
-                href = link_element['href']
-                text = link_element.get_text(strip=True)
+            # 提取所有<a>标签的href属性，边提取边去重（基于URL）
+            for href, text in link_pairs:
+                total_found += 1
                 
                 # 处理相对链接
                 if base_url and href:
@@ -230,29 +493,24 @@ class TextUtils:
                 else:
                     absolute_url = href
                 
-                link_info = {
+                if absolute_url in seen_urls:
+                    continue
+                seen_urls.add(absolute_url)
+                
+                unique_links.append({
                     "url": absolute_url,
                     "text": text,
                     "original_href": href,
-                    "is_external": self._is_external_link(absolute_url, base_url) if base_url else False
-                }
-                links.append(link_info)
-            
-            # 去重（基于URL）
-            unique_links = []
-            seen_urls = set()
-            for link in links:
-                if link["url"] not in seen_urls:
-                    unique_links.append(link)
-                    seen_urls.add(link["url"])
+                    "is_external": self._is_external_link(absolute_url, base_netloc) if base_url else False
+                })
             
             return {
                 "success": True,
                 "message": f"链接提取完成: {len(unique_links)}个唯一链接",
                 "data": unique_links,
                 "count": len(unique_links),
-                "total_found": len(links),
-                "duplicates_removed": len(links) - len(unique_links)
+                "total_found": total_found,
+                "duplicates_removed": total_found - len(unique_links)
             }
         except Exception as e:
             return {"success": False, "message": f"链接提取失败: {str(e)}"}
@@ -279,29 +537,27 @@ class TextUtils:
             paragraph_count = len([p for p in text.split('\n\n') if p.strip()])
             
             # 提取数字
-            numbers = re.findall(r'\d+', text)
+            numbers = _RE_NUMBERS.findall(text)
             
             # 提取邮箱
-            emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+            emails = _RE_EMAIL.findall(text)
             
             # 提取URL
-            urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', text)
+            urls = _RE_URL.findall(text)
             
             # 提取中文字符数
-            chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
+            chinese_chars = len(_RE_CHINESE.findall(text))
             
             # 提取英文单词数
-            english_words = len(re.findall(r'\b[A-Za-z]+\b', text))
+            english_words = len(_RE_ENGLISH.findall(text))
             
             # 常见词频分析（简单版本）
-            words = re.findall(r'\b\w+\b', text.lower())
-            word_freq = {}
-            for word in words:
-                if len(word) > 2:  # 只统计长度大于2的词
-                    word_freq[word] = word_freq.get(word, 0) + 1
+            words = _RE_WORDS.findall(text.lower())
+            word_freq = Counter(word for word in words if len(word) > 2)  # 只统计长度大于2的词
+            total_word_length = sum(map(len, words))
             
             # 取频率最高的10个词
-            top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
+            top_words = word_freq.most_common(10)
             
             analysis_result = {
                 "basic_stats": {
@@ -322,8 +578,8 @@ class TextUtils:
                     "unique_words": len(word_freq)
                 },
                 "text_metrics": {
-                    "avg_word_length": sum(len(word) for word in words) / len(words) if words else 0,
-                    "avg_sentence_length": char_count / max(text.count('.') + text.count('!') + text.count('?'), 1)
+                    "avg_word_length": total_word_length / len(words) if words else 0,
+                    "avg_sentence_length": char_count / max(len(_RE_SENT_TERMS.findall(text)), 1)
                 }
             }
             
@@ -335,15 +591,14 @@ class TextUtils:
         except Exception as e:
             return {"success": False, "message": f"文本分析失败: {str(e)}"}
     
-    def _is_external_link(self, url, base_url):
-        """判断是否为外部链接"""
+    def _is_external_link(self, url, base_netloc):
+        """判断是否为外部链接（base_netloc由调用方预先解析）"""
         try:
-            if not url or not base_url:
+            if not url:
                 return False
             
             url_domain = urlparse(url).netloc
-            base_domain = urlparse(base_url).netloc
             
-            return url_domain != base_domain and url_domain != ""
+            return url_domain != base_netloc and url_domain != ""
         except:
             return False
\ No newline at end of file
@@ -4,10 +4,23 @@
 基于虚拟滚动突破技术，实现完整的帖子和评论分析
 """
 
+import re
 import json
 import asyncio
+import hashlib
 import logging
+import weakref
+from datetime import datetime
+from functools import lru_cache
 from typing import Dict, Any, List, Optional
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+# 可选：orjson 解析大体积帖子数据更快，不可用时回退标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 # 导入标签页管理相关类型
 try:
@@ -17,385 +30,1000 @@ except ImportError:
     class TabType:
         USER_PROFILE = "user_profile"
 
-class XiaohongshuAnalyzer:
-    """小红书专用分析器 - 直接依赖 BrowserService 基础能力"""
+_LEADING_INT = re.compile(r'\s*([+-]?\d+)')
+
+# 只需要执行状态时，在页面内把回复结果裁剪为 success/message，data 不再序列化回传
+_STATUS_ONLY_SUFFIX = ".then(result => ({success: result.success, message: result.message}))"
+
+
+def _parse_int(value):
+    """按 JS parseInt(value || 0) 的语义取整数：空值为0，无法解析时返回 None（对应 NaN）"""
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value)
+    # 常见情况是纯数字字符串，直接转换，跳过正则匹配
+    if value.isascii() and value.isdigit():
+        return int(value)
+    match = _LEADING_INT.match(value)
+    return int(match.group(1)) if match else None
+
+
+def _js_str(value) -> str:
+    """将任意字符串转为可直接嵌入生成脚本的JS字符串字面量（含引号）"""
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+# 小红书页面公共JS助手：通过 install_helpers 每个页面注入一次（含后续导航），
+# 各生成脚本通过 window.__xhs 调用，不再重复发送数据源解析与等待逻辑
+_XHS_HELPERS_JS = """
+(function() {
+    if (window.__xhs) return;
     
-    def __init__(self, browser_service):
-        self.browser = browser_service  # 依赖简化的 BrowserService
-        self.logger = logging.getLogger(__name__)
+    // 帖子数据源缓存：按URL缓存，DOM变化（滚动加载、切换页面）时作废
+    let postsCache = null;
+    let postsObserver = null;
+    // 标题→索引缓存：帖子数组或长度变化时重建
+    let titleIndexCache = null;
+    // data-index→帖子元素缓存：基于实时集合，命中时校验元素仍有效，失效才重建
+    const noteItems = document.getElementsByClassName('note-item');
+    let noteItemIndex = new Map();
     
-    def generate_auto_scroll_script(self) -> str:
-        """生成自动滚动脚本，加载所有帖子到全局状态"""
-        return """
-// === 小红书自动滚动加载所有帖子 ===
-async function autoScrollLoadAllPosts() {
-    console.log("🚀 开始小红书自动滚动加载所有帖子...");
+    // 解析当前页面的帖子数组（搜索页面 / 用户主页），返回 {posts, source, message}
+    function getPosts() {
+        const currentUrl = window.location.href;
+        if (postsCache && postsCache.href === currentUrl) {
+            return postsCache.ref;
+        }
+        
+        const state = window.__INITIAL_STATE__;
+        let ref;
+        if (currentUrl.includes('/search')) {
+            const search = state && state.search;
+            const feeds = search && search.feeds && search.feeds._rawValue;
+            ref = feeds
+                ? { posts: feeds, source: 'search' }
+                : { posts: null, source: 'search', message: "无法获取搜索页面数据" };
+        } else if (currentUrl.includes('/user/profile/')) {
+            const user = state && state.user;
+            if (user && user.notes) {
+                const notesData = user.notes._rawValue || user.notes;
+                // 用户主页的特殊数据结构：notes[0]才是实际帖子数组
+                ref = (Array.isArray(notesData) && notesData.length > 0 && Array.isArray(notesData[0]))
+                    ? { posts: notesData[0], source: 'user' }
+                    : { posts: null, source: 'user', message: "用户主页帖子数据结构异常" };
+            } else {
+                ref = { posts: null, source: 'user', message: "无法获取用户主页数据" };
+            }
+        } else {
+            ref = { posts: null, source: null, message: "不支持的页面类型，请在搜索页面或用户主页使用" };
+        }
+        
+        if (ref.posts) {
+            postsCache = { href: currentUrl, ref: ref };
+            if (!postsObserver && document.body) {
+                postsObserver = new MutationObserver(() => {
+                    postsCache = null;
+                });
+                postsObserver.observe(document.body, { childList: true, subtree: true });
+            }
+        }
+        return ref;
+    }
     
-    let lastCount = 0;
-    let noNewContentCount = 0;
-    const maxNoNewRounds = 3;
-    let totalScrolls = 0;
-    const maxScrolls = 50; // 防止无限滚动
+    function getTotal() {
+        const ref = getPosts();
+        return ref.posts ? ref.posts.length : 0;
+    }
     
-    try {
-        while (noNewContentCount < maxNoNewRounds && totalScrolls < maxScrolls) {
-            // 滚动到底部
-            window.scrollTo(0, document.body.scrollHeight);
-            totalScrolls++;
-            
-            // 等待加载
-            await new Promise(resolve => setTimeout(resolve, 2000));
-            
-            // 检查帖子数量
-            try {
-                // 尝试从全局状态获取
-                let currentPosts = [];
-                let currentCount = 0;
-                
-                // 方法1: 尝试从window.__INITIAL_STATE__获取
-                if (window.__INITIAL_STATE__ && 
-                    window.__INITIAL_STATE__.search && 
-                    window.__INITIAL_STATE__.search.feeds && 
-                    window.__INITIAL_STATE__.search.feeds._rawValue) {
-                    currentPosts = window.__INITIAL_STATE__.search.feeds._rawValue;
-                    currentCount = currentPosts.length;
-                    console.log(`📊 [全局状态] 当前帖子数: ${currentCount} (新增: ${currentCount - lastCount})`);
-                } 
-                // 方法2: 从DOM计算
-                else {
-                    const noteElements = document.querySelectorAll('.note-item, section.note-item, [data-index]');
-                    currentCount = noteElements.length;
-                    console.log(`📊 [DOM计算] 当前帖子数: ${currentCount} (新增: ${currentCount - lastCount})`);
+    // 标题→全局索引的Map；同名帖子保留第一个
+    function titleIndex(posts) {
+        if (!titleIndexCache || titleIndexCache.posts !== posts || titleIndexCache.length !== posts.length) {
+            const map = new Map();
+            for (let i = 0; i < posts.length; i++) {
+                const noteCard = posts[i] && posts[i].noteCard;
+                const postTitle = noteCard && noteCard.displayTitle;
+                if (postTitle && !map.has(postTitle)) {
+                    map.set(postTitle, i);
                 }
-                
-                if (currentCount === lastCount) {
-                    noNewContentCount++;
-                    console.log(`⏳ 无新增内容 (${noNewContentCount}/${maxNoNewRounds}) - 滚动次数: ${totalScrolls}`);
-                } else {
-                    noNewContentCount = 0;
-                    console.log(`✅ 新增了 ${currentCount - lastCount} 个帖子 - 滚动次数: ${totalScrolls}`);
+            }
+            titleIndexCache = { posts: posts, length: posts.length, map: map };
+        }
+        return titleIndexCache.map;
+    }
+    
+    // 按 data-index 定位帖子元素；虚拟列表会移除/复用节点，因此命中后校验连接状态与索引
+    function findNoteItem(index) {
+        const cached = noteItemIndex.get(index);
+        if (cached && cached.isConnected && +cached.dataset.index === index) {
+            return cached;
+        }
+        noteItemIndex = new Map();
+        for (let i = 0; i < noteItems.length; i++) {
+            const raw = noteItems[i].dataset.index;
+            if (raw) {
+                const di = +raw;
+                if (di === di && !noteItemIndex.has(di)) {
+                    noteItemIndex.set(di, noteItems[i]);
                 }
-                
-                lastCount = currentCount;
-                
-            } catch (error) {
-                console.log("❌ 获取帖子数据失败:", error);
-                noNewContentCount++;
             }
         }
+        return noteItemIndex.get(index) || null;
+    }
+    
+    // === 事件驱动的等待工具：事件到达即返回，超时作为兜底 ===
+    function waitForScrollEnd(timeout) {
+        return new Promise(resolve => {
+            const finish = () => {
+                clearTimeout(timer);
+                window.removeEventListener('scrollend', finish);
+                resolve();
+            };
+            const timer = setTimeout(finish, timeout);
+            window.addEventListener('scrollend', finish);
+        });
+    }
+    
+    // selector 可以是CSS选择器，也可以是返回元素的查找函数
+    function waitForElement(selector, timeout) {
+        const find = typeof selector === 'function' ? selector : () => document.querySelector(selector);
+        return new Promise(resolve => {
+            const existing = find();
+            if (existing || timeout <= 0) {
+                resolve(existing);
+                return;
+            }
+            const finish = (element) => {
+                observer.disconnect();
+                clearTimeout(timer);
+                resolve(element);
+            };
+            const observer = new MutationObserver(() => {
+                const element = find();
+                if (element) finish(element);
+            });
+            observer.observe(document.body, { childList: true, subtree: true });
+            const timer = setTimeout(() => finish(null), timeout);
+        });
+    }
+    
+    // 监听 pushState/replaceState/popstate，URL 离开 fromUrl 即返回 true，超时返回 false
+    function waitForUrlChange(fromUrl, timeout) {
+        return new Promise(resolve => {
+            const originalPush = history.pushState;
+            const originalReplace = history.replaceState;
+            let timer = null;
+            const finish = () => {
+                clearTimeout(timer);
+                history.pushState = originalPush;
+                history.replaceState = originalReplace;
+                window.removeEventListener('popstate', check);
+                resolve(window.location.href !== fromUrl);
+            };
+            const check = () => {
+                if (window.location.href !== fromUrl) finish();
+            };
+            history.pushState = function() {
+                const result = originalPush.apply(this, arguments);
+                check();
+                return result;
+            };
+            history.replaceState = function() {
+                const result = originalReplace.apply(this, arguments);
+                check();
+                return result;
+            };
+            window.addEventListener('popstate', check);
+            timer = setTimeout(finish, timeout);
+        });
+    }
+    
+    window.__xhs = {
+        getPosts: getPosts,
+        getTotal: getTotal,
+        titleIndex: titleIndex,
+        findNoteItem: findNoteItem,
+        waitForScrollEnd: waitForScrollEnd,
+        waitForElement: waitForElement,
+        waitForUrlChange: waitForUrlChange
+    };
+})();
+"""
+
+
+# 滚动参数：默认瞬时滚动；平滑滚动仅用于调试观察
+_INSTANT_SCROLL_OPTIONS = "{ behavior: 'instant', settleMs: 300, intoViewMs: 100 }"
+_SMOOTH_SCROLL_OPTIONS = "{ behavior: 'smooth', settleMs: 3000, intoViewMs: 500 }"
+
+# 用户主页数据就绪判断：全局状态中已有用户信息
+_USER_STATE_READY_JS = "() => !!(window.__INITIAL_STATE__ && window.__INITIAL_STATE__.user)"
+
+# 纯滚动阶段拦截的资源类型：帖子数据来自 __INITIAL_STATE__，图片地址也在JSON里
+_LEAN_BLOCKED_RESOURCE_TYPES = frozenset({"image", "stylesheet", "font", "media"})
+
+
+async def _lean_route_handler(route):
+    """精简模式路由：丢弃渲染类资源，其余请求照常放行"""
+    if route.request.resource_type in _LEAN_BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+# 点击帖子脚本的固定部分，只在模块加载时构建一次；调用时仅拼接末尾的执行语句
+_CLICK_POST_SCRIPT = """
+// === 通用版：通过标题点击小红书帖子（支持搜索页面和用户主页）===
+async function clickPostByTitle(targetTitle, scrollOptions = null, trustedClick = false) {
+    console.log(`🎯 尝试点击标题为 "${targetTitle}" 的帖子`);
+    
+    try {
+        // 第一步：根据页面类型获取帖子数据（单次解析）
+        const postsRef = window.__xhs.getPosts();
+        if (!postsRef.posts) {
+            return {
+                success: false,
+                message: postsRef.message
+            };
+        }
         
-        console.log(`🎯 滚动完成，总共加载了 ${lastCount} 个帖子，总滚动次数: ${totalScrolls}`);
+        const allPosts = postsRef.posts;
+        console.log(`📊 [${postsRef.source === 'search' ? '搜索页面' : '用户主页'}] 总帖子数: ${allPosts.length}`);
         
-        const result = {
-            success: true,
-            total_posts: lastCount,
-            total_scrolls: totalScrolls,
-            message: "成功加载 " + lastCount + " 个帖子 (滚动" + totalScrolls + "次)"
-        };
-        console.log("📤 准备返回结果:", JSON.stringify(result));
-        return result;
+        if (allPosts.length === 0) {
+            return {
+                success: false,
+                message: "帖子数据为空"
+            };
+        }
         
-    } catch (error) {
-        console.log("❌ 自动滚动过程中发生错误:", error);
-        let errorMessage = '未知错误';
-        try {
-            errorMessage = error.message || error.toString() || '未知错误';
-        } catch (e) {
-            errorMessage = '错误处理异常';
+        // 第二步：精确匹配查找标题（标题→索引的Map按帖子数组缓存，数组变化时重建）
+        const titleIndex = window.__xhs.titleIndex(allPosts);
+        const matchedIndex = titleIndex.has(targetTitle) ? titleIndex.get(targetTitle) : -1;
+        if (matchedIndex !== -1) {
+            console.log(`✅ 精确匹配找到帖子: "${targetTitle}"`);
         }
         
-        const result = {
+        if (matchedIndex === -1) {
+            console.log(`❌ 未找到精确匹配 "${targetTitle}" 的帖子`);
+            return {
+                success: false,
+                message: `未找到精确匹配的帖子: "${targetTitle}"`
+            };
+        }
+        
+        console.log(`📍 匹配的帖子全局索引: ${matchedIndex}`);
+        
+        // 第三步：使用现有的索引点击逻辑，直接传入已解析的帖子数组
+        return await clickPostByGlobalIndex(matchedIndex, targetTitle, allPosts, scrollOptions, trustedClick);
+        
+    } catch (error) {
+        console.log(`❌ 通过标题点击帖子失败: ${error.message}`);
+        return {
             success: false,
-            message: "滚动失败: " + errorMessage,
-            total_posts: (typeof lastCount !== 'undefined') ? lastCount : 0,
-            total_scrolls: (typeof totalScrolls !== 'undefined') ? totalScrolls : 0
+            message: `通过标题点击帖子失败: ${error.message}`
         };
-        console.log("📤 准备返回错误结果:", JSON.stringify(result));
-        return result;
     }
 }
 
-// 执行滚动并返回结果
-(async function() {
-    return await autoScrollLoadAllPosts();
-})();
-        """
+// === 索引点击逻辑（支持搜索页面和用户主页）===
+async function clickPostByGlobalIndex(globalIndex, targetTitle = null, posts = null, scrollOptions = null, trustedClick = false) {
+    console.log(`🎯 尝试点击全局索引 ${globalIndex} 的帖子`);
     
-    def generate_click_post_script(self, title: str) -> str:
-        """生成通过标题点击帖子的脚本（支持搜索页面和用户主页）"""
-        # 转义标题中的引号和特殊字符
-        escaped_title = title.replace('\\', '\\\\').replace('"', '\\"').replace('`', '\\`')
-        return f"""
-// === 通用版：通过标题点击小红书帖子（支持搜索页面和用户主页）===
-async function clickPostByTitle(targetTitle) {{
-    console.log(`🎯 尝试点击标题为 "${{targetTitle}}" 的帖子`);
+    // 滚动方式：默认瞬时滚动，平滑滚动仅用于调试
+    const scroll = scrollOptions || { behavior: 'instant', settleMs: 300, intoViewMs: 100 };
     
-    try {{
-        // 第一步：根据页面类型获取帖子数据
-        let allPosts = [];
-        const currentUrl = window.location.href;
+    try {
+        // 未传入帖子数组时按页面类型解析（命中缓存时无需重新遍历状态树）
+        if (posts === null) {
+            posts = window.__xhs.getPosts().posts;
+        }
+        const totalPosts = posts ? posts.length : 0;
         
-        console.log("📍 当前页面:", currentUrl);
+        if (!totalPosts) {
+            return {
+                success: false,
+                message: "无法获取帖子总数"
+            };
+        }
         
-        if (currentUrl.includes('/search')) {{
-            // 搜索页面逻辑
-            console.log("🔍 检测到搜索页面，使用搜索数据源");
-            if (window.__INITIAL_STATE__ && 
-                window.__INITIAL_STATE__.search && 
-                window.__INITIAL_STATE__.search.feeds && 
-                window.__INITIAL_STATE__.search.feeds._rawValue) {{
+        console.log(`📊 [通用] 总帖子数: ${totalPosts}`);
+        
+        if (globalIndex >= totalPosts) {
+            return {
+                success: false,
+                message: `索引超出范围: ${globalIndex} >= ${totalPosts}`
+            };
+        }
+        
+        // 计算目标位置并滚动
+        const scrollPercent = globalIndex / Math.max(totalPosts, 1);
+        const targetScrollPosition = scrollPercent * document.body.scrollHeight;
+        
+        console.log(`📍 目标位置: ${(scrollPercent * 100).toFixed(2)}% (${targetScrollPosition}px)`);
+        
+        // 滚动到目标位置
+        window.scrollTo({
+            top: targetScrollPosition,
+            behavior: scroll.behavior
+        });
+        
+        // 等待滚动结束，再等待目标帖子渲染，两者合计最多3秒
+        const settleDeadline = Date.now() + 3000;
+        await window.__xhs.waitForScrollEnd(scroll.settleMs);
+        
+        // 查找目标帖子并点击：data-index→元素缓存直接定位，缓存失效时才重建
+        const noteItems = document.getElementsByClassName('note-item');
+        console.log(`📋 当前DOM中有 ${noteItems.length} 个帖子元素`);
+        const element = await window.__xhs.waitForElement(
+            () => window.__xhs.findNoteItem(globalIndex),
+            settleDeadline - Date.now()
+        );
+        if (element) {
+            const domIndex = globalIndex;
+            console.log(`✅ 找到目标帖子 (data-index=${domIndex})！`);
+            
+            // 滚动到目标元素
+            element.scrollIntoView({ behavior: scroll.behavior, block: 'center' });
+            await window.__xhs.waitForScrollEnd(scroll.intoViewMs);
+            
+            // 点击图片（已验证的有效策略）
+            const imgElement = element.querySelector('img');
+            if (imgElement) {
+                console.log(`🖼️ 点击帖子图片`);
                 
-                allPosts = window.__INITIAL_STATE__.search.feeds._rawValue;
-                console.log(`📊 [搜索页面] 总帖子数: ${{allPosts.length}}`);
-            }} else {{
-                return {{
-                    success: false,
-                    message: "无法获取搜索页面数据"
-                }};
-            }}
-        }} else if (currentUrl.includes('/user/profile/')) {{
-            // 用户主页逻辑  
-            console.log("👤 检测到用户主页，使用用户数据源");
-            if (window.__INITIAL_STATE__ && 
-                window.__INITIAL_STATE__.user && 
-                window.__INITIAL_STATE__.user.notes) {{
+                // 真实点击由调用方通过 Playwright 鼠标事件完成，这里只返回图片中心坐标
+                if (trustedClick) {
+                    const rect = imgElement.getBoundingClientRect();
+                    return {
+                        success: true,
+                        global_index: globalIndex,
+                        dom_index: domIndex,
+                        title: targetTitle || '',
+                        click_target: {
+                            x: rect.left + rect.width / 2,
+                            y: rect.top + rect.height / 2
+                        }
+                    };
+                }
                 
-                const notesData = window.__INITIAL_STATE__.user.notes._rawValue || window.__INITIAL_STATE__.user.notes;
+                // 记录当前URL
+                const currentUrl = window.location.href;
+                console.log(`📍 点击前URL: ${currentUrl}`);
                 
-                // 用户主页的特殊数据结构：notes[0]才是实际帖子数组
-                if (Array.isArray(notesData) && notesData.length > 0 && Array.isArray(notesData[0])) {{
-                    allPosts = notesData[0];
-                    console.log(`📊 [用户主页] 总帖子数: ${{allPosts.length}}`);
-                }} else {{
-                    return {{
-                        success: false,
-                        message: "用户主页帖子数据结构异常"
-                    }};
-                }}
-            }} else {{
-                return {{
+                // 点击前开始监听路由变化，避免漏掉同步触发的 pushState
+                const urlChangePromise = window.__xhs.waitForUrlChange(currentUrl, 5000);
+                imgElement.click();
+                
+                // 等待详情页加载：URL一变化立即返回，最多等待5秒
+                const urlChanged = await urlChangePromise;
+                if (urlChanged) {
+                    console.log(`🎯 URL已变化: ${window.location.href}`);
+                }
+                
+                if (urlChanged) {
+                    console.log(`✅ 成功跳转到帖子详情页`);
+                    return {
+                        success: true,
+                        message: targetTitle ? 
+                            `成功点击标题为 "${targetTitle}" 的帖子并跳转` :
+                            `成功点击索引 ${globalIndex} 的帖子并跳转`,
+                        global_index: globalIndex,
+                        dom_index: domIndex,
+                        title: targetTitle || '',
+                        new_url: window.location.href
+                    };
+                } else {
+                    console.log(`⚠️ 点击了图片但未检测到页面跳转`);
+                    return {
+                        success: true,
+                        message: targetTitle ? 
+                            `点击了标题为 "${targetTitle}" 的帖子，但未检测到页面跳转` :
+                            `点击了索引 ${globalIndex} 的帖子，但未检测到页面跳转`,
+                        global_index: globalIndex,
+                        dom_index: domIndex,
+                        title: targetTitle || '',
+                        warning: "未检测到URL变化"
+                    };
+                }
+            } else {
+                console.log(`❌ 找到帖子但无法找到图片元素`);
+                return {
                     success: false,
-                    message: "无法获取用户主页数据"
-                }};
-            }}
-        }} else {{
-            return {{
-                success: false,
-                message: "不支持的页面类型，请在搜索页面或用户主页使用"
-            }};
-        }}
+                    message: `找到帖子但无法找到图片元素`
+                };
+            }
+        }
+
+        console.log(`❌ 无法找到data-index为 ${globalIndex} 的帖子`);
+        return {
+            success: false,
+            message: `无法找到data-index为 ${globalIndex} 的帖子`
+        };
         
-        if (allPosts.length === 0) {{
-            return {{
+    } catch (error) {
+        console.log(`❌ 点击帖子失败: ${error.message}`);
+        return {
+            success: false,
+            message: `点击帖子失败: ${error.message}`
+        };
+    }
+}
+
+// === 按提取结果中的序号点击帖子：与 build_posts_for_database 相同的有效性过滤，序号与提取结果一一对应 ===
+async function clickPostByExtractIndex(extractIndex, expectedTitle = null, scrollOptions = null, trustedClick = false) {
+    const postsRef = window.__xhs.getPosts();
+    if (!postsRef.posts) {
+        return {
+            success: false,
+            message: postsRef.message
+        };
+    }
+    
+    const allPosts = postsRef.posts;
+    let validCount = 0;
+    for (let i = 0; i < allPosts.length; i++) {
+        if (!allPosts[i]) continue;
+        const noteCard = allPosts[i].noteCard || {};
+        const user = noteCard.user || {};
+        const title = noteCard.displayTitle || '无标题';
+        const authorName = user.nickname || user.nickName || '未知作者';
+        if (!(title !== '无标题' && title.trim() && authorName !== '未知作者' && authorName.trim())) {
+            continue;
+        }
+        if (validCount++ !== extractIndex) {
+            continue;
+        }
+        
+        // 调用方持有提取结果时校验标题，不一致说明帖子列表已变化，由调用方改用标题点击
+        if (expectedTitle !== null && title !== expectedTitle) {
+            console.log(`⚠️ 索引 ${extractIndex} 的帖子标题不一致: "${title}" ≠ "${expectedTitle}"`);
+            return {
                 success: false,
-                message: "帖子数据为空"
-            }};
-        }}
+                mismatch: true,
+                message: `索引 ${extractIndex} 的帖子标题不一致`
+            };
+        }
+        return await clickPostByGlobalIndex(i, title, allPosts, scrollOptions, trustedClick);
+    }
+    
+    return {
+        success: false,
+        message: `索引超出范围: ${extractIndex} >= ${validCount}`
+    };
+}
+
+// === 按原始帖子数组中的序号点击帖子：序号由 Python 端在整理提取结果时记录，始终校验标题 ===
+async function clickPostByFeedIndex(feedIndex, expectedTitle, scrollOptions = null, trustedClick = false) {
+    const postsRef = window.__xhs.getPosts();
+    if (!postsRef.posts) {
+        return {
+            success: false,
+            message: postsRef.message
+        };
+    }
+    
+    const post = postsRef.posts[feedIndex];
+    const title = post ? ((post.noteCard || {}).displayTitle || '无标题') : null;
+    if (title !== expectedTitle) {
+        console.log(`⚠️ 序号 ${feedIndex} 的帖子标题不一致: "${title}" ≠ "${expectedTitle}"`);
+        return {
+            success: false,
+            mismatch: true,
+            message: `序号 ${feedIndex} 的帖子标题不一致`
+        };
+    }
+    return await clickPostByGlobalIndex(feedIndex, title, postsRef.posts, scrollOptions, trustedClick);
+}
+
+"""
+
+
+# 提取帖子原始数据脚本（固定部分），调用时只在前面拼接 extractLimit / DEBUG 定义
+_EXTRACT_ALL_POSTS_SCRIPT = """
+// === 提取小红书关键词页面帖子原始数据 ===
+
+// 只保留入库需要的字段（图片以外结构与原始数据一致），缩小返回的JSON体积
+function pickPost(post) {
+    const noteCard = post.noteCard || {};
+    const user = noteCard.user || {};
+    const interactInfo = noteCard.interactInfo || {};
+    
+    let cornerTagInfo;
+    const cornerTags = noteCard.cornerTagInfo;
+    if (Array.isArray(cornerTags)) {
+        cornerTagInfo = [];
+        for (let i = 0; i < cornerTags.length; i++) {
+            if (cornerTags[i].type === 'publish_time') {
+                cornerTagInfo.push({ type: cornerTags[i].type, text: cornerTags[i].text });
+                break;
+            }
+        }
+    }
+    
+    // 图片按列返回（主URL/宽/高/备用URL 各一个数组），避免每张图重复键名
+    let images;
+    if (Array.isArray(noteCard.imageList)) {
+        const urls = [], widths = [], heights = [], altUrls = [];
+        for (let i = 0; i < noteCard.imageList.length; i++) {
+            const img = noteCard.imageList[i];
+            const infoList = img.infoList;
+            if (infoList && infoList.length) {
+                urls.push(infoList[0].url);
+                widths.push(img.width | 0);
+                heights.push(img.height | 0);
+                altUrls.push(infoList.length > 1 ? infoList[1].url : null);
+            }
+        }
+        images = { urls: urls, widths: widths, heights: heights, alt_urls: altUrls };
+    }
+    
+    return {
+        id: post.id,
+        noteCard: {
+            displayTitle: noteCard.displayTitle,
+            type: noteCard.type,
+            user: { userId: user.userId, nickname: user.nickname, nickName: user.nickName },
+            interactInfo: {
+                likedCount: interactInfo.likedCount,
+                collectedCount: interactInfo.collectedCount,
+                commentCount: interactInfo.commentCount,
+                sharedCount: interactInfo.sharedCount
+            },
+            cornerTagInfo: cornerTagInfo,
+            images: images
+        }
+    };
+}
+
+function extractAllPostsForDatabase() {
+    try {
+        const postsRef = window.__xhs.getPosts();
+        if (postsRef.source !== 'search' || !postsRef.posts) {
+            return {
+                success: false,
+                message: `提取失败: ${postsRef.posts ? "请在关键词搜索页面使用" : postsRef.message}`
+            };
+        }
+        const posts = postsRef.posts;
         
-        // 第二步：精确匹配查找标题
-        let matchedIndex = -1;
+        // 根据limit参数限制处理的帖子数量
+        const postsToProcess = extractLimit ? posts.slice(0, extractLimit) : posts;
+        console.log(`📋 找到 ${posts.length} 个帖子，返回 ${postsToProcess.length} 个 ${extractLimit ? `(限制前${extractLimit}个)` : '(全部)'}`);
+        
+        const picked = new Array(postsToProcess.length);
+        for (let i = 0; i < postsToProcess.length; i++) {
+            picked[i] = pickPost(postsToProcess[i]);
+            // 逐条输出仅在调试时开启，避免大量 console 消息经 CDP 回传
+            if (DEBUG) {
+                console.log(`📄 帖子${i + 1}:`, picked[i]);
+            }
+        }
         
-        console.log("🔍 开始精确匹配查找帖子...");
+        // 以字符串返回，Python 端一次性解析
+        return JSON.stringify(picked);
         
-        for (let i = 0; i < allPosts.length; i++) {{
-            const post = allPosts[i];
-            let postTitle = '';
-            
-            // 获取帖子标题
-            if (post.noteCard && post.noteCard.displayTitle) {{
-                postTitle = post.noteCard.displayTitle;
-            }}
-            
-            if (postTitle) {{
-                console.log(`📄 帖子 ${{i}}: "${{postTitle}}"`);
-                
-                // 精确匹配
-                if (postTitle === targetTitle) {{
-                    matchedIndex = i;
-                    console.log(`✅ 精确匹配找到帖子: "${{postTitle}}"`);
-                    break;
-                }}
-            }}
-        }}
+    } catch (error) {
+        console.log("❌ 提取失败:", error);
+        return {
+            success: false,
+            message: `提取失败: ${error.message}`
+        };
+    }
+}
+
+// 执行提取
+extractAllPostsForDatabase();
+"""
+
+
+# 回复评论脚本的固定部分，回复参数在执行语句中传入
+_REPLY_TO_COMMENT_SCRIPT = """
+// 共享的空数组：缺失的列表字段统一归一化为它，循环处无需再判空
+const EMPTY_ARR = Object.freeze([]);
+// 帖子详情页URL中的帖子ID（/explore/ 与 /discovery/item/ 两种路径）
+const NOTE_ID_RE = /\\/(?:explore|discovery\\/item)\\/([a-f0-9]+)/i;
+
+// 回复按钮快照（XPath 在原生层完成类名与文本匹配，按文档顺序返回）；
+// 缓存在页面上供多次回复复用，评论区DOM变化时作废
+function getReplyButtons() {
+    const scope = document.querySelector('.comments-container') || document;
+    const cache = window.__xhsReplyCache;
+    if (cache && cache.scope === scope && cache.buttons) {
+        return cache.buttons;
+    }
+    if (cache) {
+        cache.observer.disconnect();
+    }
+    
+    const buttons = document.evaluate(
+        ".//*[contains(@class, 'reply icon-container') and normalize-space(.) = '回复']",
+        scope, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+    );
+    const entry = { scope: scope, buttons: buttons, observer: null };
+    entry.observer = new MutationObserver(() => {
+        entry.buttons = null;
+    });
+    entry.observer.observe(scope === document ? document.body : scope, { childList: true, subtree: true, characterData: true });
+    window.__xhsReplyCache = entry;
+    return buttons;
+}
+
+// 等待下一次DOM变化并再等一帧完成渲染，超时兜底；需在触发操作之前调用，避免漏掉同步发生的变化
+function waitForDomChange(timeout) {
+    return new Promise(resolve => {
+        const finish = () => {
+            observer.disconnect();
+            clearTimeout(timer);
+            requestAnimationFrame(() => resolve());
+        };
+        const observer = new MutationObserver(finish);
+        observer.observe(document.body, { childList: true, subtree: true, attributes: true, characterData: true });
+        const timer = setTimeout(finish, timeout);
+    });
+}
+
+// 读取当前帖子的评论上下文（帖子ID、作者ID、主评论列表），批量回复时只读取一次
+function loadCommentContext() {
+    const urlMatch = NOTE_ID_RE.exec(window.location.href);
+    const currentNoteId = urlMatch[1];
+    const noteDetail = window.__INITIAL_STATE__.note.noteDetailMap[currentNoteId];
+    return {
+        noteId: currentNoteId,
+        authorUserId: noteDetail.note?.user?.userId || '',
+        mainComments: noteDetail.comments.list
+    };
+}
+
+// 按用户ID建立评论索引（值为按文档顺序排列的候选列表），批量回复时每个目标只需比对同一用户的评论
+function buildUserIndex(context) {
+    const index = new Map();
+    const add = (comment, globalIndex, mainIndex, type, parentId) => {
+        const userInfo = comment.userInfo;
+        const userId = (userInfo && userInfo.userId) || '';
+        const entry = { comment: comment, globalIndex: globalIndex, mainIndex: mainIndex, type: type, parentId: parentId };
+        const bucket = index.get(userId);
+        if (bucket) {
+            bucket.push(entry);
+        } else {
+            index.set(userId, [entry]);
+        }
+    };
+    
+    const mainComments = context.mainComments;
+    let globalIndex = 0;
+    for (let mainIndex = 0; mainIndex < mainComments.length; mainIndex++) {
+        const comment = mainComments[mainIndex];
+        add(comment, ++globalIndex, mainIndex, 'main');
+        const subComments = Array.isArray(comment.subComments) ? comment.subComments : EMPTY_ARR;
+        for (const reply of subComments) {
+            add(reply, ++globalIndex, mainIndex, 'reply', comment.id);
+        }
+    }
+    context.userIndex = index;
+}
+
+// 逐条比对目标评论，命中即停止（先比用户ID，再比用户名，最后才做内容子串匹配）；
+// 已建立用户索引时只比对该用户的评论
+function findTargetComment(context, replyParams, DEBUG) {
+    const mainComments = context.mainComments;
+    const isTarget = (comment) => {
+        const userInfo = comment.userInfo;
+        if (((userInfo && userInfo.userId) || '') !== replyParams.target_user_id) return false;
+        if (((userInfo && userInfo.nickname) || '未知用户') !== replyParams.target_username) return false;
+        return (comment.content || '').includes(replyParams.target_content);
+    };
+    const toRecord = (comment, globalIndex, mainIndex, type, parentId) => {
+        const userInfo = comment.userInfo;
+        const userId = userInfo && userInfo.userId;
+        const record = {
+            global_index: globalIndex,
+            comment_id: comment.id,
+            user_id: userId || '',
+            username: (userInfo && userInfo.nickname) || '未知用户',
+            content: comment.content || '',
+            type: type,
+            is_author: userId === context.authorUserId,
+            reply_button_index: mainIndex + 1
+        };
+        if (parentId !== undefined) record.parent_comment_id = parentId;
+        return record;
+    };
+    
+    if (context.userIndex) {
+        const candidates = context.userIndex.get(replyParams.target_user_id) || [];
+        for (let i = 0; i < candidates.length; i++) {
+            const entry = candidates[i];
+            if (isTarget(entry.comment)) {
+                return toRecord(entry.comment, entry.globalIndex, entry.mainIndex, entry.type, entry.parentId);
+            }
+        }
+        console.log(`❌ 未找到匹配的评论（该用户共 ${candidates.length} 条评论）`);
+        return null;
+    }
+    
+    let globalIndex = 0;
+    for (let mainIndex = 0; mainIndex < mainComments.length; mainIndex++) {
+        const comment = mainComments[mainIndex];
+        globalIndex++;
+        if (DEBUG) console.log(`   检查评论 ${globalIndex}: ${(comment.userInfo && comment.userInfo.nickname) || '未知用户'}`);
+        if (isTarget(comment)) {
+            return toRecord(comment, globalIndex, mainIndex, 'main');
+        }
         
-        if (matchedIndex === -1) {{
-            console.log(`❌ 未找到精确匹配 "${{targetTitle}}" 的帖子`);
-            return {{
-                success: false,
-                message: `未找到精确匹配的帖子: "${{targetTitle}}"`
-            }};
-        }}
+        const subComments = Array.isArray(comment.subComments) ? comment.subComments : EMPTY_ARR;
+        for (const reply of subComments) {
+            globalIndex++;
+            if (DEBUG) console.log(`   检查评论 ${globalIndex}: ${(reply.userInfo && reply.userInfo.nickname) || '未知用户'}`);
+            if (isTarget(reply)) {
+                return toRecord(reply, globalIndex, mainIndex, 'reply', comment.id);
+            }
+        }
+    }
+    
+    console.log(`❌ 未找到匹配的评论（已比对 ${globalIndex} 条）`);
+    return null;
+}
+
+// 对单条评论执行：匹配 → 点击回复 → 输入 → 发送；waitAfterSend 为 true 时等待发送引起的界面更新再返回
+async function replyWithContext(context, replyParams, DEBUG, waitAfterSend) {
+    try {
+        console.log("🔍 开始匹配目标评论...");
+        console.log(`   目标用户ID: ${replyParams.target_user_id}`);
+        console.log(`   目标用户名: ${replyParams.target_username}`);
+        console.log(`   目标内容: ${replyParams.target_content}`);
         
-        console.log(`📍 匹配的帖子全局索引: ${{matchedIndex}}`);
+        const targetComment = findTargetComment(context, replyParams, DEBUG);
+        if (!targetComment) {
+            throw new Error("未找到匹配的评论，请检查参数");
+        }
+        
+        console.log(`✅ 找到目标评论:`);
+        console.log(`   索引: ${targetComment.global_index}`);
+        console.log(`   ID: ${targetComment.comment_id}`);
+        console.log(`   用户: ${targetComment.username}`);
+        console.log(`   用户ID: ${targetComment.user_id}`);
+        console.log(`   内容: ${targetComment.content}`);
+        console.log(`   类型: ${targetComment.type}`);
+        console.log(`   回复按钮索引: ${targetComment.reply_button_index}`);
         
-        // 第三步：使用现有的索引点击逻辑
-        return await clickPostByGlobalIndex(matchedIndex, targetTitle, allPosts.length);
+        // 点击回复按钮
+        const realReplyButtons = getReplyButtons();
         
-    }} catch (error) {{
-        console.log(`❌ 通过标题点击帖子失败: ${{error.message}}`);
-        return {{
-            success: false,
-            message: `通过标题点击帖子失败: ${{error.message}}`
-        }};
-    }}
-}}
+        console.log(`📋 找到 ${realReplyButtons.snapshotLength} 个回复按钮`);
+        
+        if (targetComment.reply_button_index > realReplyButtons.snapshotLength) {
+            throw new Error(`回复按钮索引超出范围: ${targetComment.reply_button_index}`);
+        }
+        
+        const targetButton = realReplyButtons.snapshotItem(targetComment.reply_button_index - 1);
+        const replyUiChanged = waitForDomChange(1000);
+        targetButton.click();
+        console.log(`✅ 已点击第 ${targetComment.reply_button_index} 个回复按钮`);
+        
+        // 输入回复内容（回复框切换引起DOM变化即继续，最多等1秒；输入框未出现时再等待其出现）
+        await replyUiChanged;
+        
+        const inputBox = await window.__xhs.waitForElement('p.content-input[contenteditable="true"]', 2000);
+        if (!inputBox) {
+            throw new Error("未找到输入框");
+        }
+        
+        inputBox.focus();
+        inputBox.textContent = replyParams.reply_content;
+        const sendUiChanged = waitForDomChange(500);
+        inputBox.dispatchEvent(new Event('input', { bubbles: true }));
+        console.log(`✅ 回复内容已输入: "${replyParams.reply_content}"`);
+        
+        // 发送回复（输入触发的界面更新完成即继续，最多等0.5秒）
+        await sendUiChanged;
+        
+        // 取最后一个可见的"发送"按钮：倒序查找，命中即停
+        const buttons = document.getElementsByTagName('button');
+        let sendButton = null;
+        for (let i = buttons.length - 1; i >= 0; i--) {
+            const btn = buttons[i];
+            if (btn.textContent.trim() === '发送' && btn.offsetWidth > 0 && btn.offsetHeight > 0) {
+                sendButton = btn;
+                break;
+            }
+        }
+        
+        if (sendButton) {
+            console.log("🚀 点击发送按钮...");
+            const sentUiChanged = waitAfterSend ? waitForDomChange(1000) : null;
+            sendButton.click();
+            if (sentUiChanged) {
+                await sentUiChanged;
+            }
+            
+            return {
+                success: true,
+                message: `成功回复用户 ${targetComment.username} 的评论`,
+                data: {
+                    target_comment: {
+                        comment_id: targetComment.comment_id,
+                        user_id: targetComment.user_id,
+                        username: targetComment.username,
+                        content: targetComment.content,
+                        type: targetComment.type,
+                        global_index: targetComment.global_index
+                    },
+                    reply_content: replyParams.reply_content,
+                    reply_button_index: targetComment.reply_button_index,
+                    sent: true
+                }
+            };
+        } else {
+            return {
+                success: false,
+                message: "回复内容已输入，但未找到发送按钮",
+                data: {
+                    target_comment: {
+                        comment_id: targetComment.comment_id,
+                        user_id: targetComment.user_id,
+                        username: targetComment.username,
+                        content: targetComment.content
+                    },
+                    reply_content: replyParams.reply_content,
+                    sent: false
+                }
+            };
+        }
+        
+    } catch (error) {
+        return replyErrorResult(error, replyParams);
+    }
+}
+
+// 单条回复失败时的返回结构
+function replyErrorResult(error, replyParams) {
+    console.log("❌ 三参数回复失败:", error);
+    return {
+        success: false,
+        message: `三参数回复失败: ${error.message}`,
+        data: {
+            target_user_id: replyParams.target_user_id,
+            target_username: replyParams.target_username,
+            target_content: replyParams.target_content,
+            reply_content: replyParams.reply_content,
+            error: error.message
+        }
+    };
+}
+
+// === 小红书三参数智能回复功能 ===
+async function replyToComment(replyParams, DEBUG = false) {
+    console.log("🎯 三参数回复功能启动...");
+    
+    let context;
+    try {
+        console.log("📋 正在获取页面评论数据...");
+        context = loadCommentContext();
+        console.log(`📊 页面帖子ID: ${context.noteId}`);
+        console.log(`👤 作者ID: ${context.authorUserId}`);
+    } catch (error) {
+        return replyErrorResult(error, replyParams);
+    }
+    
+    return await replyWithContext(context, replyParams, DEBUG, false);
+}
+
+// === 批量回复：评论上下文只读取一次，按顺序逐条回复 ===
+async function replyToCommentsBatch(replyList, DEBUG = false) {
+    console.log(`🎯 批量回复启动，共 ${replyList.length} 条...`);
+    
+    let context = null;
+    let contextError = null;
+    try {
+        context = loadCommentContext();
+        console.log(`📊 页面帖子ID: ${context.noteId}`);
+        if (replyList.length > 1) {
+            buildUserIndex(context);
+        }
+    } catch (error) {
+        contextError = error;
+    }
+    
+    const results = new Array(replyList.length);
+    let successCount = 0;
+    for (let i = 0; i < replyList.length; i++) {
+        results[i] = context
+            ? await replyWithContext(context, replyList[i], DEBUG, i < replyList.length - 1)
+            : replyErrorResult(contextError, replyList[i]);
+        if (results[i].success) successCount++;
+    }
+    
+    return {
+        success: successCount > 0,
+        message: `批量回复完成: 成功 ${successCount}/${replyList.length} 条`,
+        data: {
+            total_count: replyList.length,
+            success_count: successCount,
+            results: results
+        }
+    };
+}
 
-// === 索引点击逻辑（支持搜索页面和用户主页）===
-async function clickPostByGlobalIndex(globalIndex, targetTitle = null, totalPosts = null) {{
-    console.log(`🎯 尝试点击全局索引 ${{globalIndex}} 的帖子`);
-    
-    try {{
-        // 如果没有传入totalPosts，则根据页面类型重新获取
-        if (totalPosts === null) {{
-            const currentUrl = window.location.href;
-            
-            if (currentUrl.includes('/search')) {{
-                if (window.__INITIAL_STATE__ && 
-                    window.__INITIAL_STATE__.search && 
-                    window.__INITIAL_STATE__.search.feeds && 
-                    window.__INITIAL_STATE__.search.feeds._rawValue) {{
-                    totalPosts = window.__INITIAL_STATE__.search.feeds._rawValue.length;
-                }}
-            }} else if (currentUrl.includes('/user/profile/')) {{
-                if (window.__INITIAL_STATE__ && 
-                    window.__INITIAL_STATE__.user && 
-                    window.__INITIAL_STATE__.user.notes) {{
-                    const notesData = window.__INITIAL_STATE__.user.notes._rawValue || window.__INITIAL_STATE__.user.notes;
-                    if (Array.isArray(notesData) && notesData.length > 0 && Array.isArray(notesData[0])) {{
-                        totalPosts = notesData[0].length;
-                    }}
-                }}
-            }}
-            
-            if (!totalPosts) {{
-                return {{
-                    success: false,
-                    message: "无法获取帖子总数"
-                }};
-            }}
-        }}
-        
-        console.log(`📊 [通用] 总帖子数: ${{totalPosts}}`);
+"""
+
+
+# 点击作者头像脚本的固定部分，userid/username 在执行语句中传入
+_CLICK_AUTHOR_AVATAR_SCRIPT = """
+// === 点击作者头像并获取用户信息 ===
+async function clickAuthorAvatarAndExtractProfile(userid, username) {
+    console.log(`🎯 开始获取用户信息: userid=${userid}, username=${username}`);
+    
+    try {
+        // 1. 直接查找头像元素（最常用的选择器）
+        console.log("🔍 查找头像...");
+        let avatar = document.querySelector(`[href*="${userid}"]`);
         
-        if (globalIndex >= totalPosts) {{
-            return {{
+        if (!avatar) {
+            return {
                 success: false,
-                message: `索引超出范围: ${{globalIndex}} >= ${{totalPosts}}`
-            }};
-        }}
-        
-        // 计算目标位置并滚动
-        const scrollPercent = globalIndex / Math.max(totalPosts, 1);
-        const targetScrollPosition = scrollPercent * document.body.scrollHeight;
-        
-        console.log(`📍 目标位置: ${{(scrollPercent * 100).toFixed(2)}}% (${{targetScrollPosition}}px)`);
-        
-        // 滚动到目标位置
-        window.scrollTo({{
-            top: targetScrollPosition,
-            behavior: 'smooth'
-        }});
+                message: `未找到用户 ${username} 的头像`,
+                userid: userid,
+                username: username
+            };
+        }
         
-        // 等待滚动完成和DOM更新
-        await new Promise(resolve => setTimeout(resolve, 3000));
+        console.log("✅ 找到头像，准备点击");
         
-        // 查找目标帖子并点击
-        const noteElements = document.querySelectorAll('.note-item, section.note-item, [data-index]');
-        console.log(`📋 当前DOM中有 ${{noteElements.length}} 个帖子元素`);
+        // 2. 点击头像打开用户主页（新标签页的出现由调用方监听，这里不再固定等待）
+        avatar.click();
+        console.log("📍 头像点击完成，用户主页将在新标签页中打开");
         
-        // 通过data-index属性精确查找
-        for (let element of noteElements) {{
-            const domIndex = parseInt(element.getAttribute('data-index'));
-            if (domIndex === globalIndex) {{
-                console.log(`✅ 找到目标帖子 (data-index=${{domIndex}})！`);
-                
-                // 滚动到目标元素
-                element.scrollIntoView({{ behavior: 'smooth', block: 'center' }});
-                await new Promise(resolve => setTimeout(resolve, 500));
-                
-                // 点击图片（已验证的有效策略）
-                const imgElement = element.querySelector('img');
-                if (imgElement) {{
-                    console.log(`🖼️ 点击帖子图片`);
-                    
-                    // 记录当前URL
-                    const currentUrl = window.location.href;
-                    console.log(`📍 点击前URL: ${{currentUrl}}`);
-                    
-                    imgElement.click();
-                    
-                    // 等待详情页加载并检测URL变化
-                    let urlChanged = false;
-                    for (let i = 0; i < 10; i++) {{
-                        await new Promise(resolve => setTimeout(resolve, 500));
-                        if (window.location.href !== currentUrl) {{
-                            urlChanged = true;
-                            console.log(`🎯 URL已变化: ${{window.location.href}}`);
-                            break;
-                        }}
-                        console.log(`⏳ 等待URL变化... (${{i + 1}}/10)`);
-                    }}
-                    
-                    if (urlChanged) {{
-                        console.log(`✅ 成功跳转到帖子详情页`);
-                        return {{
-                            success: true,
-                            message: targetTitle ? 
-                                `成功点击标题为 "${{targetTitle}}" 的帖子并跳转` :
-                                `成功点击索引 ${{globalIndex}} 的帖子并跳转`,
-                            global_index: globalIndex,
-                            dom_index: domIndex,
-                            title: targetTitle || '',
-                            new_url: window.location.href
-                        }};
-                    }} else {{
-                        console.log(`⚠️ 点击了图片但未检测到页面跳转`);
-                        return {{
-                            success: true,
-                            message: targetTitle ? 
-                                `点击了标题为 "${{targetTitle}}" 的帖子，但未检测到页面跳转` :
-                                `点击了索引 ${{globalIndex}} 的帖子，但未检测到页面跳转`,
-                            global_index: globalIndex,
-                            dom_index: domIndex,
-                            title: targetTitle || '',
-                            warning: "未检测到URL变化"
-                        }};
-                    }}
-                }} else {{
-                    console.log(`❌ 找到帖子但无法找到图片元素`);
-                    return {{
-                        success: false,
-                        message: `找到帖子但无法找到图片元素`
-                    }};
-                }}
-            }}
-        }}
-        
-        console.log(`❌ 无法找到data-index为 ${{globalIndex}} 的帖子`);
-        return {{
-            success: false,
-            message: `无法找到data-index为 ${{globalIndex}} 的帖子`
-        }};
+        return {
+            success: true,
+            message: "成功点击头像，用户主页已在新标签页中打开",
+            userid: userid,
+            username: username,
+            note: "请在新打开的用户主页标签页中运行数据提取脚本",
+            timestamp: new Date().toISOString()
+        };
         
-    }} catch (error) {{
-        console.log(`❌ 点击帖子失败: ${{error.message}}`);
-        return {{
+    } catch (error) {
+        console.error("❌ 点击头像失败:", error);
+        return {
             success: false,
-            message: `点击帖子失败: ${{error.message}}`
-        }};
-    }}
-}}
+            message: `点击头像失败: ${error.message}`,
+            userid: userid,
+            username: username,
+            error: error.toString()
+        };
+    }
+}
 
-// 执行点击
-(async function() {{
-    return await clickPostByTitle("{escaped_title}");
-}})();
-        """
-    
-    def generate_expand_comments_script(self) -> str:
-        """生成展开所有评论的脚本"""
-        return """
+"""
+
+
+# 展开评论脚本（固定部分），调用时只拼接末尾的执行语句
+_EXPAND_COMMENTS_SCRIPT = """
 // === 修正版：使用正确的滚动容器 ===
+
+// 等待 el 子树中新增节点：新增数达到 minAdded 即返回，否则 timeout 毫秒后返回；结果为新增节点数
+function waitForNewChildren(el, opts = {}) {
+    const timeout = opts.timeout || 2000;
+    const minAdded = opts.minAdded || 1;
+    return new Promise(resolve => {
+        let added = 0;
+        const finish = () => {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(added);
+        };
+        const observer = new MutationObserver(mutations => {
+            for (const mutation of mutations) {
+                added += mutation.addedNodes.length;
+            }
+            if (added >= minAdded) finish();
+        });
+        observer.observe(el, { childList: true, subtree: true });
+        const timer = setTimeout(finish, timeout);
+    });
+}
+
 async function expandAllComments() {
     console.log("🎯 开始修正版展开评论策略...");
     
@@ -424,6 +1052,13 @@ async function expandAllComments() {
         console.log(`📏 容器滚动高度: ${commentContainer.scrollHeight}, 可见高度: ${commentContainer.clientHeight}`);
         console.log(`📏 初始滚动位置: ${commentContainer.scrollTop}`);
         
+        // 展开按钮文案匹配（预编译，替代逐个 includes 判断）
+        const EXPAND_RE = /展开[\s\S]*(?:回复|条)|(?:回复|条)[\s\S]*展开|更多回复|\d\s*条回复/;
+        // 只在评论区子树内查找，评论区不存在时退回整个容器
+        const buttonScope = commentContainer.querySelector('.comments-container') || commentContainer;
+        // 已点击按钮 → 点击时的文案；文案未变化的按钮在后续轮次中跳过
+        const clickedButtons = new WeakMap();
+        
         while (currentRound <= maxRounds) {
             console.log(`\n🔄 ===== 第 ${currentRound} 轮展开 =====`);
             
@@ -431,6 +1066,8 @@ async function expandAllComments() {
             console.log("📜 智能滚动到底部...");
             
             let scrollRound = 1;
+            // 布局属性每轮只读一次：可见高度在滚动过程中不变，内容高度沿用上一轮的读数
+            const clientHeight = commentContainer.clientHeight;
             let lastScrollHeight = commentContainer.scrollHeight;
             
             // 多轮滚动直到真正到底部
@@ -438,17 +1075,18 @@ async function expandAllComments() {
                 console.log(`📜 第 ${scrollRound} 轮滚动...`);
                 
                 // 计算当前目标位置
-                const targetScrollTop = commentContainer.scrollHeight - commentContainer.clientHeight;
+                const targetScrollTop = lastScrollHeight - clientHeight;
                 console.log(`🎯 目标位置: ${targetScrollTop}`);
                 
-                // 滚动到底部
+                // 滚动到底部，懒加载插入新评论即继续，最多等待2秒
+                const scrollLoaded = waitForNewChildren(commentContainer, { timeout: 2000 });
                 commentContainer.scrollTop = targetScrollTop;
-                await new Promise(resolve => setTimeout(resolve, 2000));
+                await scrollLoaded;
                 
                 // 检查状态
                 const currentScrollTop = commentContainer.scrollTop;
                 const currentScrollHeight = commentContainer.scrollHeight;
-                const distanceFromBottom = currentScrollHeight - currentScrollTop - commentContainer.clientHeight;
+                const distanceFromBottom = currentScrollHeight - currentScrollTop - clientHeight;
                 
                 console.log(`📍 滚动后位置: ${currentScrollTop}/${currentScrollHeight}`);
                 console.log(`📏 距离底部: ${distanceFromBottom}px`);
@@ -472,10 +1110,9 @@ async function expandAllComments() {
             
             console.log("✅ 滚动完成，开始查找展开按钮...");
             
-            // 在整个容器内查找展开按钮（不仅仅是可见区域）
-            const expandButtons = commentContainer.querySelectorAll(
-                'button, span[role="button"], div[role="button"], [onclick], ' +
-                '.show-more, .expand-btn, [class*="expand"], [class*="more"], [class*="reply"]'
+            // 在评论区内查找展开按钮（不仅仅是可见区域），单次 querySelectorAll
+            const expandButtons = buttonScope.querySelectorAll(
+                '.show-more, .expand-btn, button, span[role="button"], div[role="button"]'
             );
             
             console.log(`📋 第 ${currentRound} 轮在容器内找到 ${expandButtons.length} 个潜在按钮`);
@@ -487,18 +1124,10 @@ async function expandAllComments() {
             for (let button of expandButtons) {
                 const buttonText = button.textContent.trim();
                 
-                const isExpandButton = (
-                    (buttonText.includes('展开') && (buttonText.includes('回复') || buttonText.includes('条'))) ||
-                    buttonText.includes('查看更多回复') ||
-                    buttonText.includes('更多回复') ||
-                    /展开\s*\d+\s*条/.test(buttonText) ||
-                    /\d+\s*条回复/.test(buttonText) ||
-                    buttonText === '展开更多回复'
-                );
-                
-                if (isExpandButton && 
-                    buttonText.length > 2 && 
+                if (buttonText.length > 2 && 
                     buttonText.length < 50 && 
+                    clickedButtons.get(button) !== buttonText &&
+                    EXPAND_RE.test(buttonText) && 
                     button.offsetWidth > 0 && 
                     button.offsetHeight > 0) {
                     
@@ -524,15 +1153,17 @@ async function expandAllComments() {
                 try {
                     // 确保按钮在可见区域内
                     element.scrollIntoView({ 
-                        behavior: 'smooth', 
+                        behavior: 'instant', 
                         block: 'center',
                         inline: 'center'
                     });
-                    await new Promise(resolve => setTimeout(resolve, 500));
+                    await new Promise(resolve => requestAnimationFrame(resolve));
                     
                     // 点击按钮
+                    const repliesLoaded = waitForNewChildren(commentContainer, { timeout: 1500 });
                     element.click();
-                    await new Promise(resolve => setTimeout(resolve, 1500));
+                    clickedButtons.set(element, text);
+                    await repliesLoaded;
                     
                     roundClickCount++;
                     totalExpandedButtons++;
@@ -551,7 +1182,7 @@ async function expandAllComments() {
             }
             
             console.log(`⏳ 等待新内容加载...`);
-            await new Promise(resolve => setTimeout(resolve, 3000));
+            await waitForNewChildren(commentContainer, { timeout: 3000 });
             
             currentRound++;
         }
@@ -577,511 +1208,18 @@ async function expandAllComments() {
     }
 }
 
-// 执行展开
-(async function() {
-    return await expandAllComments();
-})();
-        """
-    
-    def generate_close_post_script(self) -> str:
-        """生成关闭小红书帖子详情页的脚本"""
-        return r"""
-// === 关闭小红书帖子详情页 ===
-async function closePostDetail() {
-    console.log("🔒 开始关闭小红书帖子详情页...");
-    
-    try {
-        // 查找左上角关闭圆圈按钮
-        const closeSelector = 'div.close-circle';
-        console.log(`🔍 查找关闭按钮: ${closeSelector}`);
-        
-        const closeElement = document.querySelector(closeSelector);
-        
-        if (!closeElement) {
-            console.log("❌ 未找到关闭按钮");
-            return {
-                success: false,
-                message: "未找到关闭按钮",
-                selector: closeSelector
-            };
-        }
-        
-        // 检查按钮是否可见
-        const rect = closeElement.getBoundingClientRect();
-        const isVisible = rect.width > 0 && rect.height > 0;
-        
-        console.log(`📍 找到关闭按钮: 位置(${Math.round(rect.left)},${Math.round(rect.top)}), 大小(${Math.round(rect.width)}x${Math.round(rect.height)}), 可见: ${isVisible}`);
-        
-        if (!isVisible) {
-            console.log("❌ 关闭按钮不可见");
-            return {
-                success: false,
-                message: "关闭按钮不可见",
-                selector: closeSelector
-            };
-        }
-        
-        // 记录点击前状态
-        const beforeUrl = window.location.href;
-        const beforeTitle = document.title;
-        
-        console.log(`📍 点击前URL: ${beforeUrl}`);
-        console.log(`📄 点击前标题: ${beforeTitle}`);
-        
-        // 执行点击
-        console.log("🖱️ 点击关闭按钮...");
-        closeElement.click();
-        
-        // 等待页面响应
-        await new Promise(resolve => setTimeout(resolve, 2000));
-        
-        // 检查结果
-        const afterUrl = window.location.href;
-        const afterTitle = document.title;
-        
-        console.log(`📍 点击后URL: ${afterUrl}`);
-        console.log(`📄 点击后标题: ${afterTitle}`);
-        
-        const urlChanged = beforeUrl !== afterUrl;
-        const titleChanged = beforeTitle !== afterTitle;
-        
-        if (urlChanged || titleChanged) {
-            console.log("✅ 成功关闭帖子详情页");
-            return {
-                success: true,
-                message: "成功关闭帖子详情页",
-                method: "左上角关闭按钮",
-                selector: closeSelector,
-                before_url: beforeUrl,
-                after_url: afterUrl,
-                before_title: beforeTitle,
-                after_title: afterTitle,
-                url_changed: urlChanged,
-                title_changed: titleChanged
-            };
-        } else {
-            console.log("⚠️ 点击后页面未发生变化");
-            return {
-                success: false,
-                message: "点击后页面未发生变化，可能页面结构发生了变化",
-                selector: closeSelector,
-                before_url: beforeUrl,
-                after_url: afterUrl
-            };
-        }
-        
-    } catch (error) {
-        console.error("❌ 关闭帖子详情页时发生错误:", error);
-        return {
-            success: false,
-            message: `关闭帖子详情页失败: ${error.message}`,
-            error: error.toString()
-        };
-    }
-}
-
-// 执行关闭
-(async function() {
-    return await closePostDetail();
-})();
-        """
-    
-    def generate_extract_all_posts_script(self, limit: int = None) -> str:
-        """生成提取关键词页面帖子内容的脚本"""
-        limit_js = f"const extractLimit = {limit};" if limit else "const extractLimit = null;"
-        return f"{limit_js}\n" + """
-// === 提取小红书关键词页面帖子内容 ===
-function extractAllPostsForDatabase() {
-    console.log("🎯 提取数据插入...");
-    
-    try {
-        const posts = window.__INITIAL_STATE__.search.feeds._rawValue;
-        console.log(`📊 找到 ${posts.length} 个帖子`);
-        
-        // 根据limit参数限制处理的帖子数量
-        const postsToProcess = extractLimit ? posts.slice(0, extractLimit) : posts;
-        console.log(`📋 将处理 ${postsToProcess.length} 个帖子 ${extractLimit ? `(限制前${extractLimit}个)` : '(全部)'}`);
-        
-        const results = [];
-        
-        postsToProcess.forEach((post, index) => {
-            const postId = post.id || 'unknown';
-            const noteCard = post.noteCard || {};
-            const user = noteCard.user || {};
-            const interactInfo = noteCard.interactInfo || {};
-            
-            // 提取发布时间
-            let publishTime = null;
-            let fullPublishTime = null;
-            if (noteCard.cornerTagInfo && Array.isArray(noteCard.cornerTagInfo)) {
-                const timeTag = noteCard.cornerTagInfo.find(tag => tag.type === 'publish_time');
-                if (timeTag && timeTag.text) {
-                    publishTime = timeTag.text; // "07-02"
-                    // 推断年份
-                    const currentYear = new Date().getFullYear();
-                    const timeParts = timeTag.text.split('-');
-                    if (timeParts.length >= 2) {
-                        const month = timeParts[0];
-                        const day = timeParts[1];
-                        if (month && day) {
-                            const currentMonth = new Date().getMonth() + 1;
-                            const year = parseInt(month) > currentMonth ? currentYear - 1 : currentYear;
-                            fullPublishTime = `${year}-${month.padStart(2, '0')}-${day.padStart(2, '0')}`;
-                        }
-                    }
-                }
-            }
-            
-            // 提取所有图片URL（仅主URL）
-            const imageUrls = [];
-            if (noteCard.imageList && Array.isArray(noteCard.imageList)) {
-                noteCard.imageList.forEach((img) => {
-                    if (img.infoList && img.infoList.length > 0) {
-                        imageUrls.push({
-                            url: img.infoList[0].url,
-                            width: img.width || 0,
-                            height: img.height || 0,
-                            size: `${img.width || 0}x${img.height || 0}`,
-                            alternative_url: img.infoList.length > 1 ? img.infoList[1].url : null
-                        });
-                    }
-                });
-            }
-            
-            const postData = {
-                // xiaohongshu_posts 表字段
-                post_id: postId,
-                author_id: user.userId || 'unknown',
-                author_name: user.nickname || user.nickName || '未知作者',
-                title: noteCard.displayTitle || '无标题',
-                like_count: parseInt(interactInfo.likedCount || 0),
-                collect_count: parseInt(interactInfo.collectedCount || 0),
-                comment_count: parseInt(interactInfo.commentCount || 0),
-                share_count: parseInt(interactInfo.sharedCount || 0),
-                post_type: noteCard.type || 'normal',
-                is_video: (noteCard.type === 'video'),
-                image_count: imageUrls.length,
-                publish_time_raw: publishTime,
-                post_created_at: fullPublishTime,
-                
-                // xiaohongshu_post_images 表数据（数组格式）
-                images: imageUrls
-            };
-            
-            // 有效性检查
-            const isValid = (
-                postData.title && postData.title !== '无标题' && postData.title.trim().length > 0 &&
-                postData.author_name && postData.author_name !== '未知作者' && postData.author_name.trim().length > 0
-            );
-            
-            if (isValid) {
-                results.push(postData);
-                
-                // 🎯 显示完整的原始数据结构 - 不省略任何内容
-                console.log(`\\n=============== 帖子${index + 1}完整数据 ===============`);
-                console.log("📋 完整帖子对象:");
-                console.log(postData);
-                
-                console.log("\\n📝 字段详情:");
-                console.log(`post_id: "${postData.post_id}"`);
-                console.log(`author_id: "${postData.author_id}"`);
-                console.log(`author_name: "${postData.author_name}"`);
-                console.log(`title: "${postData.title}"`);
-                console.log(`like_count: ${postData.like_count}`);
-                console.log(`collect_count: ${postData.collect_count}`);
-                console.log(`comment_count: ${postData.comment_count}`);
-                console.log(`share_count: ${postData.share_count}`);
-                console.log(`post_type: "${postData.post_type}"`);
-                console.log(`is_video: ${postData.is_video}`);
-                console.log(`image_count: ${postData.image_count}`);
-                console.log(`publish_time_raw: ${postData.publish_time_raw}`);
-                console.log(`post_created_at: "${postData.post_created_at}"`);
-                
-                console.log("\\n🖼️ 完整图片数组:");
-                console.log("images:", postData.images);
-                
-                if (postData.images.length > 0) {
-                    console.log("\\n📷 每张图片的完整数据:");
-                    postData.images.forEach((img, imgIdx) => {
-                        console.log(`图片${imgIdx + 1}:`, img);
-                        console.log(`  url: ${img.url}`);
-                        console.log(`  width: ${img.width}`);
-                        console.log(`  height: ${img.height}`);
-                        console.log(`  size: "${img.size}"`);
-                        console.log(`  alternative_url: ${img.alternative_url}`);
-                    });
-                }
-                console.log(`=============== 帖子${index + 1}数据结束 ===============\\n`);
-                
-            } else {
-                console.log(`❌ 跳过无效帖子${index + 1}: ${postData.title}`);
-            }
-        });
-        
-        // 统计信息
-        const videoCount = results.filter(p => p.is_video).length;
-        const imageCount = results.length - videoCount;
-        const totalImages = results.reduce((sum, p) => sum + p.image_count, 0);
-        const totalLikes = results.reduce((sum, p) => sum + p.like_count, 0);
-        
-        console.log(`\\n🎯 ========== 最终提取结果 ==========`);
-        console.log(`📊 提取统计:`);
-        console.log(`   ✅ 有效帖子: ${results.length} 个`);
-        console.log(`   📹 视频帖子: ${videoCount} 个`);
-        console.log(`   🖼️ 图片帖子: ${imageCount} 个`);
-        console.log(`   📸 总图片数: ${totalImages} 张`);
-        console.log(`   ❤️ 总点赞数: ${totalLikes} 个`);
-        
-        console.log(`\\n📋 完整数据数组 (results):`);
-        console.log("完整提取结果:", results);
-        
-        const limitMessage = extractLimit ? `前${extractLimit}个` : '所有';
-        const finalResult = {
-            success: true,
-            message: `成功提取 ${limitMessage} 帖子共${results.length}个用于数据库存储`,
-            data: {
-                total_count: results.length,
-                video_count: videoCount,
-                image_count: imageCount,
-                total_images: totalImages,
-                total_likes: totalLikes,
-                posts: results,
-                extraction_source: 'global_state_mysql_format'
-            }
-        };
-        
-        console.log(`\\n🎯 ========== 返回的完整对象 ==========`);
-        console.log("最终返回对象:", finalResult);
-        
-        return finalResult;
-        
-    } catch (error) {
-        console.log("❌ 提取失败:", error);
-        return {
-            success: false,
-            message: `提取失败: ${error.message}`
-        };
-    }
-}
-
-// 执行提取
-extractAllPostsForDatabase();
-        """
-    
-    def generate_reply_to_comment_script(self, target_user_id: str, target_username: str, target_content: str, reply_content: str) -> str:
-        """生成回复评论的脚本"""
-        return f"""
-// === 小红书三参数智能回复功能 ===
-async function replyToComment() {{
-    console.log("🎯 三参数回复功能启动...");
-    
-    // 回复参数
-    const replyParams = {{
-        target_user_id: '{target_user_id}',
-        target_username: '{target_username}',
-        target_content: '{target_content}',
-        reply_content: '{reply_content}'
-    }};
-    
-    try {{
-        // 第一步：获取页面评论数据
-        console.log("📋 正在获取页面评论数据...");
-        const currentUrl = window.location.href;
-        const urlMatch = currentUrl.match(/\\/explore\\/([a-f0-9]+)/i);
-        const currentNoteId = urlMatch[1];
-        const noteDetailMap = window.__INITIAL_STATE__.note.noteDetailMap;
-        const authorUserId = noteDetailMap[currentNoteId].note?.user?.userId || '';
-        const commentsData = noteDetailMap[currentNoteId].comments;
-        const mainComments = commentsData.list;
-        
-        console.log(`📊 页面帖子ID: ${{currentNoteId}}`);
-        console.log(`👤 作者ID: ${{authorUserId}}`);
-        
-        // 第二步：构建评论列表
-        const allComments = [];
-        let globalIndex = 1;
-        
-        mainComments.forEach((comment, mainIndex) => {{
-            const isAuthorComment = comment.userInfo?.userId === authorUserId;
-            
-            // 主评论
-            const mainComment = {{
-                global_index: globalIndex++,
-                comment_id: comment.id,
-                user_id: comment.userInfo?.userId || '',
-                username: comment.userInfo?.nickname || '未知用户',
-                content: comment.content || '',
-                type: 'main',
-                is_author: isAuthorComment,
-                reply_button_index: mainIndex + 1
-            }};
-            allComments.push(mainComment);
-            
-            // 回复评论
-            if (comment.subComments && comment.subComments.length > 0) {{
-                comment.subComments.forEach((reply) => {{
-                    const isAuthorReply = reply.userInfo?.userId === authorUserId;
-                    
-                    const replyComment = {{
-                        global_index: globalIndex++,
-                        comment_id: reply.id,
-                        user_id: reply.userInfo?.userId || '',
-                        username: reply.userInfo?.nickname || '未知用户',
-                        content: reply.content || '',
-                        type: 'reply',
-                        is_author: isAuthorReply,
-                        parent_comment_id: comment.id,
-                        reply_button_index: mainIndex + 1
-                    }};
-                    allComments.push(replyComment);
-                }});
-            }}
-        }});
-        
-        console.log(`📊 构建了 ${{allComments.length}} 条评论数据`);
-        
-        // 第三步：匹配目标评论（三重验证）
-        console.log("🔍 开始匹配目标评论...");
-        console.log(`   目标用户ID: ${{replyParams.target_user_id}}`);
-        console.log(`   目标用户名: ${{replyParams.target_username}}`);
-        console.log(`   目标内容: ${{replyParams.target_content}}`);
-        
-        const targetComment = allComments.find(comment => {{
-            const userIdMatch = comment.user_id === replyParams.target_user_id;
-            const usernameMatch = comment.username === replyParams.target_username;
-            const contentMatch = comment.content.includes(replyParams.target_content);
-            
-            console.log(`   检查评论 ${{comment.global_index}}: 用户ID(${{userIdMatch}}) 用户名(${{usernameMatch}}) 内容(${{contentMatch}})`);
-            
-            return userIdMatch && usernameMatch && contentMatch;
-        }});
-        
-        if (!targetComment) {{
-            console.log("❌ 未找到匹配的评论");
-            console.log("📋 所有评论列表:");
-            allComments.forEach(comment => {{
-                console.log(`   ${{comment.global_index}}: ${{comment.username}}(${{comment.user_id}}) - ${{comment.content.substring(0, 30)}}...`);
-            }});
-            throw new Error("未找到匹配的评论，请检查参数");
-        }}
-        
-        console.log(`✅ 找到目标评论:`);
-        console.log(`   索引: ${{targetComment.global_index}}`);
-        console.log(`   ID: ${{targetComment.comment_id}}`);
-        console.log(`   用户: ${{targetComment.username}}`);
-        console.log(`   用户ID: ${{targetComment.user_id}}`);
-        console.log(`   内容: ${{targetComment.content}}`);
-        console.log(`   类型: ${{targetComment.type}}`);
-        console.log(`   回复按钮索引: ${{targetComment.reply_button_index}}`);
-        
-        // 第四步：点击回复按钮
-        const allButtons = document.querySelectorAll('button, span[role="button"], [class*="reply"]');
-        const realReplyButtons = Array.from(allButtons).filter(btn => {{
-            const text = btn.textContent.trim();
-            return text === '回复' && btn.className.includes('reply icon-container');
-        }});
-        
-        console.log(`📋 找到 ${{realReplyButtons.length}} 个回复按钮`);
-        
-        if (targetComment.reply_button_index > realReplyButtons.length) {{
-            throw new Error(`回复按钮索引超出范围: ${{targetComment.reply_button_index}}`);
-        }}
-        
-        const targetButton = realReplyButtons[targetComment.reply_button_index - 1];
-        targetButton.click();
-        console.log(`✅ 已点击第 ${{targetComment.reply_button_index}} 个回复按钮`);
-        
-        // 第五步：输入回复内容
-        await new Promise(resolve => setTimeout(resolve, 1000));
-        
-        const inputBox = document.querySelector('p.content-input[contenteditable="true"]');
-        if (!inputBox) {{
-            throw new Error("未找到输入框");
-        }}
-        
-        inputBox.focus();
-        inputBox.textContent = replyParams.reply_content;
-        inputBox.dispatchEvent(new Event('input', {{ bubbles: true }}));
-        console.log(`✅ 回复内容已输入: "${{replyParams.reply_content}}"`);
-        
-        // 第六步：发送回复
-        await new Promise(resolve => setTimeout(resolve, 500));
-        
-        const buttons = document.querySelectorAll('button');
-        let sendButton = null;
-        
-        buttons.forEach((btn) => {{
-            const text = btn.textContent.trim();
-            const isVisible = btn.offsetWidth > 0 && btn.offsetHeight > 0;
-            
-            if (text === '发送' && isVisible) {{
-                sendButton = btn;
-            }}
-        }});
-        
-        if (sendButton) {{
-            console.log("🚀 点击发送按钮...");
-            sendButton.click();
-            
-            return {{
-                success: true,
-                message: `成功回复用户 ${{targetComment.username}} 的评论`,
-                data: {{
-                    target_comment: {{
-                        comment_id: targetComment.comment_id,
-                        user_id: targetComment.user_id,
-                        username: targetComment.username,
-                        content: targetComment.content,
-                        type: targetComment.type,
-                        global_index: targetComment.global_index
-                    }},
-                    reply_content: replyParams.reply_content,
-                    reply_button_index: targetComment.reply_button_index,
-                    sent: true
-                }}
-            }};
-        }} else {{
-            return {{
-                success: false,
-                message: "回复内容已输入，但未找到发送按钮",
-                data: {{
-                    target_comment: {{
-                        comment_id: targetComment.comment_id,
-                        user_id: targetComment.user_id,
-                        username: targetComment.username,
-                        content: targetComment.content
-                    }},
-                    reply_content: replyParams.reply_content,
-                    sent: false
-                }}
-            }};
-        }}
-        
-    }} catch (error) {{
-        console.log("❌ 三参数回复失败:", error);
-        return {{
-            success: false,
-            message: `三参数回复失败: ${{error.message}}`,
-            data: {{
-                target_user_id: replyParams.target_user_id,
-                target_username: replyParams.target_username,
-                target_content: replyParams.target_content,
-                reply_content: replyParams.reply_content,
-                error: error.message
-            }}
-        }};
-    }}
-}}
+"""
 
-// 执行回复
-replyToComment();
-        """
-    
-    def generate_extract_comments_script(self) -> str:
-        """生成提取所有评论的脚本（从全局状态提取）"""
-        return """
+
+# 提取评论脚本的固定部分，DEBUG 在执行语句中传入
+_EXTRACT_COMMENTS_SCRIPT = """
 // === 从全局状态提取小红书评论内容 ===
-function extractAllComments() {
+// 共享的空数组：缺失的列表字段统一归一化为它，循环处无需再判空
+const EMPTY_ARR = Object.freeze([]);
+// 帖子详情页URL中的帖子ID（/explore/ 与 /discovery/item/ 两种路径）
+const NOTE_ID_RE = /\\/(?:explore|discovery\\/item)\\/([a-f0-9]+)/i;
+
+function extractAllComments(DEBUG = false, offset = 0, limit = null) {
     console.log("🎯 从全局状态提取小红书评论内容...");
     
     try {
@@ -1091,7 +1229,7 @@ function extractAllComments() {
         
         // 从URL中提取帖子ID
         let currentNoteId = null;
-        const urlMatch = currentUrl.match(/\\/explore\\/([a-f0-9]+)/i) || currentUrl.match(/\\/discovery\\/item\\/([a-f0-9]+)/i);
+        const urlMatch = NOTE_ID_RE.exec(currentUrl);
         if (urlMatch) {
             currentNoteId = urlMatch[1];
         }
@@ -1112,7 +1250,8 @@ function extractAllComments() {
         }
         
         // 检查这个帖子ID是否在全局状态中存在
-        if (!noteDetailMap[currentNoteId]) {
+        const noteDetail = noteDetailMap[currentNoteId];
+        if (!noteDetail) {
             console.log("❌ 当前帖子ID在全局状态中不存在");
             console.log("📋 可用的帖子ID:", Object.keys(noteDetailMap));
             throw new Error(`帖子 ${currentNoteId} 的数据未加载`);
@@ -1121,7 +1260,7 @@ function extractAllComments() {
         console.log("✅ 确认当前帖子ID:", currentNoteId);
         
         // 🎯 获取作者信息用于判断
-        const noteData = noteDetailMap[currentNoteId].note;
+        const noteData = noteDetail.note;
         const authorUserId = noteData?.user?.userId || '';
         const authorName = noteData?.user?.nickname || '';
         console.log("📝 作者信息 - ID:", authorUserId, "名称:", authorName);
@@ -1133,26 +1272,21 @@ function extractAllComments() {
             
             // 提取描述
             const description = noteData.desc || '';
-            console.log("📄 帖子描述:", description);
+            if (DEBUG) console.log("📄 帖子描述:", description);
             
             // 提取标题
             const title = noteData.title || '';
-            console.log("📌 帖子标题:", title);
+            if (DEBUG) console.log("📌 帖子标题:", title);
             
-            // 提取标签
+            // 提取标签：只投影入库需要的 id/name/type（结构由存储端直接保存，保持不变）
             const tags = [];
-            if (noteData.tagList && Array.isArray(noteData.tagList)) {
-                noteData.tagList.forEach(tag => {
-                    if (tag.name) {
-                        tags.push({
-                            id: tag.id || '',
-                            name: tag.name,
-                            type: tag.type || 'topic'
-                        });
-                    }
-                });
+            const tagList = Array.isArray(noteData.tagList) ? noteData.tagList : EMPTY_ARR;
+            for (const tag of tagList) {
+                if (tag.name) {
+                    tags.push({ id: tag.id || '', name: tag.name, type: tag.type || 'topic' });
+                }
             }
-            console.log("🏷️ 帖子标签:", tags.map(t => t.name).join(', '));
+            if (DEBUG) console.log("🏷️ 帖子标签:", tags.length, "个");
             
             // 提取作者信息
             const author = {
@@ -1179,7 +1313,7 @@ function extractAllComments() {
         }
         
         // 原有的评论提取逻辑
-        const commentsData = noteDetailMap[currentNoteId].comments;
+        const commentsData = noteDetail.comments;
         if (!commentsData || !commentsData.list) {
             throw new Error("未找到评论数据");
         }
@@ -1187,88 +1321,132 @@ function extractAllComments() {
         const mainComments = commentsData.list;
         console.log("✅ 找到主评论:", mainComments.length, "条");
         
-        const allComments = [];
+        // 先统计总数，再按索引填充预分配数组；分段提取时只构建 [offset, offset + limit) 范围内的评论
+        let totalComments = mainComments.length;
+        for (let m = 0; m < mainComments.length; m++) {
+            const subComments = mainComments[m].subComments;
+            if (Array.isArray(subComments)) totalComments += subComments.length;
+        }
+        const start = Math.min(Math.max(offset, 0), totalComments);
+        const end = limit == null ? totalComments : Math.min(totalComments, start + limit);
+        const allComments = new Array(end - start);
         let commentIndex = 1;
+        // 统计信息在构建时顺带累加（始终覆盖全部评论）
+        let authorCommentsCount = 0;
+        
+        // 复用同一个日期格式化器（输出与 toLocaleString('zh-CN') 一致），避免每条评论重新初始化区域格式
+        const timeFormat = new Intl.DateTimeFormat('zh-CN', {
+            year: 'numeric', month: 'numeric', day: 'numeric',
+            hour: 'numeric', minute: 'numeric', second: 'numeric'
+        });
+        const formatTime = (value) => {
+            const date = new Date(value);
+            return isNaN(date) ? 'Invalid Date' : timeFormat.format(date);
+        };
         
         // 处理主评论
-        mainComments.forEach((comment, index) => {
+        for (let index = 0; index < mainComments.length; index++) {
+            const comment = mainComments[index];
+            const { id, userInfo, content, createTime, ipLocation, likeCount, subCommentCount } = comment;
+            const subComments = Array.isArray(comment.subComments) ? comment.subComments : EMPTY_ARR;
+            const userId = userInfo && userInfo.userId;
             // 🔧 修复：使用userId判断作者
-            const isAuthorComment = comment.userInfo?.userId === authorUserId;
-            
-            // 提取主评论的有效信息
-            const mainComment = {
-                index: commentIndex++,
-                id: comment.id,
-                user: comment.userInfo?.nickname || '未知用户',
-                user_id: comment.userInfo?.userId || '',
-                content: comment.content || '',
-                type: 'main',
-                is_author: isAuthorComment, // 🔧 使用修复后的判断
-                time: new Date(comment.createTime).toLocaleString('zh-CN') || '',
-                location: comment.ipLocation || '',
-                like_count: comment.likeCount || '0',
-                reply_count: comment.subCommentCount || 0,
-                source: 'global_state'
-            };
-            
-            allComments.push(mainComment);
-            
-            const authorIndicator = isAuthorComment ? " [作者]" : "";
-            console.log(`主评论${index + 1}: ${mainComment.user}${authorIndicator} - ${mainComment.content}`);
+            const isAuthorComment = userId === authorUserId;
+            if (isAuthorComment) authorCommentsCount++;
+            
+            const mainIndex = commentIndex++;
+            if (mainIndex > start && mainIndex <= end) {
+                // 提取主评论的有效信息
+                const mainComment = {
+                    index: mainIndex,
+                    id: id,
+                    user: (userInfo && userInfo.nickname) || '未知用户',
+                    user_id: userId || '',
+                    content: content || '',
+                    type: 'main',
+                    is_author: isAuthorComment, // 🔧 使用修复后的判断
+                    time: formatTime(createTime),
+                    location: ipLocation || '',
+                    like_count: likeCount || '0',
+                    reply_count: subCommentCount || 0,
+                    source: 'global_state'
+                };
+                
+                allComments[mainIndex - 1 - start] = mainComment;
+                
+                // 逐条输出仅在调试时开启，避免大量 console 消息经 CDP 回传
+                if (DEBUG) {
+                    const authorIndicator = isAuthorComment ? " [作者]" : "";
+                    console.log(`主评论${index + 1}: ${mainComment.user}${authorIndicator} - ${mainComment.content}`);
+                }
+            }
             
             // 处理回复评论
-            if (comment.subComments && comment.subComments.length > 0) {
-                comment.subComments.forEach((reply, replyIndex) => {
-                    // 🔧 修复：使用userId判断作者
-                    const isAuthorReply = reply.userInfo?.userId === authorUserId;
-                    
-                    const replyComment = {
-                        index: commentIndex++,
-                        id: reply.id,
-                        user: reply.userInfo?.nickname || '未知用户',
-                        user_id: reply.userInfo?.userId || '',
-                        content: reply.content || '',
-                        type: 'reply',
-                        parent_comment_id: comment.id,
-                        is_author: isAuthorReply, // 🔧 使用修复后的判断
-                        time: new Date(reply.createTime).toLocaleString('zh-CN') || '',
-                        location: reply.ipLocation || '',
-                        like_count: reply.likeCount || '0',
-                        reply_count: 0, // 回复通常不再有子回复
-                        source: 'global_state'
-                    };
-                    
-                    allComments.push(replyComment);
-                    
+            for (let replyIndex = 0; replyIndex < subComments.length; replyIndex++) {
+                const reply = subComments[replyIndex];
+                const replyUserInfo = reply.userInfo;
+                const replyUserId = replyUserInfo && replyUserInfo.userId;
+                // 🔧 修复：使用userId判断作者
+                const isAuthorReply = replyUserId === authorUserId;
+                if (isAuthorReply) authorCommentsCount++;
+                
+                const replyCommentIndex = commentIndex++;
+                if (replyCommentIndex <= start || replyCommentIndex > end) continue;
+                
+                const replyComment = {
+                    index: replyCommentIndex,
+                    id: reply.id,
+                    user: (replyUserInfo && replyUserInfo.nickname) || '未知用户',
+                    user_id: replyUserId || '',
+                    content: reply.content || '',
+                    type: 'reply',
+                    parent_comment_id: id,
+                    is_author: isAuthorReply, // 🔧 使用修复后的判断
+                    time: formatTime(reply.createTime),
+                    location: reply.ipLocation || '',
+                    like_count: reply.likeCount || '0',
+                    reply_count: 0, // 回复通常不再有子回复
+                    source: 'global_state'
+                };
+                
+                allComments[replyCommentIndex - 1 - start] = replyComment;
+                
+                if (DEBUG) {
                     const authorReplyIndicator = isAuthorReply ? " [作者]" : "";
                     console.log(`  └─ 回复${replyIndex + 1}: ${replyComment.user}${authorReplyIndicator} - ${replyComment.content}`);
-                });
+                }
             }
-        });
+        }
+        
+        // 统计信息：主评论数即主评论列表长度，其余均为回复
+        const mainCommentsCount = mainComments.length;
+        const replyCommentsCount = totalComments - mainCommentsCount;
         
-        // 统计信息
-        const mainCommentsCount = allComments.filter(c => c.type === 'main').length;
-        const replyCommentsCount = allComments.filter(c => c.type === 'reply').length;
-        const authorCommentsCount = allComments.filter(c => c.is_author).length;
+        console.log(`📊 提取完成 - 总数: ${totalComments}, 主评论: ${mainCommentsCount}, 回复: ${replyCommentsCount}, 作者评论: ${authorCommentsCount}`);
         
-        console.log(`📊 提取完成 - 总数: ${allComments.length}, 主评论: ${mainCommentsCount}, 回复: ${replyCommentsCount}, 作者评论: ${authorCommentsCount}`);
+        const data = {
+            // 🎯 新增：作者帖子内容
+            author_post: authorPost,
+            
+            // 原有评论数据
+            total_count: totalComments,
+            main_comments_count: mainCommentsCount,
+            reply_comments_count: replyCommentsCount,
+            author_comments_count: authorCommentsCount,
+            comments: allComments,
+            note_id: currentNoteId,
+            extraction_source: 'global_state'
+        };
+        // 分段提取时附带本段位置与是否还有后续
+        if (limit != null) {
+            data.offset = start;
+            data.has_more = end < totalComments;
+        }
         
         return {
             success: true,
-            message: `从全局状态提取到 ${allComments.length} 条评论和作者帖子内容`,
-            data: {
-                // 🎯 新增：作者帖子内容
-                author_post: authorPost,
-                
-                // 原有评论数据
-                total_count: allComments.length,
-                main_comments_count: mainCommentsCount,
-                reply_comments_count: replyCommentsCount,
-                author_comments_count: authorCommentsCount,
-                comments: allComments,
-                note_id: currentNoteId,
-                extraction_source: 'global_state'
-            }
+            message: `从全局状态提取到 ${totalComments} 条评论和作者帖子内容`,
+            data: data
         };
         
     } catch (error) {
@@ -1279,76 +1457,13 @@ function extractAllComments() {
         };
     }
 }
+"""
 
-// 执行提取
-extractAllComments();
-        """
-    def generate_click_author_avatar_and_extract_script(self, userid: str, username: str) -> str:
-        """生成点击作者头像并提取用户信息的脚本"""
-        return f"""
-// === 点击作者头像并获取用户信息 ===
-async function clickAuthorAvatarAndExtractProfile() {{
-    console.log("🎯 开始获取用户信息: userid={userid}, username={username}");
-    
-    try {{
-        const userid = "{userid}";
-        const username = "{username}";
-        
-        // 1. 直接查找头像元素（最常用的选择器）
-        console.log("🔍 查找头像...");
-        let avatar = document.querySelector(`[href*="${{userid}}"]`);
-        
-        if (!avatar) {{
-            return {{
-                success: false,
-                message: `未找到用户 ${{username}} 的头像`,
-                userid: userid,
-                username: username
-            }};
-        }}
-        
-        console.log("✅ 找到头像，准备点击");
-        
-        // 2. 点击头像打开用户主页
-        avatar.click();
-        console.log("⏳ 等待页面加载...");
-        await new Promise(resolve => setTimeout(resolve, 4000));
-        
-        // 3. 检查是否在新标签页中打开（原页面状态不变是正常的）
-        console.log("📍 头像点击完成，用户主页已在新标签页中打开");
-        
-        return {{
-            success: true,
-            message: "成功点击头像，用户主页已在新标签页中打开",
-            userid: userid,
-            username: username,
-            note: "请在新打开的用户主页标签页中运行数据提取脚本",
-            timestamp: new Date().toISOString()
-        }};
-        
-    }} catch (error) {{
-        console.error("❌ 点击头像失败:", error);
-        return {{
-            success: false,
-            message: `点击头像失败: ${{error.message}}`,
-            userid: "{userid}",
-            username: "{username}",
-            error: error.toString()
-        }};
-    }}
-}}
 
-// 执行点击
-(async function() {{
-    return await clickAuthorAvatarAndExtractProfile();
-}})();
-        """
-    
-    def generate_extract_user_profile_script(self) -> str:
-        """生成用户个人主页信息提取脚本 """
-        return """
+# 用户主页信息提取脚本的固定部分，DEBUG 在执行语句中传入
+_EXTRACT_USER_PROFILE_SCRIPT = """
 // === 用户主页信息提取 ===
-async function extractUserProfile() {
+async function extractUserProfile(DEBUG = false) {
     console.log("📊 开始提取用户个人主页信息...");
     
     try {
@@ -1463,35 +1578,47 @@ async function extractUserProfile() {
             
             console.log(`📊 开始滑动前的帖子数量: ${lastCount}`);
             
-            while (noNewCount < 5 && scrollRounds < maxScrollRounds) { // 增加到5轮无新增才停止
-                scrollRounds++;
-                console.log(`📜 第${scrollRounds}轮滑动...`);
-                
-                const currentScrollTop = window.pageYOffset;
-                // 滑动到底部
-                window.scrollTo(0, document.body.scrollHeight);
-                await new Promise(resolve => setTimeout(resolve, 3000)); // 增加等待时间确保加载完成
-                
-                // 通过全局状态检查帖子数量
-                let currentCount = lastCount;
+            // 从全局状态读取当前帖子数组（真正的帖子数据在 notes[0] 中）
+            const readStateNotes = () => {
                 try {
-                    if (window.__INITIAL_STATE__ && 
-                        window.__INITIAL_STATE__.user && 
-                        window.__INITIAL_STATE__.user.notes) {
-                        
-                        const currentNotesArray = window.__INITIAL_STATE__.user.notes._rawValue || 
-                                                 window.__INITIAL_STATE__.user.notes || [];
-                        
-                        // 关键：真正的帖子数据在 notes[0] 中
-                        if (Array.isArray(currentNotesArray) && currentNotesArray.length > 0 && Array.isArray(currentNotesArray[0])) {
-                            const currentNotes = currentNotesArray[0];
-                            currentCount = currentNotes.length;
-                            userNotes = currentNotes; // 更新帖子数组
-                        }
+                    const notes = window.__INITIAL_STATE__ && window.__INITIAL_STATE__.user && window.__INITIAL_STATE__.user.notes;
+                    if (!notes) return null;
+                    const notesArray = notes._rawValue || notes || [];
+                    if (Array.isArray(notesArray) && notesArray.length > 0 && Array.isArray(notesArray[0])) {
+                        return notesArray[0];
                     }
                 } catch (error) {
                     console.log(`⚠️ 获取全局状态帖子失败: ${error.message}`);
                 }
+                return null;
+            };
+            
+            // 滚动到底部后轮询帖子数量，有新增或超时即返回（后台标签页中 requestAnimationFrame 会暂停，因此用短定时器）
+            const waitForMoreNotes = (previousCount, timeout) => new Promise(resolve => {
+                const start = Date.now();
+                const check = () => {
+                    const currentNotes = readStateNotes();
+                    const count = currentNotes ? currentNotes.length : previousCount;
+                    if (count > previousCount || Date.now() - start > timeout) {
+                        if (currentNotes) {
+                            userNotes = currentNotes; // 更新帖子数组
+                        }
+                        resolve(count);
+                        return;
+                    }
+                    setTimeout(check, 100);
+                };
+                window.scrollTo(0, document.body.scrollHeight);
+                check();
+            });
+            
+            while (noNewCount < 5 && scrollRounds < maxScrollRounds) { // 增加到5轮无新增才停止
+                scrollRounds++;
+                console.log(`📜 第${scrollRounds}轮滑动...`);
+                
+                const currentScrollTop = window.pageYOffset;
+                // 滑动到底部，等待全局状态中的帖子数增加（最多等待3秒），避免每轮固定等待
+                const currentCount = await waitForMoreNotes(lastCount, 3000);
                 
                 console.log(`📊 当前帖子数量: ${currentCount} (上轮: ${lastCount})`);
                 
@@ -1517,30 +1644,45 @@ async function extractUserProfile() {
             if (userNotes.length > 0) {
                 console.log(`📋 获取到所有帖子，开始处理 ${userNotes.length} 个帖子...`);
                 
-                // 显示前5个作为示例
-                console.log(`📋 帖子示例 (前5个):`);
-                userNotes.slice(0, 5).forEach((note, index) => {
-                    const noteCard = note.noteCard || {};
-                    const title = (noteCard.displayTitle || '无标题').trim();
-                    const likedCount = noteCard.interactInfo?.likedCount || '0';
-                    const type = noteCard.type || '';
-                    console.log(`   ${index + 1}. [${type}] ${title} (👍${likedCount})`);
-                });
+                // 显示前5个作为示例（仅调试时）
+                if (DEBUG) {
+                    console.log(`📋 帖子示例 (前5个):`);
+                    userNotes.slice(0, 5).forEach((note, index) => {
+                        const noteCard = note.noteCard || {};
+                        const title = (noteCard.displayTitle || '无标题').trim();
+                        const likedCount = noteCard.interactInfo?.likedCount || '0';
+                        const type = noteCard.type || '';
+                        console.log(`   ${index + 1}. [${type}] ${title} (👍${likedCount})`);
+                    });
+                }
                 
                 console.log(`📊 正在处理所有 ${userNotes.length} 个帖子的详细信息...`);
                 
-                // 保存所有帖子的详细信息
-                userData.notes_all = userNotes.map(note => {
-                    const noteCard = note.noteCard || {};
+                // 保存所有帖子的详细信息，统计信息在同一次遍历中累加
+                const notesAll = new Array(userNotes.length);
+                let totalLikes = 0;
+                let videoCount = 0;
+                let imageCount = 0;
+                for (let i = 0; i < userNotes.length; i++) {
+                    const noteCard = userNotes[i].noteCard || {};
                     const interactInfo = noteCard.interactInfo || {};
                     const cover = noteCard.cover || {};
                     const user = noteCard.user || {};
+                    const likedCount = parseInt(interactInfo.likedCount || '0');
+                    const type = noteCard.type || '';
                     
-                    return {
+                    totalLikes += likedCount || 0;
+                    if (type === 'video') {
+                        videoCount++;
+                    } else if (type === 'normal') {
+                        imageCount++;
+                    }
+                    
+                    notesAll[i] = {
                         title: (noteCard.displayTitle || '无标题').trim(),
                         note_id: noteCard.noteId || '',
-                        type: noteCard.type || '',
-                        liked_count: parseInt(interactInfo.likedCount || '0'),
+                        type: type,
+                        liked_count: likedCount,
                         is_liked: interactInfo.liked || false,
                         is_sticky: interactInfo.sticky || false,
                         cover_url: cover.urlDefault || cover.urlPre || '',
@@ -1550,12 +1692,8 @@ async function extractUserProfile() {
                             avatar: user.avatar || ''
                         }
                     };
-                });
-                
-                // 统计信息（基于所有帖子）
-                const totalLikes = userData.notes_all.reduce((sum, note) => sum + (note.liked_count || 0), 0);
-                const videoCount = userData.notes_all.filter(note => note.type === 'video').length;
-                const imageCount = userData.notes_all.filter(note => note.type === 'normal').length;
+                }
+                userData.notes_all = notesAll;
                 
                 console.log(`📊 完整帖子统计: 总共${userNotes.length}个帖子 | 视频${videoCount}个, 图文${imageCount}个, 总点赞数${totalLikes}`);
                 
@@ -1571,152 +1709,987 @@ async function extractUserProfile() {
             userData.notes_count = 0;
         }
         
-        console.log("✅ 用户信息提取完成:", userData);
+        // 只输出摘要，完整数据通过返回值传回，避免整个对象（含全部帖子）经 CDP 序列化到控制台
+        console.log(`✅ 用户信息提取完成: ${userData.username || ''}，帖子 ${userData.notes_all ? userData.notes_all.length : 0} 个`);
+        
+        return {
+            success: true,
+            message: "用户信息提取成功",
+            data: userData,
+            note: `已获取该用户的所有${userData.notes_count || 0}个帖子信息。点赞数`
+        };
+        
+    } catch (error) {
+        console.error("❌ 用户信息提取失败:", error);
+        return {
+            success: false,
+            message: `用户信息提取失败: ${error.message}`,
+            error: error.toString()
+        };
+    }
+}
+"""
+
+
+# ==================== 完整脚本缓存 ====================
+# 固定部分有数KB，按参数缓存拼接好的完整脚本，重复调用直接复用同一个字符串
+
+def _click_post_call(title: str, smooth_scroll: bool, trusted_click: bool) -> str:
+    """点击帖子的调用语句"""
+    # 转为JS字符串字面量（含引号），控制字符等一并正确转义
+    title_literal = _js_str(title)
+    scroll_options = _SMOOTH_SCROLL_OPTIONS if smooth_scroll else _INSTANT_SCROLL_OPTIONS
+    trusted_literal = 'true' if trusted_click else 'false'
+    return f"clickPostByTitle({title_literal}, {scroll_options}, {trusted_literal})"
+
+
+def _click_post_by_index_call(index: int, expected_title: Optional[str], smooth_scroll: bool,
+                              trusted_click: bool) -> str:
+    """按提取序号点击帖子的调用语句（expected_title 为 None 时不校验标题）"""
+    title_literal = 'null' if expected_title is None else _js_str(expected_title)
+    scroll_options = _SMOOTH_SCROLL_OPTIONS if smooth_scroll else _INSTANT_SCROLL_OPTIONS
+    trusted_literal = 'true' if trusted_click else 'false'
+    return f"clickPostByExtractIndex({int(index)}, {title_literal}, {scroll_options}, {trusted_literal})"
+
+
+def _click_post_by_feed_index_call(feed_index: int, expected_title: str, smooth_scroll: bool,
+                                   trusted_click: bool) -> str:
+    """按原始帖子序号点击帖子的调用语句（始终校验标题）"""
+    scroll_options = _SMOOTH_SCROLL_OPTIONS if smooth_scroll else _INSTANT_SCROLL_OPTIONS
+    trusted_literal = 'true' if trusted_click else 'false'
+    return f"clickPostByFeedIndex({int(feed_index)}, {_js_str(expected_title)}, {scroll_options}, {trusted_literal})"
+
+
+def _extract_comments_call(debug: bool, offset: int, limit: Optional[int]) -> str:
+    """提取评论的调用语句（返回JSON字符串）"""
+    limit_js = 'null' if limit is None else int(limit)
+    return f"JSON.stringify(extractAllComments({'true' if debug else 'false'}, {int(offset)}, {limit_js}))"
+
+
+@lru_cache(maxsize=64)
+def _build_click_post_script(title: str, smooth_scroll: bool, trusted_click: bool) -> str:
+    """拼接点击帖子脚本（同一标题反复点击时命中缓存）"""
+    return _CLICK_POST_SCRIPT + f"""
+// 执行点击
+(async function() {{
+    return await {_click_post_call(title, smooth_scroll, trusted_click)};
+}})();
+        """
+
+
+@lru_cache(maxsize=64)
+def _build_click_post_by_index_script(index: int, expected_title: Optional[str], smooth_scroll: bool,
+                                      trusted_click: bool) -> str:
+    """拼接按提取序号点击帖子的脚本（expected_title 为 None 时不校验标题）"""
+    return _CLICK_POST_SCRIPT + f"""
+// 执行点击
+(async function() {{
+    return await {_click_post_by_index_call(index, expected_title, smooth_scroll, trusted_click)};
+}})();
+        """
+
+
+@lru_cache(maxsize=16)
+def _build_extract_all_posts_script(limit: Optional[int], debug: bool) -> str:
+    """拼接提取帖子脚本：在固定部分前加上 extractLimit / DEBUG 定义"""
+    limit_js = f"const extractLimit = {limit};" if limit else "const extractLimit = null;"
+    return f"{limit_js}\nconst DEBUG = {'true' if debug else 'false'};\n" + _EXTRACT_ALL_POSTS_SCRIPT
+
+
+@lru_cache(maxsize=32)
+def _build_extract_comments_script(debug: bool, offset: int, limit: Optional[int]) -> str:
+    """拼接提取评论脚本（limit 为 None 时提取全部）"""
+    return _EXTRACT_COMMENTS_SCRIPT + f"""
+// 执行提取
+{_extract_comments_call(debug, offset, limit)};
+        """
+
+
+@lru_cache(maxsize=1)
+def _build_expand_and_extract_comments_script() -> str:
+    """拼接展开+提取评论的合并脚本：先展开全部评论再提取，两步结果一起返回"""
+    return _EXPAND_COMMENTS_SCRIPT + _EXTRACT_COMMENTS_SCRIPT + """
+// 执行展开并提取
+(async function() {
+    const expandResult = await expandAllComments();
+    const commentsResult = extractAllComments(false, 0, null);
+    return JSON.stringify({ expand_result: expandResult, comments_result: commentsResult });
+})();
+        """
+
+
+@lru_cache(maxsize=2)
+def _build_extract_user_profile_script(debug: bool) -> str:
+    """拼接用户主页信息提取脚本"""
+    return _EXTRACT_USER_PROFILE_SCRIPT + f"""
+// 执行提取
+(async function() {{
+    return JSON.stringify(await extractUserProfile({'true' if debug else 'false'}));
+}})();
+        """
+
+
+# ==================== 页面内脚本库 ====================
+# 固定部分按内容哈希注册为页面内命名空间 window.__xhs_fn_<哈希>，每个页面只传输一次源码，
+# 之后每次调用只发送几十字节的调用语句，V8 也只需编译一次
+
+_TOP_LEVEL_FUNCTION_RE = re.compile(r'^(?:async\s+)?function\s+(\w+)', re.M)
+# 命名空间不存在（如注入前页面已跳转）时调用语句返回的标记
+_SCRIPT_LIB_MISSING = "__xhs_lib_missing__"
+
+
+@lru_cache(maxsize=16)
+def _build_script_library(body: str) -> tuple:
+    """把脚本固定部分包装为页面内命名空间，返回 (命名空间名, 安装脚本, 取出函数的解构语句)"""
+    namespace = "__xhs_fn_" + hashlib.blake2b(body.encode('utf-8'), digest_size=8).hexdigest()
+    names = ", ".join(_TOP_LEVEL_FUNCTION_RE.findall(body))
+    install = f"""(function() {{
+    if (window.{namespace}) return;
+{body}
+    window.{namespace} = {{ {names} }};
+}})();"""
+    return namespace, install, f"const {{ {names} }} = lib;"
+
+
+def _build_library_call(body: str, call: str) -> str:
+    """生成调用页面内脚本库函数的语句，call 与完整脚本末尾的执行语句写法相同"""
+    namespace, _, destructure = _build_script_library(body)
+    return f"""(async function() {{
+    const lib = window.{namespace};
+    if (!lib) return "{_SCRIPT_LIB_MISSING}";
+    {destructure}
+    return await {call};
+}})()"""
+
+
+class XiaohongshuAnalyzer:
+    """小红书专用分析器 - 直接依赖 BrowserService 基础能力"""
+    
+    # 额外 BrowserContext 的数量上限（吞吐与内存的折中）
+    MAX_POOLED_CONTEXTS = 4
+    # 帖子数超过该值时在线程池中整理数据库格式
+    OFFLOAD_BUILD_THRESHOLD = 200
+    
+    def __init__(self, browser_service):
+        self.browser = browser_service  # 依赖简化的 BrowserService
+        self.logger = logging.getLogger(__name__)
+        # 已注入公共JS助手的页面（页面关闭后自动移除）
+        self._helper_pages = weakref.WeakSet()
+        # 页面 → 已注册的脚本库命名空间（页面关闭后自动移除）
+        self._page_libraries = weakref.WeakKeyDictionary()
+        # 上下文池：空闲上下文排队复用，信号量限制同时使用的上下文数量
+        self._context_pool: asyncio.Queue = asyncio.Queue(maxsize=self.MAX_POOLED_CONTEXTS)
+        self._context_slots = asyncio.Semaphore(self.MAX_POOLED_CONTEXTS)
+        # 是否支持多标签页上下文切换/标签页管理（初始化时判断一次；tab_manager 随浏览器启动创建，使用时再取）
+        self._has_ctx = hasattr(browser_service, 'execute_with_context')
+        self._has_tabs = hasattr(browser_service, 'tab_manager')
+        # 最近一次完整提取的帖子：((页面URL, 已加载帖子数), posts, 各帖子在原始帖子数组中的序号)；导航或滚动加载后键不再匹配即失效
+        self._posts_cache: Optional[tuple] = None
+    
+    def generate_auto_scroll_script(self) -> str:
+        """生成自动滚动脚本，加载所有帖子到全局状态"""
+        return """
+// === 小红书自动滚动加载所有帖子 ===
+
+// 等待下一帧：读布局与写滚动分在不同阶段，避免同一帧内强制重排
+function nextFrame() {
+    return new Promise(resolve => requestAnimationFrame(resolve));
+}
+
+// 等待新帖子节点插入，最长 timeout 毫秒；返回是否检测到新帖子
+function waitForNewPosts(timeout) {
+    return new Promise(resolve => {
+        const target = document.querySelector('.feeds-container') || document.body;
+        let timer = null;
+        const finish = (found) => {
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(found);
+        };
+        const observer = new MutationObserver(mutations => {
+            for (const mutation of mutations) {
+                for (const node of mutation.addedNodes) {
+                    if (node.nodeType === 1 && node.classList.contains('note-item')) {
+                        finish(true);
+                        return;
+                    }
+                }
+            }
+        });
+        observer.observe(target, { childList: true, subtree: true });
+        timer = setTimeout(() => finish(false), timeout);
+    });
+}
+
+async function autoScrollLoadAllPosts() {
+    console.log("🚀 开始小红书自动滚动加载所有帖子...");
+    
+    let lastCount = 0;
+    let noNewContentCount = 0;
+    const maxNoNewRounds = 3;
+    let totalScrolls = 0;
+    const maxScrolls = 50; // 防止无限滚动
+    // 实时HTMLCollection只需获取一次，滚动加载后自动更新
+    const noteItems = document.getElementsByClassName('note-item');
+    
+    try {
+        while (noNewContentCount < maxNoNewRounds && totalScrolls < maxScrolls) {
+            // 读阶段：帧开始时读取页面高度
+            await nextFrame();
+            const targetHeight = document.body.scrollHeight;
+            
+            // 写阶段：先开始观察再滚动到底部，避免漏掉插入的帖子
+            const loaded = waitForNewPosts(2000);
+            window.scrollTo(0, targetHeight);
+            totalScrolls++;
+            
+            // 等待新帖子插入（最多2秒），下一帧再读取数量
+            await loaded;
+            await nextFrame();
+            
+            // 检查帖子数量
+            try {
+                let currentCount = 0;
+                
+                // 方法1: 尝试从全局状态获取（公共助手解析搜索页面/用户主页数据源）
+                const postsRef = window.__xhs.getPosts();
+                if (postsRef.posts) {
+                    currentCount = postsRef.posts.length;
+                    console.log(`📊 [全局状态] 当前帖子数: ${currentCount} (新增: ${currentCount - lastCount})`);
+                } 
+                // 方法2: 从DOM计算
+                else {
+                    currentCount = noteItems.length;
+                    console.log(`📊 [DOM计算] 当前帖子数: ${currentCount} (新增: ${currentCount - lastCount})`);
+                }
+                
+                if (currentCount === lastCount) {
+                    noNewContentCount++;
+                    console.log(`⏳ 无新增内容 (${noNewContentCount}/${maxNoNewRounds}) - 滚动次数: ${totalScrolls}`);
+                } else {
+                    noNewContentCount = 0;
+                    console.log(`✅ 新增了 ${currentCount - lastCount} 个帖子 - 滚动次数: ${totalScrolls}`);
+                }
+                
+                lastCount = currentCount;
+                
+            } catch (error) {
+                console.log("❌ 获取帖子数据失败:", error);
+                noNewContentCount++;
+            }
+        }
+        
+        console.log(`🎯 滚动完成，总共加载了 ${lastCount} 个帖子，总滚动次数: ${totalScrolls}`);
+        
+        const result = {
+            success: true,
+            total_posts: lastCount,
+            total_scrolls: totalScrolls,
+            message: "成功加载 " + lastCount + " 个帖子 (滚动" + totalScrolls + "次)"
+        };
+        console.log("📤 准备返回结果:", JSON.stringify(result));
+        return result;
+        
+    } catch (error) {
+        console.log("❌ 自动滚动过程中发生错误:", error);
+        let errorMessage = '未知错误';
+        try {
+            errorMessage = error.message || error.toString() || '未知错误';
+        } catch (e) {
+            errorMessage = '错误处理异常';
+        }
+        
+        const result = {
+            success: false,
+            message: "滚动失败: " + errorMessage,
+            total_posts: (typeof lastCount !== 'undefined') ? lastCount : 0,
+            total_scrolls: (typeof totalScrolls !== 'undefined') ? totalScrolls : 0
+        };
+        console.log("📤 准备返回错误结果:", JSON.stringify(result));
+        return result;
+    }
+}
+
+// 执行滚动并返回结果
+(async function() {
+    return await autoScrollLoadAllPosts();
+})();
+        """
+    
+    def generate_click_post_script(self, title: str, smooth_scroll: bool = False, trusted_click: bool = False) -> str:
+        """生成通过标题点击帖子的脚本（支持搜索页面和用户主页）
+        
+        默认瞬时滚动以减少等待，smooth_scroll 为 True 时使用平滑滚动（仅用于调试观察）；
+        trusted_click 为 True 时脚本不在页面内点击，而是返回 click_target 坐标由调用方执行真实鼠标点击
+        """
+        return _build_click_post_script(title, smooth_scroll, trusted_click)
+    
+    def generate_click_post_by_index_script(self, index: int, expected_title: Optional[str] = None,
+                                            smooth_scroll: bool = False, trusted_click: bool = False) -> str:
+        """生成按提取结果序号点击帖子的脚本，无需事先提取全部帖子
+        
+        序号与 extract_all_posts 返回的 posts 顺序一致；传入 expected_title 时标题不一致返回 mismatch
+        """
+        return _build_click_post_by_index_script(index, expected_title, smooth_scroll, trusted_click)
+    
+    def generate_expand_comments_script(self) -> str:
+        """生成展开所有评论的脚本"""
+        return _EXPAND_COMMENTS_SCRIPT + """
+// 执行展开
+(async function() {
+    return await expandAllComments();
+})();
+        """
+    
+    def generate_expand_and_extract_comments_script(self) -> str:
+        """生成展开并提取所有评论的合并脚本，一次执行完成两步"""
+        return _build_expand_and_extract_comments_script()
+    
+    def generate_close_post_script(self) -> str:
+        """生成关闭小红书帖子详情页的脚本（只负责点击，页面变化由 close_post 等待）"""
+        return r"""
+// === 关闭小红书帖子详情页 ===
+async function closePostDetail() {
+    console.log("🔒 开始关闭小红书帖子详情页...");
+    
+    try {
+        // 查找左上角关闭圆圈按钮
+        const closeSelector = 'div.close-circle';
+        console.log(`🔍 查找关闭按钮: ${closeSelector}`);
+        
+        const closeElement = document.querySelector(closeSelector);
+        
+        if (!closeElement) {
+            console.log("❌ 未找到关闭按钮");
+            return {
+                success: false,
+                message: "未找到关闭按钮",
+                selector: closeSelector
+            };
+        }
+        
+        // 检查按钮是否可见
+        const rect = closeElement.getBoundingClientRect();
+        const isVisible = rect.width > 0 && rect.height > 0;
+        
+        console.log(`📍 找到关闭按钮: 位置(${Math.round(rect.left)},${Math.round(rect.top)}), 大小(${Math.round(rect.width)}x${Math.round(rect.height)}), 可见: ${isVisible}`);
+        
+        if (!isVisible) {
+            console.log("❌ 关闭按钮不可见");
+            return {
+                success: false,
+                message: "关闭按钮不可见",
+                selector: closeSelector
+            };
+        }
+        
+        // 记录点击前状态
+        const beforeUrl = window.location.href;
+        const beforeTitle = document.title;
+        
+        console.log(`📍 点击前URL: ${beforeUrl}`);
+        console.log(`📄 点击前标题: ${beforeTitle}`);
+        
+        // 执行点击，页面变化由调用方等待
+        console.log("🖱️ 点击关闭按钮...");
+        closeElement.click();
         
         return {
             success: true,
-            message: "用户信息提取成功",
-            data: userData,
-            note: `已获取该用户的所有${userData.notes_count || 0}个帖子信息。点赞数`
+            clicked: true,
+            selector: closeSelector,
+            before_url: beforeUrl,
+            before_title: beforeTitle
         };
         
     } catch (error) {
-        console.error("❌ 用户信息提取失败:", error);
+        console.error("❌ 关闭帖子详情页时发生错误:", error);
         return {
             success: false,
-            message: `用户信息提取失败: ${error.message}`,
+            message: `关闭帖子详情页失败: ${error.message}`,
             error: error.toString()
         };
     }
 }
 
-// 执行提取
+// 执行关闭
 (async function() {
-    return await extractUserProfile();
+    return await closePostDetail();
 })();
         """
     
+    def generate_extract_all_posts_script(self, limit: int = None, debug: bool = False) -> str:
+        """生成提取关键词页面帖子内容的脚本
+
+        脚本只返回原始帖子数组切片的JSON字符串，字段整理在 build_posts_for_database 中完成；
+        debug 为 True 时在浏览器控制台逐条输出帖子数据
+        """
+        return _build_extract_all_posts_script(int(limit) if limit else None, debug)
+    
+    def build_posts_for_database(self, raw_posts: List[Dict[str, Any]], limit: int = None,
+                                 feed_indices: Optional[List[int]] = None) -> Dict[str, Any]:
+        """将 __INITIAL_STATE__ 中的原始帖子数据整理为数据库存储格式
+        
+        传入 feed_indices 列表时，按结果顺序追加每条帖子在 raw_posts 中的序号
+        """
+        now = datetime.now()
+        results = []
+        # 统计信息在构建结果时顺带累加，不再对结果做多次遍历
+        video_count = 0
+        total_images = 0
+        total_likes = 0
+        
+        for index, post in enumerate(raw_posts):
+            note_card = post.get('noteCard') or {}
+            user = note_card.get('user') or {}
+            interact_info = note_card.get('interactInfo') or {}
+            
+            # 提取发布时间，如 "07-02"，按当前月份推断年份
+            publish_time = None
+            full_publish_time = None
+            corner_tags = note_card.get('cornerTagInfo')
+            if isinstance(corner_tags, list):
+                time_tag = next((tag for tag in corner_tags if tag.get('type') == 'publish_time'), None)
+                if time_tag and time_tag.get('text'):
+                    publish_time = time_tag['text']
+                    time_parts = publish_time.split('-')
+                    if len(time_parts) >= 2:
+                        month, day = time_parts[0], time_parts[1]
+                        if month and day:
+                            month_num = _parse_int(month)
+                            year = now.year - 1 if month_num is not None and month_num > now.month else now.year
+                            full_publish_time = f"{year}-{month.rjust(2, '0')}-{day.rjust(2, '0')}"
+            
+            # 图片数据由脚本按列返回，这里还原为逐张图片的入库格式
+            image_urls = []
+            images = note_card.get('images')
+            if images:
+                for url, width, height, alternative_url in zip(
+                        images['urls'], images['widths'], images['heights'], images['alt_urls']):
+                    image_urls.append({
+                        "url": url,
+                        "width": width,
+                        "height": height,
+                        "size": f"{width}x{height}",
+                        "alternative_url": alternative_url
+                    })
+            
+            title = note_card.get('displayTitle') or '无标题'
+            author_name = user.get('nickname') or user.get('nickName') or '未知作者'
+            
+            # 有效性检查
+            if not (title != '无标题' and title.strip() and author_name != '未知作者' and author_name.strip()):
+                self.logger.debug("跳过无效帖子%s: %s", index + 1, title)
+                continue
+            
+            is_video = note_card.get('type') == 'video'
+            like_count = _parse_int(interact_info.get('likedCount'))
+            if is_video:
+                video_count += 1
+            total_images += len(image_urls)
+            total_likes += like_count or 0
+            
+            results.append({
+                # xiaohongshu_posts 表字段
+                "post_id": post.get('id') or 'unknown',
+                "author_id": user.get('userId') or 'unknown',
+                "author_name": author_name,
+                "title": title,
+                "like_count": like_count,
+                "collect_count": _parse_int(interact_info.get('collectedCount')),
+                "comment_count": _parse_int(interact_info.get('commentCount')),
+                "share_count": _parse_int(interact_info.get('sharedCount')),
+                "post_type": note_card.get('type') or 'normal',
+                "is_video": is_video,
+                "image_count": len(image_urls),
+                "publish_time_raw": publish_time,
+                "post_created_at": full_publish_time,
+                
+                # xiaohongshu_post_images 表数据（数组格式）
+                "images": image_urls
+            })
+            if feed_indices is not None:
+                feed_indices.append(index)
+        
+        limit_message = f"前{limit}个" if limit else '所有'
+        return {
+            "success": True,
+            "message": f"成功提取 {limit_message} 帖子共{len(results)}个用于数据库存储",
+            "data": {
+                "total_count": len(results),
+                "video_count": video_count,
+                "image_count": len(results) - video_count,
+                "total_images": total_images,
+                "total_likes": total_likes,
+                "posts": results,
+                "extraction_source": 'global_state_mysql_format'
+            }
+        }
+    
+    def generate_reply_to_comment_script(self, target_user_id: str, target_username: str, target_content: str, reply_content: str,
+                                         debug: bool = False, status_only: bool = False) -> str:
+        """生成回复评论的脚本；debug 为 True 时在浏览器控制台逐条输出比对过程，status_only 为 True 时脚本只返回 success/message"""
+        # 回复参数序列化为JSON对象字面量，作为参数传入
+        reply_params = json.dumps({
+            "target_user_id": target_user_id,
+            "target_username": target_username,
+            "target_content": target_content,
+            "reply_content": reply_content
+        }, ensure_ascii=False)
+        return _REPLY_TO_COMMENT_SCRIPT + f"""
+// 执行回复
+replyToComment({reply_params}, {'true' if debug else 'false'}){_STATUS_ONLY_SUFFIX if status_only else ''};
+        """
+    
+    def generate_reply_to_comments_batch_script(self, replies: List[Dict[str, str]], debug: bool = False,
+                                                status_only: bool = False) -> str:
+        """生成批量回复评论的脚本：评论上下文只读取一次，按顺序逐条回复；status_only 为 True 时脚本只返回 success/message"""
+        reply_list = json.dumps([{
+            "target_user_id": reply["target_user_id"],
+            "target_username": reply["target_username"],
+            "target_content": reply["target_content"],
+            "reply_content": reply["reply_content"]
+        } for reply in replies], ensure_ascii=False)
+        return _REPLY_TO_COMMENT_SCRIPT + f"""
+// 执行批量回复
+replyToCommentsBatch({reply_list}, {'true' if debug else 'false'}){_STATUS_ONLY_SUFFIX if status_only else ''};
+        """
+    
+    def generate_extract_comments_script(self, debug: bool = False, offset: int = 0, limit: int = None) -> str:
+        """生成提取所有评论的脚本（从全局状态提取）
+
+        脚本返回结果的JSON字符串，评论较多时跨 CDP 只传一个字符串；
+        给定 limit 时只返回从 offset 开始的 limit 条评论，并附带 has_more；
+        debug 为 True 时在浏览器控制台逐条输出评论与帖子详情
+        """
+        return _build_extract_comments_script(debug, offset, limit)
+    
+    def generate_click_author_avatar_and_extract_script(self, userid: str, username: str) -> str:
+        """生成点击作者头像并提取用户信息的脚本"""
+        return _CLICK_AUTHOR_AVATAR_SCRIPT + f"""
+// 执行点击
+(async function() {{
+    return await clickAuthorAvatarAndExtractProfile({_js_str(userid)}, {_js_str(username)});
+}})();
+        """
+    
+    def generate_extract_user_profile_script(self, debug: bool = False) -> str:
+        """生成用户个人主页信息提取脚本
+
+        脚本返回结果的JSON字符串（含全部帖子列表）；
+        debug 为 True 时在浏览器控制台输出前5个帖子示例
+        """
+        return _build_extract_user_profile_script(debug)
+    
+    
+    # ==================== 浏览器上下文池 ====================
+    
+    async def acquire_context(self):
+        """获取一个 BrowserContext，优先复用池中的空闲上下文
+        
+        新上下文在已启动的浏览器上创建（不重新启动浏览器），并带上主上下文的登录状态
+        """
+        await self._context_slots.acquire()
+        try:
+            while not self._context_pool.empty():
+                context = self._context_pool.get_nowait()
+                # 浏览器重启后旧上下文已失效，直接丢弃
+                if context.browser is self.browser.browser:
+                    return context
+            
+            storage_state = await self.browser.context.storage_state() if self.browser.context else None
+            context = await self.browser.browser.new_context(
+                viewport={'width': 1920, 'height': 1080},
+                storage_state=storage_state
+            )
+            self.logger.info("创建新的池化浏览器上下文")
+            return context
+        except Exception:
+            self._context_slots.release()
+            raise
+    
+    async def release_context(self, context, clear_cookies: bool = False):
+        """归还上下文：关闭多余页面后放回池中
+        
+        默认保留 cookies 以维持登录状态；clear_cookies=True 时清空后再复用
+        """
+        try:
+            for page in context.pages[1:]:
+                await page.close()
+            if clear_cookies:
+                await context.clear_cookies()
+            self._context_pool.put_nowait(context)
+        except Exception as e:
+            self.logger.warning("归还浏览器上下文失败，直接关闭: %s", e)
+            try:
+                await context.close()
+            except Exception:
+                pass
+        finally:
+            self._context_slots.release()
+    
+    async def close_pooled_contexts(self):
+        """关闭池中所有空闲上下文"""
+        while not self._context_pool.empty():
+            context = self._context_pool.get_nowait()
+            try:
+                await context.close()
+            except Exception as e:
+                self.logger.debug("关闭池化上下文失败: %s", e)
     
     # ==================== 小红书业务逻辑方法 ====================
     
+    async def install_helpers(self, page=None):
+        """向页面注入公共JS助手 window.__xhs，每个页面只注入一次
+        
+        add_init_script 保证该页面后续导航自动注入，evaluate 覆盖当前已加载的文档
+        """
+        if page is None:
+            page = await self.browser.get_current_page()
+        if page in self._helper_pages:
+            return
+        await page.add_init_script(_XHS_HELPERS_JS)
+        await self.browser.evaluate_on_page(page, _XHS_HELPERS_JS)
+        self._helper_pages.add(page)
+    
+    async def enable_lean_mode(self, page=None):
+        """开启精简模式：拦截图片/样式/字体/媒体请求，减少滚动时的带宽与渲染开销"""
+        if page is None:
+            page = await self.browser.get_current_page()
+        await page.route("**/*", _lean_route_handler)
+    
+    async def disable_lean_mode(self, page=None):
+        """关闭精简模式，恢复正常资源加载"""
+        if page is None:
+            page = await self.browser.get_current_page()
+        await page.unroute("**/*", _lean_route_handler)
+    
+    async def _run_script(self, script: str):
+        """通过 execute_script 执行脚本并解析返回的JSON，统一处理执行失败/无返回内容/解析失败"""
+        browser_result = await self.browser.execute_script(script)
+        if not browser_result.success:
+            self.logger.error("浏览器脚本执行失败: %s", browser_result.message)
+            return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+        content = browser_result.content
+        if not content:
+            self.logger.warning("JavaScript执行成功但无返回内容")
+            return {"success": False, "message": "JavaScript执行成功但无返回内容"}
+        if not isinstance(content, (str, bytes, bytearray)):
+            # 浏览器层已反序列化的结果直接使用
+            return content
+        try:
+            return _json_loads(content)
+        except ValueError as e:
+            self.logger.error("JSON解析失败: %s, 内容: %s...", e, content[:200])
+            return {"success": False, "message": "JavaScript结果解析失败"}
+    
+    async def _call_library(self, page, body: str, call: str):
+        """调用页面内脚本库中的函数，脚本固定部分每个页面只注入一次
+        
+        add_init_script 保证页面后续导航自动注册；命名空间意外缺失时重新注入后再调用一次
+        """
+        namespace, install, _ = _build_script_library(body)
+        installed = self._page_libraries.setdefault(page, set())
+        if namespace not in installed:
+            await page.add_init_script(install)
+            await self.browser.evaluate_on_page(page, install)
+            installed.add(namespace)
+        
+        call_script = _build_library_call(body, call)
+        result = await self.browser.evaluate_on_page(page, call_script)
+        if result == _SCRIPT_LIB_MISSING:
+            await self.browser.evaluate_on_page(page, install)
+            result = await self.browser.evaluate_on_page(page, call_script)
+        return result
+    
+    async def _evaluate_json(self, page, script: str, library: Optional[str] = None):
+        """执行返回JSON字符串的脚本并解析一次，省去 execute_script 的二次 json.dumps/json.loads
+        
+        传入 library（脚本固定部分）时 script 为其中函数的调用语句，经页面内脚本库执行；
+        脚本内部出错时返回的是对象而非字符串，原样返回
+        """
+        try:
+            if library is None:
+                content = await self.browser.evaluate_on_page(page, script)
+            else:
+                content = await self._call_library(page, library, script)
+        except Exception as e:
+            self.logger.error("浏览器脚本执行失败: %s", e)
+            return {"success": False, "message": f"浏览器脚本执行失败: {str(e)}"}
+        
+        if not content:
+            self.logger.warning("JavaScript执行成功但无返回内容")
+            return {"success": False, "message": "JavaScript执行成功但无返回内容"}
+        if not isinstance(content, str):
+            return content
+        
+        try:
+            return _json_loads(content)
+        except ValueError as e:
+            self.logger.error("JSON解析失败: %s, 内容: %s...", e, content[:200])
+            return {"success": False, "message": "JavaScript结果解析失败"}
+    
+    async def _run_in_context(self, operation: str, operation_func, **kwargs):
+        """在多标签页上下文中执行操作；不支持上下文切换时直接在当前页面执行"""
+        if self._has_ctx:
+            return await self.browser.execute_with_context(operation, operation_func, **kwargs)
+        return await operation_func(None, **kwargs)
+    
     async def auto_scroll_load_posts(self):
         """使用基础能力执行小红书自动滚动（支持多标签页）"""
         
         async def _execute_scroll_script(page, **kwargs):
             """实际执行滚动脚本的函数"""
+            if page is None:
+                page = await self.browser.get_current_page()
+            await self.install_helpers(page)
             script = self.generate_auto_scroll_script()
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                # 解析JavaScript返回的结果
-                if browser_result.content:
-                    import json
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        return js_result
-                    except json.JSONDecodeError:
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            # 滚动阶段只关心帖子数量，期间不加载图片等资源；结束后恢复，不影响后续提取与点击
+            await self.enable_lean_mode(page)
+            try:
+                return await self._run_script(script)
+            finally:
+                await self.disable_lean_mode(page)
         
         try:
             self.logger.info("开始小红书自动滚动加载")
-            
             # 使用上下文切换执行操作
-            if hasattr(self.browser, 'execute_with_context'):
-                return await self.browser.execute_with_context(
-                    "xiaohongshu_auto_scroll", 
-                    _execute_scroll_script
-                )
-            else:
-                # 回退到原始逻辑
-                return await _execute_scroll_script(None)
+            return await self._run_in_context("xiaohongshu_auto_scroll", _execute_scroll_script)
                 
         except Exception as e:
-            self.logger.error(f"自动滚动失败: {str(e)}")
+            self.logger.error("自动滚动失败: %s", e)
             return {"success": False, "message": f"自动滚动失败: {str(e)}"}
     
-    async def extract_all_posts(self, limit: int = None):
+    async def extract_all_posts(self, limit: int = None, debug: bool = False):
         """使用基础能力提取帖子信息"""
         try:
             if limit:
-                self.logger.info(f"开始提取小红书前{limit}个帖子信息")
+                self.logger.info("开始提取小红书前%s个帖子信息", limit)
             else:
                 self.logger.info("开始提取小红书所有帖子信息")
-            script = self.generate_extract_all_posts_script(limit)
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        return js_result
-                    except json.JSONDecodeError:
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            page = await self.browser.get_current_page()
+            result = await self._extract_posts_on_page(page, limit, debug)
+            if result.get("success"):
+                self.logger.info("帖子提取完成: %s", result['message'])
+            return result
                 
         except Exception as e:
-            self.logger.error(f"提取帖子失败: {str(e)}")
+            self.logger.error("提取帖子失败: %s", e)
             return {"success": False, "message": f"提取帖子失败: {str(e)}"}
     
-    async def click_post_by_title(self, title: str):
+    async def _extract_posts_on_page(self, page, limit: int = None, debug: bool = False):
+        """在指定页面上提取帖子并转换为数据库格式"""
+        await self.install_helpers(page)
+        script = self.generate_extract_all_posts_script(limit, debug)
+        
+        raw_posts = await self._evaluate_json(page, script)
+        if isinstance(raw_posts, dict):
+            # 执行失败或脚本内部出错时返回的是结果对象
+            return raw_posts
+        
+        # 帖子较多时整理工作放到线程池，期间事件循环仍可处理其他请求
+        feed_indices = [] if not limit else None
+        if len(raw_posts) > self.OFFLOAD_BUILD_THRESHOLD:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, self.build_posts_for_database, raw_posts, limit, feed_indices)
+        else:
+            result = self.build_posts_for_database(raw_posts, limit, feed_indices)
+        
+        if not limit:
+            self._posts_cache = ((page.url, len(raw_posts)), result["data"]["posts"], feed_indices)
+        return result
+    
+    def _get_cached_posts(self, url: str, loaded_count: Optional[int]) -> Optional[tuple]:
+        """返回与当前页面URL及已加载帖子数一致的缓存 (posts, 原始序号列表)，不一致时返回 None"""
+        if self._posts_cache is None:
+            return None
+        key, posts, feed_indices = self._posts_cache
+        return (posts, feed_indices) if key == (url, loaded_count) else None
+    
+    async def analyze_many(self, urls: List[str], limit: int = None, concurrency: int = 4):
+        """并发提取多个搜索结果页的帖子（基于上下文池）
+        
+        每个URL在独立的池化上下文中完成：导航 → 精简模式滚动加载 → 提取帖子，
+        结果顺序与 urls 一致
+        """
+        concurrency = max(1, min(concurrency, self.MAX_POOLED_CONTEXTS))
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _analyze_one(url):
+            async with semaphore:
+                context = await self.acquire_context()
+                try:
+                    page = context.pages[0] if context.pages else await context.new_page()
+                    await page.goto(url, wait_until="domcontentloaded")
+                    await self.install_helpers(page)
+                    
+                    await self.enable_lean_mode(page)
+                    try:
+                        scroll_result = await self.browser.evaluate_on_page(page, self.generate_auto_scroll_script())
+                    finally:
+                        await self.disable_lean_mode(page)
+                    if not (scroll_result or {}).get("success"):
+                        self.logger.warning("滚动加载未成功，继续提取已加载帖子: %s", url)
+                    
+                    result = await self._extract_posts_on_page(page, limit)
+                except Exception as e:
+                    result = {"success": False, "message": f"页面分析失败: {str(e)}"}
+                finally:
+                    await self.release_context(context)
+                
+                result["url"] = url
+                return result
+        
+        try:
+            self.logger.info("开始并发提取 %s 个页面的帖子 (并发数: %s)", len(urls), concurrency)
+            results = await asyncio.gather(*(_analyze_one(url) for url in urls))
+            success_count = sum(1 for result in results if result.get("success"))
+            return {
+                "success": success_count > 0,
+                "message": f"完成 {success_count}/{len(urls)} 个页面的帖子提取",
+                "data": {"results": results}
+            }
+        except Exception as e:
+            self.logger.error("并发提取帖子失败: %s", e)
+            return {"success": False, "message": f"并发提取帖子失败: {str(e)}"}
+    
+    async def click_post_by_title(self, title: str, smooth_scroll: bool = False):
         """使用基础能力通过标题点击帖子"""
         try:
-            self.logger.info(f"开始点击标题为 '{title}' 的帖子")
-            script = self.generate_click_post_script(title)
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        return js_result
-                    except json.JSONDecodeError:
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            self.logger.info("开始点击标题为 '%s' 的帖子", title)
+            page = await self.browser.get_current_page()
+            await self.install_helpers(page)
+            call = _click_post_call(title, smooth_scroll, trusted_click=True)
+            return await self._click_post(page, call, title)
                 
         except Exception as e:
-            self.logger.error(f"通过标题点击帖子失败: {str(e)}")
+            self.logger.error("通过标题点击帖子失败: %s", e)
             return {"success": False, "message": f"通过标题点击帖子失败: {str(e)}"}
     
+    async def click_post_by_index(self, global_index: int, expected_title: Optional[str] = None,
+                                  smooth_scroll: bool = False):
+        """按 extract_all_posts 结果中的序号点击帖子，无需先提取全部帖子解析标题"""
+        try:
+            self.logger.info("开始点击索引 %s 的帖子", global_index)
+            page = await self.browser.get_current_page()
+            await self.install_helpers(page)
+            call = _click_post_by_index_call(global_index, expected_title, smooth_scroll, trusted_click=True)
+            return await self._click_post(page, call, None)
+                
+        except Exception as e:
+            self.logger.error("通过索引点击帖子失败: %s", e)
+            return {"success": False, "message": f"通过索引点击帖子失败: {str(e)}"}
+    
+    async def _click_post_by_feed_index(self, feed_index: int, expected_title: str, smooth_scroll: bool = False):
+        """按原始帖子数组中的序号点击帖子（序号来自缓存的提取结果），页面内校验标题"""
+        try:
+            self.logger.info("开始点击原始序号 %s 的帖子: %s", feed_index, expected_title)
+            page = await self.browser.get_current_page()
+            await self.install_helpers(page)
+            call = _click_post_by_feed_index_call(feed_index, expected_title, smooth_scroll, trusted_click=True)
+            return await self._click_post(page, call, expected_title)
+                
+        except Exception as e:
+            self.logger.error("通过原始序号点击帖子失败: %s", e)
+            return {"success": False, "message": f"通过原始序号点击帖子失败: {str(e)}"}
+    
+    async def _click_post(self, page, call: str, title: Optional[str]):
+        """调用页面内的点击函数取得图片坐标，再用真实鼠标点击并等待跳转"""
+        try:
+            js_result = await self._call_library(page, _CLICK_POST_SCRIPT, call)
+        except Exception as e:
+            return {"success": False, "message": f"浏览器脚本执行失败: {str(e)}"}
+        
+        if not js_result:
+            return {"success": False, "message": "JavaScript执行成功但无返回内容"}
+        if not isinstance(js_result, dict):
+            return {"success": False, "message": f"JavaScript返回结果格式异常: {type(js_result).__name__}"}
+        
+        click_target = js_result.pop("click_target", None)
+        if not click_target:
+            return js_result
+        
+        # 通过 Playwright 鼠标事件（CDP Input.dispatchMouseEvent）执行真实点击，再等待路由变化
+        before_url = page.url
+        await page.mouse.click(click_target["x"], click_target["y"])
+        try:
+            await page.wait_for_url(lambda url: url != before_url, wait_until="commit", timeout=5000)
+            url_changed = True
+        except PlaywrightTimeoutError:
+            url_changed = False
+        
+        global_index = js_result.get("global_index")
+        if url_changed:
+            self.logger.info("成功跳转到帖子详情页: %s", page.url)
+            js_result["message"] = (f'成功点击标题为 "{title}" 的帖子并跳转' if title
+                                    else f"成功点击索引 {global_index} 的帖子并跳转")
+            js_result["new_url"] = page.url
+        else:
+            self.logger.warning("点击了图片但未检测到页面跳转")
+            js_result["message"] = (f'点击了标题为 "{title}" 的帖子，但未检测到页面跳转' if title
+                                    else f"点击了索引 {global_index} 的帖子，但未检测到页面跳转")
+            js_result["warning"] = "未检测到URL变化"
+        return js_result
+    
     async def close_post(self):
         """关闭小红书帖子详情页"""
         try:
             self.logger.info("开始关闭小红书帖子详情页")
+            page = await self.browser.get_current_page()
             script = self.generate_close_post_script()
-            browser_result = await self.browser.execute_script(script)
             
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        
-                        if js_result.get('success'):
-                            self.logger.info(f"成功关闭帖子详情页: {js_result.get('message')}")
-                        else:
-                            self.logger.warning(f"关闭帖子详情页失败: {js_result.get('message')}")
-                        
-                        return js_result
-                    except json.JSONDecodeError:
-                        self.logger.error("JavaScript结果解析失败")
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    self.logger.warning("JavaScript执行成功但无返回内容")
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                self.logger.error(f"浏览器脚本执行失败: {browser_result.message}")
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            try:
+                js_result = await self.browser.evaluate_on_page(page, script)
+            except Exception as e:
+                self.logger.error("浏览器脚本执行失败: %s", e)
+                return {"success": False, "message": f"浏览器脚本执行失败: {str(e)}"}
+            
+            if not js_result:
+                self.logger.warning("JavaScript执行成功但无返回内容")
+                return {"success": False, "message": "JavaScript执行成功但无返回内容"}
+            if not isinstance(js_result, dict):
+                self.logger.warning("关闭帖子脚本返回结果格式异常: %s", type(js_result).__name__)
+                return {"success": False, "message": f"JavaScript返回结果格式异常: {type(js_result).__name__}"}
+            if not js_result.pop("clicked", False):
+                self.logger.warning("关闭帖子详情页失败: %s", js_result.get('message'))
+                return js_result
+            
+            # 由 Playwright 等待路由变化，URL一变即返回，最多2秒
+            before_url = js_result["before_url"]
+            before_title = js_result["before_title"]
+            try:
+                await page.wait_for_url(lambda url: url != before_url, wait_until="commit", timeout=2000)
+            except PlaywrightTimeoutError:
+                pass
+            
+            after_url = page.url
+            after_title = await page.title()
+            url_changed = before_url != after_url
+            title_changed = before_title != after_title
+            
+            if url_changed or title_changed:
+                self.logger.info("成功关闭帖子详情页: %s", after_url)
+                js_result.update({
+                    "message": "成功关闭帖子详情页",
+                    "method": "左上角关闭按钮",
+                    "after_url": after_url,
+                    "after_title": after_title,
+                    "url_changed": url_changed,
+                    "title_changed": title_changed
+                })
+                return js_result
+            
+            self.logger.warning("关闭帖子详情页失败: 点击后页面未发生变化")
+            return {
+                "success": False,
+                "message": "点击后页面未发生变化，可能页面结构发生了变化",
+                "selector": js_result.get("selector"),
+                "before_url": before_url,
+                "after_url": after_url
+            }
                 
         except Exception as e:
-            self.logger.error(f"关闭帖子详情页失败: {str(e)}")
+            self.logger.error("关闭帖子详情页失败: %s", e)
             return {"success": False, "message": f"关闭帖子详情页失败: {str(e)}"}
     
     async def close_page(self):
@@ -1725,24 +2698,22 @@ async function extractUserProfile() {
             self.logger.info("开始关闭当前页面")
             
             # 优先使用 TabManager 的可靠关闭方式
-            if hasattr(self.browser, 'tab_manager') and self.browser.tab_manager:
-                tab_manager = self.browser.tab_manager
-                
+            tab_manager = self.browser.tab_manager if self._has_tabs else None
+            if tab_manager:
                 # 获取当前活跃页面
                 current_page = await tab_manager.get_active_page()
                 if current_page:
                     # 找到当前页面对应的标签页ID
-                    for tab_id, tab_info in tab_manager.tabs.items():
-                        if tab_info.page == current_page:
-                            self.logger.info(f"使用TabManager关闭标签页: {tab_id}")
-                            success = await tab_manager.close_tab(tab_id)
-                            
-                            if success:
-                                self.logger.info("TabManager成功关闭页面")
-                                return {"success": True, "message": "页面关闭成功"}
-                            else:
-                                self.logger.warning("TabManager关闭失败，尝试直接关闭")
-                                break
+                    tab_id = tab_manager.get_tab_id_by_page(current_page)
+                    if tab_id:
+                        self.logger.info("使用TabManager关闭标签页: %s", tab_id)
+                        success = await tab_manager.close_tab(tab_id)
+                        
+                        if success:
+                            self.logger.info("TabManager成功关闭页面")
+                            return {"success": True, "message": "页面关闭成功"}
+                        else:
+                            self.logger.warning("TabManager关闭失败，尝试直接关闭")
                     
                     # 如果在tabs中没找到当前页面，直接关闭
                     try:
@@ -1750,7 +2721,7 @@ async function extractUserProfile() {
                         self.logger.info("直接关闭页面成功")
                         return {"success": True, "message": "页面关闭成功"}
                     except Exception as e:
-                        self.logger.error(f"直接关闭页面失败: {e}")
+                        self.logger.error("直接关闭页面失败: %s", e)
                         return {"success": False, "message": f"页面关闭失败: {str(e)}"}
             
             # 回退方式：直接获取当前页面并关闭
@@ -1762,11 +2733,11 @@ async function extractUserProfile() {
                     self.logger.info("回退方式关闭页面成功")
                     return {"success": True, "message": "页面关闭成功"}
                 except Exception as e:
-                    self.logger.error(f"回退方式关闭页面失败: {e}")
+                    self.logger.error("回退方式关闭页面失败: %s", e)
                     return {"success": False, "message": f"页面关闭失败: {str(e)}"}
                 
         except Exception as e:
-            self.logger.error(f"关闭页面失败: {str(e)}")
+            self.logger.error("关闭页面失败: %s", e)
             return {"success": False, "message": f"关闭页面失败: {str(e)}"}
     
     async def click_author_avatar_and_extract_profile(self, userid: str, username: str):
@@ -1774,75 +2745,81 @@ async function extractUserProfile() {
         
         async def _execute_click_and_extract(page, **kwargs):
             """实际执行点击头像和提取信息的函数"""
-            import asyncio
-            # 第一步：点击头像（这会创建新标签页）
-            script = self.generate_click_author_avatar_and_extract_script(userid, username)
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
+            if page is None:
+                page = await self.browser.get_current_page()
+            
+            # 第一步：点击头像（这会创建新标签页）；点击前开始监听新页面，新标签页一出现即继续
+            new_page_waiter = asyncio.ensure_future(page.context.wait_for_event("page", timeout=5000))
+            try:
+                script = self.generate_click_author_avatar_and_extract_script(userid, username)
+                js_result = await self._run_script(script)
+                if js_result.get('success'):
                     try:
-                        js_result = json.loads(browser_result.content)
-                        
-                        # 如果点击成功，检查是否有新标签页
-                        if js_result.get('success') and hasattr(self.browser, 'tab_manager'):
-                            # 发现新标签页
-                            new_tabs = await self.browser.tab_manager.discover_new_tabs()
-                            self.logger.info(f"发现新标签页: {new_tabs}")
-                            
-                            # 切换到用户资料页
-                            if new_tabs:
-                                # 等待页面加载
-                                await asyncio.sleep(3)
-                                
-                                # 查找用户资料页标签
-                                user_tab = await self.browser.tab_manager.find_tab_by_type(TabType.USER_PROFILE)
-                                if user_tab:
-                                    await self.browser.tab_manager.switch_to_tab(user_tab)
-                                    self.logger.info(f"切换到用户资料页标签: {user_tab}")
-                                    
-                                    # 现在在用户资料页提取信息
-                                    profile_result = await self.extract_user_profile()
-                                    if profile_result.get('success'):
-                                        js_result['userData'] = profile_result.get('userData', {})
-                                        self.logger.info("成功从新标签页提取用户信息")
+                        await new_page_waiter
+                    except PlaywrightTimeoutError:
+                        self.logger.warning("点击头像后5秒内未检测到新标签页")
+            finally:
+                if not new_page_waiter.done():
+                    new_page_waiter.cancel()
+                elif not new_page_waiter.cancelled():
+                    # 未等待的分支（脚本失败/异常）也取走超时等异常，避免 "exception was never retrieved" 警告
+                    new_page_waiter.exception()
+            
+            # 如果点击成功，检查是否有新标签页
+            if js_result.get('success') and self._has_tabs:
+                # 发现新标签页
+                new_tabs = await self.browser.tab_manager.discover_new_tabs()
+                self.logger.info("发现新标签页: %s", new_tabs)
+                
+                # 切换到用户资料页
+                if new_tabs:
+                    # 查找用户资料页标签
+                    user_tab = await self.browser.tab_manager.find_tab_by_type(TabType.USER_PROFILE)
+                    if user_tab:
+                        # 等待用户主页全局状态就绪即继续（最多3秒），代替固定等待
+                        try:
+                            await self.browser.tab_manager.tabs[user_tab].page.wait_for_function(
+                                _USER_STATE_READY_JS, timeout=3000
+                            )
+                        except PlaywrightTimeoutError:
+                            self.logger.warning("用户主页数据3秒内未就绪，继续尝试提取")
                         
-                        if js_result.get('success'):
-                            self.logger.info(f"成功获取用户信息: {js_result.get('message')}")
-                            user_data = js_result.get('userData', {})
-                            if user_data and not user_data.get('error'):
-                                self.logger.info(f"用户数据: {user_data}")
-                        else:
-                            self.logger.warning(f"获取用户信息失败: {js_result.get('message')}")
+                        await self.browser.tab_manager.switch_to_tab(user_tab)
+                        self.logger.info("切换到用户资料页标签: %s", user_tab)
                         
-                        return js_result
-                    except json.JSONDecodeError:
-                        self.logger.error("JavaScript结果解析失败")
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    self.logger.warning("JavaScript执行成功但无返回内容")
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
+                        # 现在在用户资料页提取信息
+                        profile_result = await self.extract_user_profile()
+                        if profile_result.get('success'):
+                            js_result['userData'] = profile_result.get('data', {})
+                            self.logger.info("成功从新标签页提取用户信息")
+            
+            if js_result.get('success'):
+                self.logger.info("成功获取用户信息: %s", js_result.get('message'))
+                user_data = js_result.get('userData', {})
+                if user_data and not user_data.get('error'):
+                    self.logger.info("用户数据: 用户名=%s, 帖子数=%s, 粉丝数=%s",
+                                     user_data.get('username'),
+                                     user_data.get('notes_count', 0),
+                                     user_data.get('followers_count', 0))
+                    # 完整数据包含全部帖子，仅在DEBUG级别输出
+                    self.logger.debug("用户数据: %s", user_data)
             else:
-                self.logger.error(f"浏览器脚本执行失败: {browser_result.message}")
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+                self.logger.warning("获取用户信息失败: %s", js_result.get('message'))
+            
+            return js_result
         
         try:
-            self.logger.info(f"开始点击作者头像并获取用户信息: userid={userid}, username={username}")
-            
+            self.logger.info("开始点击作者头像并获取用户信息: userid=%s, username=%s", userid, username)
             # 使用上下文切换执行操作
-            if hasattr(self.browser, 'execute_with_context'):
-                return await self.browser.execute_with_context(
-                    "xiaohongshu_click_author_avatar", 
-                    _execute_click_and_extract,
-                    userid=userid,
-                    username=username
-                )
-            else:
-                # 回退到原始逻辑
-                return await _execute_click_and_extract(None, userid=userid, username=username)
+            return await self._run_in_context(
+                "xiaohongshu_click_author_avatar",
+                _execute_click_and_extract,
+                userid=userid,
+                username=username
+            )
                 
         except Exception as e:
-            self.logger.error(f"点击头像获取用户信息失败: {str(e)}")
+            self.logger.error("点击头像获取用户信息失败: %s", e)
             return {"success": False, "message": f"点击头像获取用户信息失败: {str(e)}"}
     
     async def extract_user_profile(self):
@@ -1851,50 +2828,29 @@ async function extractUserProfile() {
         async def _execute_extract_script(page, **kwargs):
             """实际执行提取脚本的函数"""
             script = self.generate_extract_user_profile_script()
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        
-                        if js_result.get('success'):
-                            self.logger.info(f"成功提取用户信息: {js_result.get('message')}")
-                            # 记录提取到的数据
-                            user_data = js_result.get('data', {})
-                            if user_data:
-                                self.logger.info(f"用户数据: 用户名={user_data.get('username')}, "
-                                               f"帖子数={user_data.get('notes_count', 0)}, "
-                                               f"粉丝数={user_data.get('followers_count', 0)}")
-                        else:
-                            self.logger.warning(f"提取用户信息失败: {js_result.get('message')}")
-                        
-                        return js_result
-                    except json.JSONDecodeError:
-                        self.logger.error("JavaScript结果解析失败")
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    self.logger.warning("JavaScript执行成功但无返回内容")
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
+            js_result = await self._evaluate_json(page or await self.browser.get_current_page(), script)
+            
+            if js_result.get('success'):
+                self.logger.info("成功提取用户信息: %s", js_result.get('message'))
+                # 记录提取到的数据
+                user_data = js_result.get('data', {})
+                if user_data:
+                    self.logger.info("用户数据: 用户名=%s, 帖子数=%s, 粉丝数=%s",
+                                     user_data.get('username'),
+                                     user_data.get('notes_count', 0),
+                                     user_data.get('followers_count', 0))
             else:
-                self.logger.error(f"浏览器脚本执行失败: {browser_result.message}")
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+                self.logger.warning("提取用户信息失败: %s", js_result.get('message'))
+            
+            return js_result
         
         try:
             self.logger.info("开始提取用户个人主页信息")
-            
             # 使用上下文切换执行操作
-            if hasattr(self.browser, 'execute_with_context'):
-                return await self.browser.execute_with_context(
-                    "xiaohongshu_extract_user_profile", 
-                    _execute_extract_script
-                )
-            else:
-                # 回退到原始逻辑
-                return await _execute_extract_script(None)
+            return await self._run_in_context("xiaohongshu_extract_user_profile", _execute_extract_script)
                 
         except Exception as e:
-            self.logger.error(f"提取用户主页信息失败: {str(e)}")
+            self.logger.error("提取用户主页信息失败: %s", e)
             return {"success": False, "message": f"提取用户主页信息失败: {str(e)}"}
     
     async def expand_all_comments(self):
@@ -1902,125 +2858,154 @@ async function extractUserProfile() {
         
         async def _execute_expand_script(page, **kwargs):
             """实际执行展开评论脚本的函数"""
-            script = self.generate_expand_comments_script()
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        return js_result
-                    except json.JSONDecodeError:
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            return await self._run_script(self.generate_expand_comments_script())
         
         try:
             self.logger.info("开始展开所有评论")
-            
             # 使用上下文切换执行操作
-            if hasattr(self.browser, 'execute_with_context'):
-                return await self.browser.execute_with_context(
-                    "xiaohongshu_expand_comments", 
-                    _execute_expand_script
-                )
-            else:
-                # 回退到原始逻辑
-                return await _execute_expand_script(None)
+            return await self._run_in_context("xiaohongshu_expand_comments", _execute_expand_script)
                 
         except Exception as e:
-            self.logger.error(f"展开评论失败: {str(e)}")
+            self.logger.error("展开评论失败: %s", e)
             return {"success": False, "message": f"展开评论失败: {str(e)}"}
     
     async def extract_all_comments(self):
         """使用基础能力提取所有评论"""
         try:
             self.logger.info("开始提取所有评论")
-            script = self.generate_extract_comments_script()
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        return js_result
-                    except json.JSONDecodeError as e:
-                        self.logger.error(f"JSON解析失败: {str(e)}, 内容: {browser_result.content[:200]}...")
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    self.logger.warning("JavaScript执行成功但无返回内容")
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                self.logger.error(f"浏览器脚本执行失败: {browser_result.message}")
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            page = await self.browser.get_current_page()
+            return await self._evaluate_json(page, _extract_comments_call(False, 0, None), _EXTRACT_COMMENTS_SCRIPT)
                 
         except Exception as e:
-            self.logger.error(f"提取评论失败: {str(e)}")
+            self.logger.error("提取评论失败: %s", e)
             return {"success": False, "message": f"提取评论失败: {str(e)}"}
     
-    async def reply_to_comment(self, target_user_id: str, target_username: str, target_content: str, reply_content: str):
-        """使用基础能力回复指定评论"""
+    async def expand_and_extract_all_comments(self):
+        """展开并提取所有评论，合并为一次脚本执行
+        
+        返回 {"success", "message", "data": {"expand_result", "comments_result"}}；展开失败不影响提取。
+        某一步未在页面内执行（如脚本整体执行失败）时对应结果为 None，调用方只需补做缺失的步骤
+        """
+        
+        async def _execute_merged_script(page, **kwargs):
+            """实际执行合并脚本的函数（脚本返回JSON字符串，直接在页面上执行并解析一次）"""
+            script = self.generate_expand_and_extract_comments_script()
+            return await self._evaluate_json(page or await self.browser.get_current_page(), script)
+        
         try:
-            self.logger.info(f"开始回复用户 {target_username} 的评论: {target_content[:30]}...")
-            script = self.generate_reply_to_comment_script(target_user_id, target_username, target_content, reply_content)
-            browser_result = await self.browser.execute_script(script)
-            
-            if browser_result.success:
-                if browser_result.content:
-                    try:
-                        js_result = json.loads(browser_result.content)
-                        return js_result
-                    except json.JSONDecodeError as e:
-                        self.logger.error(f"JSON解析失败: {str(e)}, 内容: {browser_result.content[:200]}...")
-                        return {"success": False, "message": "JavaScript结果解析失败"}
-                else:
-                    self.logger.warning("JavaScript执行成功但无返回内容")
-                    return {"success": False, "message": "JavaScript执行成功但无返回内容"}
-            else:
-                self.logger.error(f"浏览器脚本执行失败: {browser_result.message}")
-                return {"success": False, "message": f"浏览器脚本执行失败: {browser_result.message}"}
+            self.logger.info("开始展开并提取所有评论")
+            js_result = await self._run_in_context("xiaohongshu_expand_comments", _execute_merged_script)
+        except Exception as e:
+            self.logger.error("展开并提取评论失败: %s", e)
+            js_result = {"success": False, "message": f"展开并提取评论失败: {str(e)}"}
+        
+        if not isinstance(js_result, dict):
+            js_result = {"success": False, "message": "合并脚本返回格式异常"}
+        expand_result = js_result.get("expand_result")
+        comments_result = js_result.get("comments_result")
+        if not isinstance(expand_result, dict):
+            expand_result = None
+        if not isinstance(comments_result, dict):
+            comments_result = None
+        
+        if comments_result is None:
+            message = js_result.get("message") or "合并脚本未返回评论结果"
+            success = False
+        else:
+            message = comments_result.get("message", "")
+            success = bool(comments_result.get("success"))
+        return {
+            "success": success,
+            "message": message,
+            "data": {
+                "expand_result": expand_result,
+                "comments_result": comments_result
+            }
+        }
+    
+    async def iter_comments(self, chunk_size: int = 200):
+        """分段提取评论，每次产出一段的提取结果（data.comments 最多 chunk_size 条）
+        
+        评论很多时无需一次取回全部；提取失败时产出失败结果后结束
+        """
+        chunk_size = max(1, int(chunk_size))
+        page = await self.browser.get_current_page()
+        offset = 0
+        while True:
+            result = await self._evaluate_json(page, _extract_comments_call(False, offset, chunk_size),
+                                               _EXTRACT_COMMENTS_SCRIPT)
+            yield result
+            data = result.get("data") or {}
+            if not result.get("success") or not data.get("has_more"):
+                return
+            offset += len(data.get("comments") or [])
+    
+    async def reply_to_comment(self, target_user_id: str, target_username: str, target_content: str, reply_content: str,
+                               status_only: bool = False):
+        """使用基础能力回复指定评论；status_only 为 True 时只返回 success/message"""
+        try:
+            self.logger.info("开始回复用户 %s 的评论: %s...", target_username, target_content[:30])
+            await self.install_helpers()
+            script = self.generate_reply_to_comment_script(target_user_id, target_username, target_content, reply_content,
+                                                           status_only=status_only)
+            return await self._run_script(script)
                 
         except Exception as e:
-            self.logger.error(f"回复评论失败: {str(e)}")
+            self.logger.error("回复评论失败: %s", e)
             return {"success": False, "message": f"回复评论失败: {str(e)}"}
     
     
+    async def reply_to_comments_batch(self, replies: List[Dict[str, str]], status_only: bool = False):
+        """批量回复同一帖子下的多条评论（一次脚本注入，逐条执行）；status_only 为 True 时只返回 success/message"""
+        try:
+            self.logger.info("开始批量回复 %s 条评论", len(replies))
+            await self.install_helpers()
+            script = self.generate_reply_to_comments_batch_script(replies, status_only=status_only)
+            js_result = await self._run_script(script)
+            self.logger.info(js_result.get('message', ''))
+            return js_result
+                
+        except Exception as e:
+            self.logger.error("批量回复评论失败: %s", e)
+            return {"success": False, "message": f"批量回复评论失败: {str(e)}"}
+    
     async def analyze_post_complete(self, global_index: int):
         """完整的小红书帖子分析流程 - 组合基础能力"""
         try:
-            self.logger.info(f"开始完整分析小红书全局索引 {global_index} 的帖子")
+            self.logger.info("开始完整分析小红书全局索引 %s 的帖子", global_index)
             
             # 第一步：滚动加载所有帖子
             scroll_result = await self.auto_scroll_load_posts()
             if not scroll_result.get("success"):
                 return {"success": False, "message": f"滚动失败: {scroll_result.get('message')}"}
             
-            # 第二步：从索引获取标题，然后点击目标帖子
-            extract_result = await self.extract_all_posts()
-            if not extract_result.get("success"):
-                return {"success": False, "message": f"提取帖子信息失败: {extract_result.get('message')}"}
-            
-            posts_data = extract_result.get("data", {}).get("posts", [])
-            if global_index >= len(posts_data):
-                return {"success": False, "message": f"索引超出范围: {global_index} >= {len(posts_data)}"}
-            
-            target_post = posts_data[global_index]
-            title = target_post.get("title", "")
-            if not title:
-                return {"success": False, "message": f"索引 {global_index} 的帖子没有标题"}
-            
-            click_result = await self.click_post_by_title(title)
+            # 第二步：点击目标帖子；已有本页完整提取结果时直接用其中记录的原始序号并校验标题，不一致再按标题点击
+            page = await self.browser.get_current_page()
+            cached = self._get_cached_posts(page.url, scroll_result.get("total_posts"))
+            if cached is not None:
+                cached_posts, feed_indices = cached
+                if global_index >= len(cached_posts):
+                    return {"success": False, "message": f"索引超出范围: {global_index} >= {len(cached_posts)}"}
+                title = cached_posts[global_index]["title"]
+                click_result = await self._click_post_by_feed_index(feed_indices[global_index], title)
+                if click_result.get("mismatch"):
+                    click_result = await self.click_post_by_title(title)
+            else:
+                click_result = await self.click_post_by_index(global_index)
             if not click_result.get("success"):
                 return {"success": False, "message": f"点击帖子失败: {click_result.get('message')}"}
             
-            # 第三步：展开评论
-            expand_result = await self.expand_all_comments()
-            # 展开失败不影响继续提取
-            
-            # 第四步：提取评论
-            comments_result = await self.extract_all_comments()
+            # 第三步：展开并提取评论（一次脚本执行）；只补做合并脚本中未执行到的步骤，已完成的步骤不重复
+            merged_data = (await self.expand_and_extract_all_comments())["data"]
+            expand_result = merged_data["expand_result"]
+            comments_result = merged_data["comments_result"]
+            if expand_result is None:
+                self.logger.warning("合并脚本未完成展开评论，改为单独展开")
+                # 展开失败不影响继续提取
+                expand_result = await self.expand_all_comments()
+            if comments_result is None:
+                self.logger.warning("合并脚本未返回评论结果，改为单独提取")
+                comments_result = await self.extract_all_comments()
             
             # 组合结果
             result_data = {
@@ -2043,5 +3028,5 @@ async function extractUserProfile() {
             }
             
         except Exception as e:
-            self.logger.error(f"完整分析失败: {str(e)}")
+            self.logger.error("完整分析失败: %s", e)
             return {"success": False, "message": f"完整分析失败: {str(e)}"} 
\ No newline at end of file